@@ -3,7 +3,8 @@
 # ==========================================
 import os
 import math
-from flask import Flask, jsonify, request, render_template, session, redirect, url_for
+import json
+from flask import Flask, jsonify, request, render_template, session, redirect, url_for, Response, stream_with_context
 
 from passlib.context import CryptContext
 from flask_limiter import Limiter
@@ -61,6 +62,9 @@ try:
 except Exception as e:
     print(f"[APP] Failed to Start the Server: {e}")
 
+# Job generate non-blocking: history disimpan oleh thread poller saat job selesai
+generation_jobs = utils.GenerationTracker(save_result=db_utils.save_recipe_to_history)
+
 # ==========================================
 # AUTH ROUTES (Login & Register & Logout)
 # ==========================================
@@ -393,6 +397,9 @@ def generate_recipe():
     # Bahan Input
     bahan = data.get("bahan")
     mode = data.get("mode", "normal")  # default mode is 'normal'
+    include = data.get("include")  # opsional: bahan wajib ada / tidak boleh ada
+    exclude = data.get("exclude")
+    stream = bool(data.get("stream"))  # opsional: token bisa diikuti lewat /api/generate/<job_id>/events
 
     # Validate Bahan
     if not bahan:
@@ -402,48 +409,156 @@ def generate_recipe():
             'message': 'Ingredient is required to generate recipe.'
         }), 400
 
-    # Execute Recipe Generation
-    try:
-        # Call AI Utility to Generate Recipe
-        resep_text = utils.generate_resep_final(bahan, mode)
+    # Kirim ke antrian job model server, thread waitress langsung dilepas.
+    # History disimpan oleh poller saat job selesai; client polling GET /api/generate/<job_id>
+    user_id = session['user_id']
+    job, error = generation_jobs.submit(user_id, bahan, mode, include, exclude, stream)
+    if error:
+        error_code, message, status, retry_after = error
+        response = jsonify({
+            'error_code': error_code,
+            'success': False,
+            'message': message
+        })
+        if retry_after:
+            response.headers['Retry-After'] = retry_after
+        return response, status
 
-        # Check if AI returned an error message
-        if "Maaf" in resep_text and "kendala" in resep_text:
-            return jsonify({
-                'error_code': 8,
-                'success': False,
-                'message': 'AI failed to generate recipe. Try different ingredients.'
-            }), 500
+    return jsonify({
+        'error_code': 0,
+        'success': True,
+        'message': 'Recipe generation started.',
+        'data': generation_job_payload(job)
+    }), 202
 
-    except Exception as e:
-        print(f"[AI ERROR] {e}")
+@app.route('/api/generate/<job_id>', methods=['GET'])
+@utils.auth_required
+@limiter.exempt
+def generate_recipe_status(job_id):
+    # Hanya baca status di memori (tanpa request ke model server / DB)
+    job = generation_jobs.get(job_id, session['user_id'])
+    if job is None:
         return jsonify({
-            'error_code': 9,
+            'error_code': 16,
             'success': False,
-            'message': f'Server Error during generation: {str(e)}'
-        }), 500
-
-    # 5. SAVE TO DATABASE (History)
-    try:
-        user_id = session['user_id']
-        history_id = db_utils.save_recipe_to_history(user_id, bahan, resep_text)
+            'message': 'Generation job not found or expired.'
+        }), 404
 
+    if job['status'] == 'error':
         return jsonify({
-            'error_code': 0,
-            'success': True,
-            'message': 'Recipe generated successfully!',
-            'data': {
-                'history_id': history_id,
-                'resep': resep_text,
-                'mode': mode
-            }
+            'error_code': job['error_code'],
+            'success': False,
+            'message': job['message'],
+            'data': generation_job_payload(job)
         })
-    except Exception as e:
+
+    return jsonify({
+        'error_code': 0,
+        'success': True,
+        'message': 'Recipe generated successfully!' if job['status'] == 'done' else f"Recipe {job['status']}.",
+        'data': generation_job_payload(job)
+    })
+
+@app.route('/api/generate/<job_id>/events', methods=['GET'])
+@utils.auth_required
+@limiter.exempt
+def generate_recipe_events(job_id):
+    # Token job yang sedang jalan (SSE). Relay menahan satu thread waitress sampai job selesai,
+    # jadi dibatasi GENERATE_STREAM_MAX; slot penuh -> 429 dan client tetap polling status job
+    events, error = generation_jobs.subscribe(job_id, session['user_id'])
+    if error:
+        error_code, message, status = error
+        return jsonify({
+            'error_code': error_code,
+            'success': False,
+            'message': message
+        }), status
+
+    def relay():
+        for event, payload in events:
+            yield sse(event, payload)
+
+    return Response(stream_with_context(relay()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def generation_job_payload(job):
+    payload = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'mode': job['mode']
+    }
+    if job['status'] == 'queued':
+        payload['queue_position'] = job['queue_position']
+    elif job['status'] == 'done':
+        payload['history_id'] = job['history_id']
+        payload['resep'] = job['resep']
+    return payload
+
+def sse(event, payload):
+    """Format satu Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+# Sama dengan /api/generate + subscribe langsung: job masuk antrian model server, token di-relay
+# lewat GenerationTracker (slot GENERATE_STREAM_MAX yang sama dengan /api/generate/<job_id>/events),
+# jadi route ini tidak bisa menghabiskan thread waitress. Slot penuh -> 202 + job_id, client polling.
+@app.route('/api/generate/stream', methods=['POST'])
+@utils.auth_required
+@limiter.limit("1 per minute") # [Limit] Sama dengan /api/generate
+def generate_recipe_stream():
+    # Get JSON Data from Request
+    data, error = utils.data_validate()
+    if error: return error
+
+    bahan = data.get("bahan")
+    mode = data.get("mode", "normal")
+    include = data.get("include")
+    exclude = data.get("exclude")
+
+    if not bahan:
         return jsonify({
-            'error_code': 10,
+            'error_code': 7,
             'success': False,
-            'message': f'Database Error: {str(e)}'
-        }), 500
+            'message': 'Ingredient is required to generate recipe.'
+        }), 400
+
+    user_id = session['user_id']
+    job, error = generation_jobs.submit(user_id, bahan, mode, include, exclude, stream=True)
+    if error:
+        error_code, message, status, retry_after = error
+        response = jsonify({
+            'error_code': error_code,
+            'success': False,
+            'message': message
+        })
+        if retry_after:
+            response.headers['Retry-After'] = retry_after
+        return response, status
+
+    events, error = generation_jobs.subscribe(job['id'], user_id)
+    if error:
+        # Job tetap jalan (history disimpan poller); hasil diambil lewat GET /api/generate/<job_id>
+        return jsonify({
+            'error_code': 0,
+            'success': True,
+            'message': 'Recipe generation started. Too many live streams, poll the job status.',
+            'data': generation_job_payload(job)
+        }), 202
+
+    def relay():
+        for event, payload in events:
+            yield sse(event, payload)
+            if event != 'token':
+                return
+        # Relay berhenti sebelum job selesai (koneksi model server putus / lama): job tetap jalan
+        yield sse('error', {'error_code': 15, 'job_id': job['id'],
+                            'message': 'Generation is taking too long. Poll the job for the result.'})
+
+    return Response(stream_with_context(relay()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 # ==========================================
 # History and Favorites
@@ -0,0 +1,78 @@
+# ==========================================
+# Benchmark: Sequential vs Micro-Batched Generation
+# ==========================================
+# Membandingkan tokens/sec antara jalur lama (satu request = satu generate)
+# dengan BatchScheduler (banyak request digabung jadi satu padded batch).
+#
+# Cara pakai (dari root project):
+#   python benchmarks/bench_batching.py --requests 8 --batch-size 4 --wait-ms 50
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+
+SAMPLE_BAHAN = [
+    ("ayam, bawang putih, kecap manis", "normal"),
+    ("tempe, cabai, bawang merah", "normal"),
+    ("telur, tomat", "diet"),
+    ("tahu, kangkung", "diet"),
+    ("udang, santan, cabai", "normal"),
+    ("ikan, kunyit, jahe", "diet"),
+    ("sapi, kentang, wortel", "normal"),
+    ("mie, sawi, telur", "normal"),
+]
+
+def build_prompts(n):
+    prompts = []
+    for i in range(n):
+        bahan, mode = SAMPLE_BAHAN[i % len(SAMPLE_BAHAN)]
+        context = model_server.retrieve_smart_filter(bahan, mode)
+        prompts.append((model_server.build_prompt(bahan, mode, context), mode))
+    return prompts
+
+def run_sequential(prompts):
+    tokens = 0
+    started = time.perf_counter()
+    for prompt, _ in prompts:
+        _, new_tokens = model_server.generate_raw_batch([prompt])[0]
+        tokens += new_tokens
+    return tokens, time.perf_counter() - started
+
+def run_batched(prompts, batch_size, wait_ms):
+    scheduler = model_server.BatchScheduler(max_batch_size=batch_size, max_wait_ms=wait_ms)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+        futures = list(pool.map(lambda item: scheduler.submit(item[0], item[1]), prompts))
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+    return sum(tokens for _, tokens in results), elapsed, scheduler.get_stats()
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs micro-batched generation throughput")
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--wait-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    model_server.load_resources()
+    prompts = build_prompts(args.requests)
+
+    # Warmup (CUDA kernels, allocator)
+    model_server.generate_raw_batch([prompts[0][0]])
+
+    seq_tokens, seq_time = run_sequential(prompts)
+    bat_tokens, bat_time, stats = run_batched(prompts, args.batch_size, args.wait_ms)
+
+    print("\n=== RESULT ===")
+    print(f"Sequential : {seq_tokens} tokens in {seq_time:.2f}s -> {seq_tokens / seq_time:.1f} tok/s")
+    print(f"Batched    : {bat_tokens} tokens in {bat_time:.2f}s -> {bat_tokens / bat_time:.1f} tok/s")
+    print(f"Speedup    : {(bat_tokens / bat_time) / (seq_tokens / seq_time):.2f}x")
+    print(f"Batch sizes: {stats['batch_sizes']} (avg {stats['avg_batch_size']})")
+
+if __name__ == "__main__":
+    main()
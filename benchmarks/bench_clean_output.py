@@ -0,0 +1,158 @@
+# ==========================================
+# Benchmark: super_clean_output (Legacy vs LoopDetector)
+# ==========================================
+# 1. Cek golden corpus (benchmarks/golden/clean_output.jsonl: raw generation + output
+#    yang diharapkan dari implementasi lama) -> output baru harus identik.
+# 2. Throughput (dokumen/detik) legacy vs versi sekarang, untuk golden corpus dan untuk
+#    generation panjang yang looping (kasus yang muncul di profile).
+#
+# Cara pakai (dari root project, tanpa load model):
+#   python benchmarks/bench_clean_output.py --repeat 20
+#   python benchmarks/bench_clean_output.py --regenerate   # tulis ulang expected dari legacy
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clean_utils import super_clean_output
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'clean_output.jsonl')
+
+# ------------------------------------------
+# Salinan implementasi lama (sebelum LoopDetector)
+# ------------------------------------------
+def similar(a, b):
+    """Mengecek kemiripan dua kalimat (0.0 - 1.0)"""
+    return SequenceMatcher(None, a, b).ratio()
+
+def legacy_clean_output(text):
+    if not text: return ""
+
+    text = text.replace("●", "\n- ").replace("•", "\n- ")
+    text = text.replace("--", "\n- ")
+    text = re.sub(r'(?<!\n)- ', '\n- ', text)
+    text = text.replace("Bahan-bahan Lengkap:", "Bahan-bahan:")
+    text = text.replace("Bahan Bahan:", "Bahan-bahan:")
+    text = re.sub(r',(?!\s|\d)', ', ', text)
+
+    lines = text.split('\n')
+    cleaned_lines = []
+    section = "HEADER"
+    seen_lines = []
+    kill_switch = [
+        "Tips:", "Tips :", "Note:", "Note :", "Catatan:", "P.S.",
+        "Selamat mencoba", "Happy cooking", "Semoga bermanfaat",
+        "Untuk mengetahui nutrisinya", "Data nutrisi ini",
+        "Kalau mau disajikan", "Sajikan hangat"
+    ]
+
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped in ["-", "- "]:
+            continue
+        if any(k in stripped for k in kill_switch): break
+
+        is_looping = False
+        for seen in seen_lines[-5:]:
+            if similar(stripped, seen) > 0.85 and len(stripped) > 10:
+                is_looping = True
+                break
+        if is_looping: continue
+
+        if "Bahan-bahan:" in stripped or "Bahan:" in stripped:
+            section = "BAHAN"
+            cleaned_lines.append("Bahan-bahan:")
+            continue
+        elif "Cara Membuat:" in stripped or "Langkah:" in stripped:
+            section = "CARA"
+            cleaned_lines.append("Cara Membuat:")
+            continue
+        elif "Informasi Gizi" in stripped or "Info Nutrisi" in stripped:
+            section = "GIZI"
+            cleaned_lines.append("Informasi Gizi (Estimasi per porsi):")
+            continue
+
+        if section == "BAHAN":
+            if stripped.startswith("-"):
+                cleaned_lines.append(stripped)
+            elif stripped[0].isdigit() or stripped[0].isalpha():
+                cleaned_lines.append(f"- {stripped}")
+        elif section == "CARA":
+            cleaned_lines.append(stripped)
+        elif section == "GIZI":
+            valid_keys = ["kalori", "protein", "karbo", "lemak", "kcal", "gram", "g="]
+            if any(k in stripped.lower() for k in valid_keys):
+                cleaned_lines.append(stripped)
+        else:
+            if "Nama Masakan:" in stripped: cleaned_lines.append(stripped)
+
+        seen_lines.append(stripped)
+
+    result = '\n'.join(cleaned_lines).strip()
+    if "Informasi Gizi" in result:
+        last_lines = result.split("Informasi Gizi")[-1]
+        if len(last_lines.strip()) < 5:
+            result += "\n- Kalori: Estimasi 350-500 kkal\n- Protein: Data spesifik belum tersedia"
+    else:
+        result += "\n\nInformasi Gizi (Estimasi per porsi):\n- Kalori: Estimasi 350-500 kkal\n- Protein: Data spesifik belum tersedia"
+    return result
+
+# ------------------------------------------
+# Corpus
+# ------------------------------------------
+def load_golden():
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def looping_documents(n=20, repeats=60):
+    """Generation panjang yang terjebak loop (langkah sama dengan nomor berbeda)."""
+    docs = []
+    for d in range(n):
+        steps = "\n".join(f"{i + 1}. Tumis bawang putih dan bawang merah hingga harum, lalu masukkan ayam ke-{d}."
+                          for i in range(repeats))
+        docs.append("Nama Masakan: Ayam Tumis\nBahan-bahan:\n- 500 gr ayam\n- 3 siung bawang putih\n"
+                    f"Cara Membuat:\n{steps}\nInformasi Gizi:\n- Kalori: 420 kcal\n- Protein: 31 gram")
+    return docs
+
+def throughput(fn, docs, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for doc in docs:
+            fn(doc)
+    return repeat * len(docs) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="super_clean_output: legacy vs LoopDetector throughput")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--regenerate", action="store_true", help="tulis ulang expected golden dari legacy")
+    args = parser.parse_args()
+
+    golden = load_golden()
+    if args.regenerate:
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            for item in golden:
+                f.write(json.dumps({'raw': item['raw'], 'expected': legacy_clean_output(item['raw'])}, ensure_ascii=False) + "\n")
+        print(f"Golden expected ditulis ulang: {len(golden)} dokumen")
+        return
+
+    mismatches = [i for i, item in enumerate(golden) if super_clean_output(item['raw']) != item['expected']]
+    print(f"Golden corpus: {len(golden) - len(mismatches)}/{len(golden)} identik")
+    if mismatches:
+        sys.exit(f"Output berbeda di dokumen: {mismatches}")
+
+    loops = looping_documents()
+    assert all(super_clean_output(doc) == legacy_clean_output(doc) for doc in loops)
+
+    print(f"\n{'corpus':<10}{'legacy doc/s':>14}{'new doc/s':>12}{'speedup':>9}")
+    for name, docs in (("golden", [item['raw'] for item in golden]), ("looping", loops)):
+        legacy = throughput(legacy_clean_output, docs, args.repeat)
+        new = throughput(super_clean_output, docs, args.repeat)
+        print(f"{name:<10}{legacy:>14.0f}{new:>12.0f}{new / legacy:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
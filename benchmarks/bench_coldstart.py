@@ -0,0 +1,108 @@
+# ==========================================
+# Benchmark: Cold Start & Per-Process RSS (pickle vs mmap store)
+# ==========================================
+# Menjalankan N proses worker sekaligus. Tiap worker membuka corpus + index FAISS
+# dengan salah satu cara:
+#   legacy : pd.read_pickle(rag_data.pkl) + faiss.read_index (semua disalin ke heap)
+#   mmap   : RecipeStore.load(mmap) + read_faiss_index(IO_FLAG_MMAP)
+# lalu menjalankan beberapa query. Dilaporkan: waktu buka, RSS, RssAnon (private heap),
+# RssFile (page cache yang bisa dibagi) dan PSS (porsi proses setelah berbagi halaman).
+#
+# Cara pakai (dari root project, setelah model server pernah build cache):
+#   python benchmarks/bench_coldstart.py --workers 4
+# Untuk cold start sungguhan, kosongkan page cache dulu (root):
+#   sync && echo 3 > /proc/sys/vm/drop_caches
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+from rag_utils import RecipeStore
+
+LEGACY_PKL = os.path.join(model_server.BASE_DIR, 'models', 'bench_rag_data.pkl')
+
+def proc_memory_kb():
+    stats = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key = line.split(':')[0]
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                stats[key] = int(line.split()[1])
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    stats['Pss'] = int(line.split()[1])
+    except OSError:
+        stats['Pss'] = -1
+    return stats
+
+def worker(kind, queries, barrier, results):
+    import pandas as pd
+    started = time.perf_counter()
+    if kind == "legacy":
+        df_rag = pd.read_pickle(LEGACY_PKL)
+        index = model_server.faiss.read_index(model_server.FAISS_INDEX_PATH)
+        fetch = lambda i: df_rag.iloc[i]['Title']
+    else:
+        store = RecipeStore.load(model_server.RAG_STORE_DIR, mmap=True)
+        index = model_server.read_faiss_index(model_server.FAISS_INDEX_PATH, mmap=True)
+        fetch = lambda i: store.text('Title', i)
+    open_s = time.perf_counter() - started
+
+    _, ids = index.search(queries, 15)
+    for i in ids[:, 0]:
+        fetch(int(i))
+    first_query_s = time.perf_counter() - started
+
+    barrier.wait()  # semua worker hidup bersamaan -> halaman bersama terlihat di PSS
+    results.put({'open_s': open_s, 'ready_s': first_query_s, **proc_memory_kb()})
+    barrier.wait()
+
+def run(kind, workers, queries):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(kind, queries, barrier, results)) for _ in range(workers)]
+    for p in procs: p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs: p.join()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start & RSS: pickle vs mmap store")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=32)
+    args = parser.parse_args()
+
+    if not RecipeStore.exists(model_server.RAG_STORE_DIR) or not os.path.exists(model_server.FAISS_INDEX_PATH):
+        sys.exit("Cache belum ada. Jalankan model server sekali untuk build cache.")
+
+    # Buat pickle pembanding dengan kolom yang sama
+    if not os.path.exists(LEGACY_PKL):
+        import pandas as pd
+        store = RecipeStore.load(model_server.RAG_STORE_DIR, mmap=False)
+        data = {col: [store.text(col, i) for i in range(len(store))] for col in RecipeStore.TEXT_COLUMNS}
+        for col in RecipeStore.NUMERIC_COLUMNS:
+            data[col] = np.array(store.numeric[col])
+        pd.DataFrame(data).to_pickle(LEGACY_PKL)
+
+    index = model_server.faiss.read_index(model_server.FAISS_INDEX_PATH)
+    queries = np.random.default_rng(0).standard_normal((args.queries, index.d)).astype('float32')
+    del index
+
+    print(f"{'mode':<8}{'open ms':>9}{'ready ms':>10}{'RSS MB':>9}{'Anon MB':>9}{'File MB':>9}{'PSS MB':>9}")
+    for kind in ("legacy", "mmap"):
+        rows = run(kind, args.workers, queries)
+        avg = lambda key: sum(r[key] for r in rows) / len(rows)
+        print(f"{kind:<8}{avg('open_s') * 1000:>9.1f}{avg('ready_s') * 1000:>10.1f}"
+              f"{avg('VmRSS') / 1024:>9.1f}{avg('RssAnon') / 1024:>9.1f}{avg('RssFile') / 1024:>9.1f}{avg('Pss') / 1024:>9.1f}")
+    print(f"(rata-rata per proses, {args.workers} worker berjalan bersamaan)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# ==========================================
+# Benchmark: Tokens/sec Backend CPU
+# ==========================================
+# Memuat model dengan MODEL_BACKEND=cpu (adapter di-merge + CPU_QUANTIZE), lalu
+# menjalankan generate_raw_batch sekuensial (batch 1, seperti request tunggal) untuk
+# beberapa jumlah thread intra-op. Dilaporkan token baru / detik dan latency per request.
+#
+# Cara pakai (dari root project):
+#   python benchmarks/bench_cpu.py --requests 4 --threads 1,2,4,8
+#   CPU_QUANTIZE=none python benchmarks/bench_cpu.py --requests 4   # pembanding float32
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+
+os.environ.setdefault("MODEL_BACKEND", "cpu")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+
+SAMPLE_BAHAN = [
+    ("ayam, bawang putih, kecap manis", "normal"),
+    ("tempe, cabai, bawang merah", "normal"),
+    ("telur, tomat", "diet"),
+    ("tahu, kangkung", "diet"),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens/sec of the CPU inference backend")
+    parser.add_argument("--requests", type=int, default=4)
+    parser.add_argument("--threads", default=str(model_server.CPU_NUM_THREADS), help="daftar thread, mis. 1,2,4")
+    parser.add_argument("--max-new-tokens", type=int, default=model_server.MAX_NEW_TOKENS)
+    args = parser.parse_args()
+
+    model_server.MAX_NEW_TOKENS = args.max_new_tokens
+    model_server.load_resources()
+    if model_server.model is None:
+        sys.exit("Model gagal dimuat.")
+
+    prompts = []
+    for i in range(args.requests):
+        bahan, mode = SAMPLE_BAHAN[i % len(SAMPLE_BAHAN)]
+        context = model_server.retrieve_smart_filter(bahan, mode)
+        prompts.append(model_server.build_prompt(bahan, mode, context))
+    model_server.generate_raw_batch(prompts[:1])  # warmup (+ KV cache prefix)
+
+    print(f"=== CPU backend (quantize={model_server.CPU_QUANTIZE}, {args.requests} requests, batch 1) ===")
+    print(f"{'threads':>8}{'tok/s':>9}{'mean s':>9}{'p95 s':>9}{'tokens':>9}")
+    for threads in [int(t) for t in args.threads.split(",")]:
+        torch.set_num_threads(threads)
+        latencies, tokens = [], 0
+        for prompt in prompts:
+            started = time.perf_counter()
+            _, n_tokens = model_server.generate_raw_batch([prompt])[0]
+            latencies.append(time.perf_counter() - started)
+            tokens += n_tokens
+        print(f"{threads:>8}{tokens / sum(latencies):>9.1f}{np.mean(latencies):>9.2f}"
+              f"{np.percentile(latencies, 95):>9.2f}{tokens:>9}")
+
+if __name__ == "__main__":
+    main()
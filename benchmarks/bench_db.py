@@ -0,0 +1,118 @@
+# ==========================================
+# Benchmark: SQLite History (Baca + Simpan Bersamaan)
+# ==========================================
+# --threads thread menjalankan campuran get_user_history (halaman acak) dan save_recipe_to_history
+# (--write-ratio) pada DB sementara yang sudah berisi --rows history:
+#   legacy : sqlite3.connect per panggilan + rollback journal (DELETE), synchronous FULL
+#   pooled : db_utils (connection per thread dipakai ulang, WAL, synchronous NORMAL, statement cache)
+# Dilaporkan: operasi/detik, latency baca & simpan (p50 / p95), dan jumlah error (database is locked).
+#
+# Cara pakai (dari root project):
+#   python benchmarks/bench_db.py --threads 8 --ops 500 --write-ratio 0.2
+import io
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+from contextlib import redirect_stdout
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_utils
+
+USERS = 50
+
+def legacy_save(user_id, bahan, resep_text):
+    """Pola lama: connect -> satu statement -> commit -> close."""
+    conn = sqlite3.connect(db_utils.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO history (user_id, input_bahan, resep_text) VALUES (?, ?, ?)', (user_id, bahan, resep_text))
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid
+
+def legacy_history(user_id, page=1, per_page=6):
+    conn = sqlite3.connect(db_utils.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM history WHERE user_id = ?", (user_id,))
+    total_items = cursor.fetchone()[0]
+    cursor.execute("SELECT * FROM history WHERE user_id = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                   (user_id, per_page, (page - 1) * per_page))
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return {'data': rows, 'meta': {'total_items': total_items}}
+
+def setup_db(variant, rows):
+    """DB baru di folder sementara, diisi history awal."""
+    db_utils.DB_FOLDER = tempfile.mkdtemp(prefix=f"bench_db_{variant}_")
+    db_utils.DB_PATH = os.path.join(db_utils.DB_FOLDER, db_utils.DB_NAME)
+    with redirect_stdout(io.StringIO()):
+        db_utils.init_db()
+    with db_utils.db_cursor(write=True) as cursor:
+        cursor.executemany('INSERT INTO history (user_id, input_bahan, resep_text) VALUES (?, ?, ?)',
+                           [(i % USERS + 1, "ayam, bawang", "Nama Masakan: Ayam\n" * 20) for i in range(rows)])
+    db_utils.close_connection()
+    if variant == "legacy":
+        conn = sqlite3.connect(db_utils.DB_PATH)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+
+def run(variant, threads, ops, write_ratio):
+    save, history = (legacy_save, legacy_history) if variant == "legacy" else (
+        db_utils.save_recipe_to_history, db_utils.get_user_history)
+    reads, writes, errors = [], [], []
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local_reads, local_writes = [], []
+        for _ in range(ops):
+            user_id = rng.randint(1, USERS)
+            started = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    if save(user_id, "ayam, bawang", "Nama Masakan: Ayam\n" * 20) is None:
+                        raise sqlite3.OperationalError("save gagal")
+                    local_writes.append((time.perf_counter() - started) * 1000)
+                else:
+                    history(user_id, page=rng.randint(1, 3))
+                    local_reads.append((time.perf_counter() - started) * 1000)
+            except sqlite3.Error as e:
+                with lock:
+                    errors.append(str(e))
+        with lock:
+            reads.extend(local_reads)
+            writes.extend(local_writes)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):  # log [DB] per simpan
+        for t in workers: t.start()
+        for t in workers: t.join()
+    total_s = time.perf_counter() - started
+    return (len(reads) + len(writes)) / total_s, reads, writes, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent history reads + saves: per-call connect vs pooled WAL")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=500, help="operasi per thread")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--rows", type=int, default=5000, help="history awal")
+    args = parser.parse_args()
+
+    print(f"=== SQLite history ({args.threads} threads x {args.ops} ops, write {args.write_ratio:.0%}, {args.rows} rows) ===")
+    print(f"{'variant':<8}{'ops/s':>9}{'read p50':>10}{'read p95':>10}{'save p50':>10}{'save p95':>10}{'errors':>8}")
+    for variant in ("legacy", "pooled"):
+        setup_db(variant, args.rows)
+        ops_s, reads, writes, errors = run(variant, args.threads, args.ops, args.write_ratio)
+        print(f"{variant:<8}{ops_s:>9.0f}{np.percentile(reads, 50):>10.2f}{np.percentile(reads, 95):>10.2f}"
+              f"{np.percentile(writes, 50):>10.2f}{np.percentile(writes, 95):>10.2f}{len(errors):>8}")
+
+if __name__ == "__main__":
+    main()
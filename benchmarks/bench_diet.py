@@ -0,0 +1,77 @@
+# ==========================================
+# Benchmark: Mode Diet (Top-15 Re-sort vs Subset Bernutrisi)
+# ==========================================
+# Membandingkan per query:
+#   legacy : top-15 biasa lalu ambil protein tertinggi (fallback ke kandidat #1 kalau
+#            tidak ada yang punya data nutrisi -> diam-diam jadi mode normal)
+#   subset : search di subset resep bernutrisi + skor gabungan relevansi/protein/kalori
+# Dilaporkan: latency (ms/query, termasuk mode normal sebagai acuan) dan persentase
+# query yang benar-benar dapat resep dengan data nutrisi.
+#
+# Cara pakai (dari root project, tanpa load LLM):
+#   python benchmarks/bench_diet.py --queries 300
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+from rag_utils import select_best_candidate
+
+def make_queries(n, rng):
+    """Query = 2-3 bahan dari resep acak (tidak harus yang bernutrisi)."""
+    store = model_server.recipe_store
+    queries = []
+    for pos in rng.choice(len(store), size=n, replace=len(store) < n):
+        parts = [p.strip() for p in store.text('Ingredients', int(pos)).split('--') if p.strip()]
+        if parts:
+            queries.append(", ".join(parts[:3])[:120])
+    return queries
+
+def legacy_diet(query, retrieval):
+    candidates = model_server.search_candidates(query, 15, retrieval)
+    return select_best_candidate(model_server.recipe_store, candidates, "diet")
+
+def subset_diet(query, retrieval):
+    positions, scores = model_server.search_candidates(query, model_server.DIET_POOL, retrieval,
+                                                       model_server.nutrition_mask, return_scores=True)
+    return model_server.rank_diet_candidates(model_server.recipe_store, positions, scores,
+                                             model_server.DIET_W_SIMILARITY, model_server.DIET_W_PROTEIN,
+                                             model_server.DIET_W_CALORIES)
+
+def normal(query, retrieval):
+    candidates = model_server.search_candidates(query, 15, retrieval)
+    return select_best_candidate(model_server.recipe_store, candidates, "normal")
+
+def main():
+    parser = argparse.ArgumentParser(description="Diet mode: top-15 re-sort vs nutrition-known subset")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--retrieval", choices=model_server.RETRIEVAL_MODES, default=model_server.RETRIEVAL_MODE)
+    args = parser.parse_args()
+
+    model_server.load_rag_resources()
+    queries = make_queries(args.queries, np.random.default_rng(11))
+    proteins = model_server.recipe_store.proteins
+    normal(queries[0], args.retrieval)  # warmup
+
+    print(f"Subset bernutrisi: {int(model_server.nutrition_mask.sum())}/{len(model_server.recipe_store)} resep, "
+          f"{len(queries)} queries, retrieval={args.retrieval}\n")
+    print(f"{'path':<8}{'mean ms':>9}{'p95 ms':>9}{'nutrisi %':>11}{'protein':>9}")
+    for name, fn in (("normal", normal), ("legacy", legacy_diet), ("subset", subset_diet)):
+        latencies, picked = [], []
+        for query in queries:
+            started = time.perf_counter()
+            best = fn(query, args.retrieval)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if best is not None: picked.append(best)
+        picked = np.array(picked, dtype='int64')
+        has_nutrition = proteins[picked] > 0
+        mean_protein = proteins[picked][has_nutrition].mean() if has_nutrition.any() else float('nan')
+        print(f"{name:<8}{np.mean(latencies):>9.2f}{np.percentile(latencies, 95):>9.2f}"
+              f"{has_nutrition.mean() * 100:>11.1f}{mean_protein:>9.1f}")
+
+if __name__ == "__main__":
+    main()
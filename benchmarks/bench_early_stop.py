@@ -0,0 +1,78 @@
+# ==========================================
+# Benchmark: Early Stop (Kill Switch / Gizi Selesai / Repetition)
+# ==========================================
+# Replay raw generation dari golden corpus token demi token lewat CleanerStoppingCriteria
+# (tanpa model, hanya tokenizer). Dilaporkan per alasan berhenti:
+#   - berapa generation yang berhenti lebih awal
+#   - token yang dihemat (token sesudah titik berhenti)
+#   - output bersih yang berubah akibat early stop (kill switch harus 0)
+# plus overhead stopping criteria per token.
+#
+# Cara pakai (dari root project):
+#   python benchmarks/bench_early_stop.py
+#   LOOP_MAX_REPEATED_LINES=2 LOOP_NGRAM_SIZE=12 python benchmarks/bench_early_stop.py
+import os
+import sys
+import json
+import time
+import argparse
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+from clean_utils import super_clean_output
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'clean_output.jsonl')
+
+def replay(raw):
+    """Return: (jumlah token total, token saat berhenti atau None, alasan, detik di criteria)."""
+    token_ids = model_server.tokenizer(raw, add_special_tokens=False)["input_ids"]
+    input_ids = torch.tensor([token_ids], dtype=torch.long)
+    # Replay tidak bisa membelokkan output yang sudah jadi -> loop selalu dihitung sebagai stop
+    criteria = model_server.CleanerStoppingCriteria(0, 1, model_server.EARLY_STOP_ENABLED, model_server.LOOP_STOP_ENABLED)
+    started = time.perf_counter()
+    for t in range(1, len(token_ids) + 1):
+        if criteria(input_ids[:, :t], None)[0]:
+            break
+    return len(token_ids), criteria.stopped_at[0], criteria.reasons[0], time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens saved by cleaner-driven early stopping")
+    parser.add_argument("--tokenizer", default="Qwen/Qwen2-1.5B-Instruct")
+    args = parser.parse_args()
+
+    model_server.tokenizer = model_server.AutoTokenizer.from_pretrained(args.tokenizer, trust_remote_code=True)
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        docs = [json.loads(line)['raw'] for line in f if line.strip()]
+
+    reasons = model_server.EarlyStopStats.REASONS
+    stopped = {reason: 0 for reason in reasons}
+    saved = {reason: 0 for reason in reasons}
+    changed = {reason: 0 for reason in reasons}
+    total_tokens, seconds, steps = 0, 0.0, 0
+    for raw in docs:
+        n_tokens, stopped_at, reason, elapsed = replay(raw)
+        total_tokens += n_tokens
+        seconds += elapsed
+        steps += stopped_at or n_tokens
+        if reason is None: continue
+
+        stopped[reason] += 1
+        saved[reason] += n_tokens - stopped_at
+        kept = model_server.tokenizer.decode(model_server.tokenizer(raw, add_special_tokens=False)["input_ids"][:stopped_at])
+        if super_clean_output(kept) != super_clean_output(raw):
+            changed[reason] += 1
+
+    print(f"Generation: {len(docs)} ({total_tokens} token), thresholds loop: "
+          f"{model_server.LOOP_MAX_REPEATED_LINES} baris / {model_server.LOOP_NGRAM_SIZE}-gram x{model_server.LOOP_NGRAM_MAX_REPEATS}\n")
+    print(f"{'alasan':<13}{'stop':>6}{'token hemat':>13}{'output berubah':>16}")
+    for reason in reasons:
+        print(f"{reason:<13}{stopped[reason]:>6}{saved[reason]:>13}{changed[reason]:>16}")
+    total_saved = sum(saved.values())
+    print(f"\nToken dihemat         : {total_saved} ({total_saved / max(total_tokens, 1) * 100:.1f}%)")
+    print(f"Rata-rata per request : {total_saved / len(docs):.1f} token")
+    print(f"Overhead criteria     : {seconds / max(steps, 1) * 1e6:.1f} us/token")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# ==========================================
+# Benchmark: Filter Bahan Include / Exclude
+# ==========================================
+# Membandingkan 3 cara menjawab "wajib ada X, tanpa Y" (retrieval dense):
+#   postfilter : FAISS top-15 biasa lalu buang kandidat yang tidak lolos (cara lama)
+#   selector   : FAISS dibatasi IDSelectorBatch dari bitmap bahan
+#   bruteforce : exact search langsung di embeddings resep yang lolos
+# Dilaporkan per tingkat selektivitas: latency dan rata-rata jumlah kandidat valid (maks 15).
+#
+# Cara pakai (dari root project, tanpa load LLM):
+#   python benchmarks/bench_filter.py --queries 100
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+from rag_utils import tokenize
+
+K = 15
+QUERIES = ["ayam goreng", "sayur bening", "sambal pedas", "tumis sederhana", "kue manis", "sup hangat"]
+
+def pick_filters(rng, n):
+    """Filter acak (1-2 include, 0-1 exclude) dari token bahan, dikelompokkan per selektivitas."""
+    bitmap = model_server.ingredient_index
+    buckets = {"< 0.1%": [], "0.1-1%": [], "1-10%": [], "> 10%": []}
+    for _ in range(200 * n * len(buckets)):  # batas percobaan: bucket yang tidak mungkin terisi dibiarkan kosong
+        if min(len(v) for v in buckets.values()) >= n: break
+        pos = int(rng.integers(len(model_server.recipe_store)))
+        tokens = sorted(set(tokenize(model_server.recipe_store.text('Ingredients', pos).replace('--', ' '))))
+        if len(tokens) < 2: continue
+        include = list(rng.choice(tokens, size=int(rng.integers(1, 3)), replace=False))
+        exclude = list(rng.choice(bitmap.terms, size=int(rng.integers(0, 2)), replace=False))
+        allowed = bitmap.allowed_mask(include, exclude)
+        if allowed is None or not allowed.any(): continue
+        ratio = allowed.mean()
+        name = "< 0.1%" if ratio < 0.001 else "0.1-1%" if ratio < 0.01 else "1-10%" if ratio < 0.1 else "> 10%"
+        if len(buckets[name]) < n:
+            buckets[name].append(allowed)
+    return buckets
+
+def run(strategy, query, allowed):
+    if strategy == "postfilter":
+        positions, _ = model_server.dense_search(query, K)
+        positions = positions[positions != -1]
+        return positions[allowed[positions]]
+    model_server.FILTER_BRUTE_FORCE_MAX = len(allowed) if strategy == "bruteforce" else 0
+    positions, _ = model_server.dense_search(query, K, allowed)
+    return positions[positions != -1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency & hit count of ingredient filter strategies")
+    parser.add_argument("--queries", type=int, default=100, help="jumlah filter per bucket selektivitas")
+    args = parser.parse_args()
+
+    model_server.load_rag_resources()
+    buckets = pick_filters(np.random.default_rng(3), args.queries)
+
+    print(f"{'selectivity':<13}{'strategy':<12}{'mean ms':>9}{'p95 ms':>9}{'hits':>7}")
+    for name, masks in buckets.items():
+        if not masks: continue
+        for strategy in ("postfilter", "selector", "bruteforce"):
+            latencies, hits = [], []
+            for i, allowed in enumerate(masks):
+                query = QUERIES[i % len(QUERIES)]
+                started = time.perf_counter()
+                found = run(strategy, query, allowed)
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits.append(len(found))
+            print(f"{name:<13}{strategy:<12}{np.mean(latencies):>9.2f}{np.percentile(latencies, 95):>9.2f}{np.mean(hits):>7.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# ==========================================
+# Benchmark: HTTP Client Web App -> Model Server
+# ==========================================
+# Stub model server lokal (werkzeug, HTTP/1.1 keep-alive, respon JSON /api/generate instan)
+# supaya yang terukur hanya overhead client:
+#   legacy      : requests.post baru per request (TCP connect tiap kali) + gc.collect()
+#   legacy_nogc : requests.post baru per request, tanpa gc.collect()
+#   pooled      : utils.call_model_server (Session keep-alive, timeout, retry, circuit breaker)
+# --heap-objects mensimulasikan heap proses web app (biaya gc.collect naik dengan jumlah objek).
+#
+# Cara pakai (dari root project):
+#   python benchmarks/bench_http_client.py --requests 500 --heap-objects 500000
+import os
+import gc
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+import requests
+from flask import Flask, jsonify
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+RESEP = "Nama Masakan: Ayam Kecap\nBahan-bahan:\n- ayam\n- kecap manis\nCara Membuat:\n1. Masak.\n" * 4
+
+def start_stub():
+    stub = Flask("stub_model_server")
+
+    @stub.route('/api/generate', methods=['POST'])
+    def generate():
+        return jsonify({'error_code': 0, 'success': True, 'message': 'ok', 'data': {'resep': RESEP, 'mode': 'normal'}})
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, stub, threaded=True, request_handler=KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def legacy_call(url, collect):
+    response = requests.post(f"{url}/api/generate", json={"bahan": "ayam", "mode": "normal"},
+                             headers={"X-API-Key": os.environ["API_KEY"]})
+    response.raise_for_status()
+    data = response.json()
+    if collect:
+        gc.collect()
+    return data
+
+def pooled_call():
+    response = utils.call_model_server("/api/generate", {"bahan": "ayam", "mode": "normal"})
+    response.raise_for_status()
+    return response.json()
+
+def measure(fn, n):
+    fn()  # warmup (koneksi pertama)
+    latencies = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request overhead: new connection + gc.collect vs pooled session")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--heap-objects", type=int, default=500000)
+    args = parser.parse_args()
+
+    server, url = start_stub()
+    os.environ["MODEL_SERVER_URL"] = url
+    os.environ.setdefault("API_KEY", "bench")
+    heap = [{'i': i, 'name': f'obj{i}'} for i in range(args.heap_objects)]
+
+    started = time.perf_counter()
+    gc.collect()
+    gc_ms = (time.perf_counter() - started) * 1000
+
+    print(f"=== Web -> model server client ({args.requests} requests, heap {len(heap)} objek, gc.collect {gc_ms:.1f} ms) ===")
+    print(f"{'client':<13}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    results = {}
+    for name, fn in (("legacy", lambda: legacy_call(url, True)),
+                     ("legacy_nogc", lambda: legacy_call(url, False)),
+                     ("pooled", pooled_call)):
+        latencies = measure(fn, args.requests)
+        results[name] = np.mean(latencies)
+        print(f"{name:<13}{np.mean(latencies):>9.3f}{np.percentile(latencies, 50):>9.3f}{np.percentile(latencies, 95):>9.3f}")
+
+    print(f"\nGC pause dihapus      : {results['legacy'] - results['legacy_nogc']:.3f} ms/request")
+    print(f"Connection setup hemat: {results['legacy_nogc'] - results['pooled']:.3f} ms/request")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# ==========================================
+# Benchmark: Checkpoint Merged vs Base + PEFT Adapter
+# ==========================================
+# Tiap varian dijalankan di subprocess terpisah (cold start yang adil):
+#   peft   : USE_MERGED_MODEL=false -> base + PeftModel.from_pretrained (LoRA per forward)
+#   merged : USE_MERGED_MODEL=true  -> checkpoint hasil `python model_server.py merge-adapter`
+# Dilaporkan: waktu load model (startup), latency forward prompt penuh (prefill),
+# dan tokens/sec generate_raw_batch. Backend mengikuti MODEL_BACKEND.
+#
+# Cara pakai (dari root project, setelah merge-adapter):
+#   python benchmarks/bench_merged.py --runs 5 --max-new-tokens 128
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+
+SAMPLE_BAHAN = [
+    ("ayam, bawang putih, kecap manis", "normal"),
+    ("tempe, cabai, bawang merah", "normal"),
+    ("telur, tomat", "diet"),
+]
+
+def measure(runs, max_new_tokens):
+    """Dijalankan di subprocess: satu varian, hasil dicetak sebagai JSON."""
+    model_server.load_rag_resources()
+    model_server.MAX_NEW_TOKENS = max_new_tokens
+    model_server.PREFIX_CACHE_ENABLED = False  # ukur forward prompt penuh
+
+    started = time.perf_counter()
+    model_server.model = model_server.load_model().eval()
+    load_s = time.perf_counter() - started
+    model_server.tokenizer = model_server.AutoTokenizer.from_pretrained(model_server.BASE_MODEL_NAME, trust_remote_code=True)
+    model_server.tokenizer.padding_side = "left"
+    if model_server.tokenizer.pad_token is None:
+        model_server.tokenizer.pad_token = model_server.tokenizer.eos_token
+
+    prompts = [model_server.build_prompt(bahan, mode, model_server.retrieve_smart_filter(bahan, mode))
+               for bahan, mode in SAMPLE_BAHAN]
+    model_server.generate_raw_batch(prompts[:1])  # warmup
+
+    prefill_ms = []
+    for _ in range(runs):
+        for prompt in prompts:
+            inputs = model_server.prepare_generate_inputs([prompt])
+            started = time.perf_counter()
+            with torch.no_grad():
+                model_server.model(**inputs)
+            if torch.cuda.is_available(): torch.cuda.synchronize()
+            prefill_ms.append((time.perf_counter() - started) * 1000)
+
+    tokens, gen_s = 0, 0.0
+    for prompt in prompts:
+        started = time.perf_counter()
+        tokens += model_server.generate_raw_batch([prompt])[0][1]
+        gen_s += time.perf_counter() - started
+
+    print(json.dumps({'load_s': load_s, 'prefill_ms': float(np.mean(prefill_ms)), 'tok_s': tokens / gen_s}))
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup & latency: merged checkpoint vs PEFT-wrapped model")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.runs, args.max_new_tokens)
+        return
+
+    if not os.path.exists(os.path.join(model_server.MERGED_MODEL_PATH, 'config.json')):
+        sys.exit("Checkpoint merged belum ada. Jalankan: python model_server.py merge-adapter")
+
+    print(f"=== Merged vs PEFT (backend={model_server.MODEL_BACKEND}, {args.runs} runs) ===")
+    print(f"{'variant':<8}{'load s':>9}{'prefill ms':>12}{'tok/s':>9}")
+    for variant, flag in (("peft", "false"), ("merged", "true")):
+        env = dict(os.environ, USE_MERGED_MODEL=flag)
+        out = subprocess.run([sys.executable, __file__, "--measure", "--runs", str(args.runs),
+                              "--max-new-tokens", str(args.max_new_tokens)],
+                             env=env, capture_output=True, text=True, check=True)
+        row = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{variant:<8}{row['load_s']:>9.2f}{row['prefill_ms']:>12.2f}{row['tok_s']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# ==========================================
+# Benchmark: Prefill Latency dengan / tanpa Prompt-Prefix KV Cache
+# ==========================================
+# Prefill = forward pass atas seluruh prompt sebelum token pertama di-generate.
+#   full   : tokenisasi prompt lengkap + forward semua token (jalur lama)
+#   cached : salinan KV cache prefix (Instruction + Aturan) + forward suffix saja
+#            ([CONTEXT] + ### Input), lewat model_server.prepare_generate_inputs
+# Dilaporkan latency per batch (mean / p95), token yang di-prefill, dan selisih
+# maksimum logits token terakhir (sanity: kedua jalur harus memberi distribusi sama).
+#
+# --quality N: generate N resep (seed sama per sampel) dengan 3 jalur lalu bandingkan output:
+#   original : model_server.build_prompt_original (template saat adapter di-train, dipakai kalau
+#              PREFIX_CACHE_ENABLED=false)
+#   prefix   : template prefix-friendly, tanpa cache (prompt string utuh)
+#   cached   : template prefix-friendly + KV cache prefix
+# Dilaporkan: kelengkapan 4 section format, kemiripan teks vs original, dan cached == prefix.
+# --golden FILE: output original disimpan ke FILE (kalau belum ada) atau dibaca dari FILE sebagai
+# referensi, jadi perubahan template / model berikutnya dibandingkan dengan output golden yang sama.
+# Aktifkan PREFIX_CACHE_ENABLED hanya kalau kolom cached tidak lebih buruk dari original.
+#
+# Cara pakai (dari root project):
+#   python benchmarks/bench_prefill.py --runs 20 --batch-size 1
+#   python benchmarks/bench_prefill.py --runs 20 --batch-size 4
+#   python benchmarks/bench_prefill.py --runs 5 --quality 8 --golden benchmarks/golden_prefill.json
+import os
+import sys
+import json
+import time
+import difflib
+import argparse
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+
+SAMPLE_BAHAN = [
+    "ayam, bawang putih, kecap manis",
+    "tempe, cabai, bawang merah",
+    "telur, tomat",
+    "udang, santan, cabai",
+    "tahu, kangkung",
+    "ikan, kunyit, jahe",
+    "daging sapi, kentang",
+    "jamur, sawi",
+]
+SECTIONS = ("nama masakan", "bahan-bahan", "cara membuat", "informasi gizi")
+
+def sync():
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+def prefill_full(prompts):
+    texts = [prefix + suffix for prefix, suffix in prompts]
+    inputs = model_server.tokenizer(texts, return_tensors="pt", padding=True).to(model_server.model.device)
+    with torch.no_grad():
+        logits = model_server.model(**inputs, use_cache=True).logits
+    return logits[:, -1, :].float(), int(inputs['input_ids'].numel())
+
+def prefill_cached(prompts):
+    inputs = model_server.prepare_generate_inputs(prompts)
+    past = inputs['past_key_values']
+    prefix_len = past.get_seq_length()
+    with torch.no_grad():
+        logits = model_server.model(input_ids=inputs['input_ids'][:, prefix_len:],
+                                    attention_mask=inputs['attention_mask'],
+                                    past_key_values=past, use_cache=True).logits
+    return logits[:, -1, :].float(), int(inputs['input_ids'][:, prefix_len:].numel())
+
+def generate_clean(prompt, seed):
+    torch.manual_seed(seed)
+    raw_output, _ = model_server.generate_raw_batch([prompt])[0]
+    return model_server.super_clean_output(raw_output)
+
+def quality_check(samples, mode, golden=None):
+    """
+    Tugas: Bandingkan output template asli vs template prefix (tanpa / dengan KV cache).
+    golden: list output original tersimpan (dipakai sebagai referensi, tidak di-generate ulang).
+    Return: dict path -> list output bersih (urutan = sampel).
+    """
+    outputs = {'original': list(golden or [])[:samples], 'prefix': [], 'cached': []}
+    for i in range(samples):
+        bahan = SAMPLE_BAHAN[i % len(SAMPLE_BAHAN)]
+        context = model_server.retrieve_smart_filter(bahan, mode)
+        prefix, suffix = model_server.build_prompt(bahan, mode, context)
+        if i >= len(outputs['original']):
+            outputs['original'].append(generate_clean(model_server.build_prompt_original(bahan, mode, context), seed=i))
+        outputs['prefix'].append(generate_clean(prefix + suffix, seed=i))  # string -> jalur tanpa cache
+        outputs['cached'].append(generate_clean((prefix, suffix), seed=i))
+    return outputs
+
+def report_quality(outputs):
+    print(f"\n=== Kualitas output ({len(outputs['original'])} sampel) ===")
+    print(f"{'path':<10}{'format lengkap':>16}{'rata2 chars':>13}{'mirip original':>16}")
+    for path, texts in outputs.items():
+        complete = np.mean([all(section in text.lower() for section in SECTIONS) for text in texts])
+        similarity = np.mean([difflib.SequenceMatcher(None, text, ref).ratio()
+                              for text, ref in zip(texts, outputs['original'])])
+        print(f"{path:<10}{complete:>16.0%}{np.mean([len(t) for t in texts]):>13.0f}{similarity:>16.2f}")
+    same = sum(a == b for a, b in zip(outputs['prefix'], outputs['cached']))
+    print(f"cached == prefix (tanpa cache): {same}/{len(outputs['prefix'])}")
+
+def timed(fn, prompts, runs):
+    latencies = []
+    for _ in range(runs):
+        sync()
+        started = time.perf_counter()
+        logits, tokens = fn(prompts)
+        sync()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, logits, tokens
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefill latency with / without prompt-prefix KV cache")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--mode", choices=["normal", "diet"], default="normal")
+    parser.add_argument("--quality", type=int, default=0, help="jumlah sampel cek kualitas output (0 = lewati)")
+    parser.add_argument("--golden", default=None, help="file JSON output original (dibuat kalau belum ada)")
+    args = parser.parse_args()
+
+    model_server.load_resources()
+    model_server.PREFIX_CACHE_ENABLED = True
+
+    prompts = []
+    for i in range(args.batch_size):
+        bahan = SAMPLE_BAHAN[i % len(SAMPLE_BAHAN)]
+        context = model_server.retrieve_smart_filter(bahan, args.mode)
+        prompts.append(model_server.build_prompt(bahan, args.mode, context))
+
+    # Warmup (sekaligus menghitung KV cache prefix, di luar pengukuran)
+    prefill_full(prompts)
+    prefill_cached(prompts)
+
+    full_ms, full_logits, full_tokens = timed(prefill_full, prompts, args.runs)
+    cached_ms, cached_logits, cached_tokens = timed(prefill_cached, prompts, args.runs)
+    diff = (full_logits - cached_logits).abs().max().item()
+    same_top = bool((full_logits.argmax(-1) == cached_logits.argmax(-1)).all())
+
+    print(f"=== Prefill ({args.runs} runs, batch={args.batch_size}, mode={args.mode}) ===")
+    print(f"{'path':<8}{'mean ms':>10}{'p95 ms':>10}{'tokens':>9}")
+    print(f"{'full':<8}{np.mean(full_ms):>10.2f}{np.percentile(full_ms, 95):>10.2f}{full_tokens:>9}")
+    print(f"{'cached':<8}{np.mean(cached_ms):>10.2f}{np.percentile(cached_ms, 95):>10.2f}{cached_tokens:>9}")
+    print(f"Speedup: {np.mean(full_ms) / np.mean(cached_ms):.2f}x")
+    print(f"Max |logit diff| token terakhir: {diff:.4f} (argmax sama: {same_top})")
+    print(f"Prefix cache: {model_server.prefix_cache.get_stats()}")
+
+    if args.quality:
+        golden = None
+        if args.golden and os.path.exists(args.golden):
+            with open(args.golden) as f:
+                saved = json.load(f)
+            if saved.get('mode') == args.mode:
+                golden = saved['outputs']
+                print(f"Referensi original: {len(golden)} output golden dari {args.golden}")
+        outputs = quality_check(args.quality, args.mode, golden)
+        if args.golden and golden is None:
+            with open(args.golden, 'w') as f:
+                json.dump({'mode': args.mode, 'outputs': outputs['original']}, f, ensure_ascii=False, indent=2)
+            print(f"Output original disimpan sebagai golden: {args.golden}")
+        report_quality(outputs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# ==========================================
+# Benchmark: DataFrame vs Columnar RecipeStore
+# ==========================================
+# 1. Micro-benchmark ekstraksi kandidat + ranking diet per query
+#    (versi lama: 15x df_rag.iloc[idx].copy() + sort list of Series).
+# 2. Perbandingan resident memory (RSS) proses yang memegang DataFrame vs RecipeStore.
+#
+# Cara pakai (dari root project, butuh models/rag_store/):
+#   python benchmarks/bench_recipe_store.py --queries 2000
+import os
+import gc
+import sys
+import time
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_utils import RecipeStore, select_best_candidate
+
+RAG_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'rag_store')
+K = 15
+
+def legacy_select(df_rag, ids, mode):
+    """Salinan logika lama retrieve_smart_filter (sebelum RecipeStore)."""
+    candidates = []
+    for i in range(K):
+        idx = ids[i]
+        if idx == -1: continue
+        candidates.append(df_rag.iloc[idx].copy())
+    if not candidates: return None
+    best_item = candidates[0]
+    if mode == "diet":
+        valid_candidates = [c for c in candidates if c['proteins'] > 0]
+        if valid_candidates:
+            valid_candidates.sort(key=lambda x: x['proteins'], reverse=True)
+            best_item = valid_candidates[0]
+    return best_item['Title'], best_item['Ingredients'], best_item['Steps'], best_item['calories'], best_item['proteins']
+
+def store_select(store, ids, mode):
+    best_idx = select_best_candidate(store, ids, mode)
+    if best_idx is None: return None
+    item = store.row(best_idx)
+    return item['Title'], item['Ingredients'], item['Steps'], item['calories'], item['proteins']
+
+def load_dataframe():
+    """DataFrame pembanding, dibangun dari store on-disk (kolom yang sama)."""
+    store = RecipeStore.load(RAG_STORE_DIR, mmap=False)
+    data = {col: [store.text(col, i) for i in range(len(store))] for col in RecipeStore.TEXT_COLUMNS}
+    for col in RecipeStore.NUMERIC_COLUMNS:
+        data[col] = np.array(store.numeric[col])
+    return pd.DataFrame(data)
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+def measure_rss(kind):
+    """Dijalankan di subprocess: RSS setelah memuat corpus dalam bentuk `kind`."""
+    gc.collect()
+    before = rss_mb()
+    if kind == "store":
+        holder = RecipeStore.load(RAG_STORE_DIR, mmap=False)
+    else:
+        holder = load_dataframe()
+    gc.collect()
+    print(f"{rss_mb() - before:.1f}")
+    return holder
+
+def main():
+    parser = argparse.ArgumentParser(description="DataFrame vs RecipeStore candidate extraction")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--rss", choices=["df", "store"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss:
+        measure_rss(args.rss)
+        return
+
+    df_rag = load_dataframe()
+    store = RecipeStore.from_dataframe(df_rag)
+
+    rng = np.random.default_rng(0)
+    queries = rng.integers(0, len(df_rag), size=(args.queries, K))
+    modes = ["diet" if i % 2 else "normal" for i in range(args.queries)]
+
+    # Sanity: hasil harus identik
+    for ids, mode in zip(queries[:200], modes[:200]):
+        assert legacy_select(df_rag, ids, mode) == store_select(store, ids, mode)
+
+    started = time.perf_counter()
+    for ids, mode in zip(queries, modes):
+        legacy_select(df_rag, ids, mode)
+    legacy_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for ids, mode in zip(queries, modes):
+        store_select(store, ids, mode)
+    store_s = time.perf_counter() - started
+
+    print(f"=== Candidate extraction ({args.queries} queries, k={K}) ===")
+    print(f"DataFrame   : {legacy_s / args.queries * 1e6:8.1f} us/query")
+    print(f"RecipeStore : {store_s / args.queries * 1e6:8.1f} us/query ({legacy_s / store_s:.1f}x faster)")
+
+    cols = df_rag[['Title', 'Ingredients', 'Steps', 'calories', 'proteins']]
+    print("\n=== Memory ===")
+    print(f"DataFrame deep size : {cols.memory_usage(deep=True).sum() / 1e6:8.1f} MB")
+    print(f"RecipeStore nbytes  : {store.nbytes / 1e6:8.1f} MB")
+    for kind in ("df", "store"):
+        out = subprocess.run([sys.executable, __file__, "--rss", kind], capture_output=True, text=True, check=True)
+        print(f"RSS delta ({kind:<5})   : {float(out.stdout.strip().splitlines()[-1]):8.1f} MB")
+
+if __name__ == "__main__":
+    main()
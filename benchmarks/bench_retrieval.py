@@ -0,0 +1,67 @@
+# ==========================================
+# Benchmark: Dense vs Lexical (BM25) vs Hybrid Retrieval
+# ==========================================
+# Query dibuat dari resep acak di corpus: 1 bahan paling langka (idf tertinggi)
+# + 1-2 bahan lain dari resep yang sama. Dilaporkan per mode:
+#   - latency (ms/query, termasuk encode transformer kalau dipakai)
+#   - MRR@15 resep sumber
+#   - exact@1: kandidat teratas memuat SEMUA token bahan query
+#
+# Cara pakai (dari root project, tanpa load LLM):
+#   python benchmarks/bench_retrieval.py --queries 300
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+from rag_utils import tokenize
+
+K = 15
+
+def make_queries(n, rng):
+    store, lexical = model_server.recipe_store, model_server.lexical_index
+    queries = []
+    while len(queries) < n:
+        pos = int(rng.integers(len(store)))
+        tokens = sorted(set(tokenize(store.text('Ingredients', pos).replace('--', ' '))))
+        tokens = [t for t in tokens if t in lexical.vocab and len(t) > 2]
+        if len(tokens) < 3: continue
+        idf = np.array([lexical.idf[lexical.vocab[t]] for t in tokens])
+        rare = tokens[int(np.argmax(idf))]
+        others = list(rng.choice([t for t in tokens if t != rare], size=int(rng.integers(1, 3)), replace=False))
+        queries.append((", ".join([rare] + others), pos, set([rare] + others)))
+    return queries
+
+def contains_all(pos, terms):
+    doc = set(tokenize(model_server.recipe_store.text('Title', pos) + " " +
+                       model_server.recipe_store.text('Ingredients', pos).replace('--', ' ')))
+    return terms <= doc
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency & quality of dense / lexical / hybrid retrieval")
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    model_server.load_rag_resources()
+    queries = make_queries(args.queries, np.random.default_rng(7))
+    model_server.search_candidates("ayam", K, "dense")  # warmup
+
+    print(f"{'mode':<10}{'mean ms':>9}{'p95 ms':>9}{'MRR@15':>9}{'exact@1':>9}")
+    for retrieval in model_server.RETRIEVAL_MODES:
+        latencies, rr, exact = [], [], []
+        for text, source, terms in queries:
+            started = time.perf_counter()
+            candidates = model_server.search_candidates(text, K, retrieval)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            candidates = [int(c) for c in candidates if c != -1]
+            rr.append(1.0 / (candidates.index(source) + 1) if source in candidates else 0.0)
+            exact.append(bool(candidates) and contains_all(candidates[0], terms))
+        print(f"{retrieval:<10}{np.mean(latencies):>9.2f}{np.percentile(latencies, 95):>9.2f}{np.mean(rr):>9.3f}{np.mean(exact):>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# ==========================================
+# Harness: Routing Multi Model Server (Load Balancing + Failover)
+# ==========================================
+# Menjalankan beberapa stub model server lokal (werkzeug, /api/generate dengan latency
+# buatan + /api/health), lalu mengirim request lewat utils.call_model_server:
+#   1. even     : semua stub latency sama -> sebaran request harus rata
+#   2. weighted : satu stub lebih lambat -> kebagian lebih sedikit (least outstanding + EWMA)
+#   3. failover : satu stub dimatikan di tengah jalan -> request tetap sukses, stub dikeluarkan
+#   4. recovery : stub dihidupkan lagi di port yang sama -> masuk lagi setelah health check
+#
+# Cara pakai (dari root project):
+#   python benchmarks/bench_routing.py --servers 3 --requests 90 --concurrency 6
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, jsonify
+from requests.exceptions import RequestException
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+os.environ.setdefault("MODEL_HEALTH_INTERVAL", "0.5")
+os.environ.setdefault("API_KEY", "bench")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+class StubServer:
+    """Stub model server di thread sendiri; bisa dimatikan & dihidupkan lagi di port yang sama."""
+
+    def __init__(self, name, latency_s, port=0):
+        self.name, self.latency_s, self.hits = name, latency_s, 0
+        self._lock = threading.Lock()
+        app = Flask(name)
+
+        @app.route('/api/health', methods=['GET'])
+        def health():
+            return jsonify({'error_code': 0, 'success': True, 'message': 'Model server is running.'})
+
+        @app.route('/api/generate', methods=['POST'])
+        def generate():
+            with self._lock:
+                self.hits += 1
+            time.sleep(self.latency_s)
+            return jsonify({'error_code': 0, 'success': True, 'message': 'ok', 'data': {'resep': self.name}})
+
+        self.app = app
+        self.port = port
+        self.start()
+
+    def start(self):
+        self.server = make_server("127.0.0.1", self.port, self.app, threaded=True, request_handler=QuietHandler)
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+def fire(requests, concurrency):
+    """Kirim request paralel. Return: (jumlah sukses, jumlah gagal)."""
+    def one(_):
+        try:
+            return utils.call_model_server("/api/generate", {"bahan": "ayam", "mode": "normal"}).ok
+        except RequestException:
+            return False
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(requests)))
+    return sum(results), len(results) - sum(results)
+
+def report(phase, stubs, ok, failed):
+    hits = ", ".join(f"{s.name}={s.hits}" for s in stubs)
+    states = ", ".join(f"{'up' if e['healthy'] else 'down'}/{e['circuit']}" for e in utils.get_endpoint_pool().get_stats())
+    print(f"{phase:<9} ok={ok:<4} failed={failed:<3} hits: {hits}  [{states}]")
+    for s in stubs: s.hits = 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-aware routing & failover across model servers")
+    parser.add_argument("--servers", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=90)
+    parser.add_argument("--concurrency", type=int, default=6)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000.0
+    stubs = [StubServer(f"s{i}", latency) for i in range(args.servers)]
+    os.environ["MODEL_SERVER_URLS"] = ",".join(s.url for s in stubs)
+    print(f"=== Routing {args.servers} stub ({args.requests} requests, concurrency {args.concurrency}) ===")
+
+    report("even", stubs, *fire(args.requests, args.concurrency))
+
+    stubs[-1].latency_s = latency * 4
+    report("weighted", stubs, *fire(args.requests, args.concurrency))
+    stubs[-1].latency_s = latency
+
+    # Matikan s0 setelah sebagian request terkirim
+    killer = threading.Timer(latency * 3, stubs[0].stop)
+    killer.start()
+    report("failover", stubs, *fire(args.requests, args.concurrency))
+    killer.join()
+
+    stubs[0].start()
+    time.sleep(utils.MODEL_HEALTH_INTERVAL * 3)
+    report("recovery", stubs, *fire(args.requests, args.concurrency))
+
+    utils.get_endpoint_pool().stop()
+    for s in stubs: s.stop()
+
+if __name__ == "__main__":
+    main()
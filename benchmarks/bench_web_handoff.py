@@ -0,0 +1,182 @@
+# ==========================================
+# Harness: Respons Route Cepat Web App Saat Beban Generate
+# ==========================================
+# Web app dijalankan lewat waitress (threads=3, sama seperti server.py) dengan DB sementara,
+# model server diganti stub (generate butuh --latency-ms). --clients user generate bersamaan
+# sementara satu probe terus membuka /login; dilaporkan latency probe, waktu selesai generate, dan
+# time-to-first-token (stub mengirim --tokens token merata sepanjang latency):
+#   stream  : /api/generate/stream -> submit job + relay token dalam satu request (maks
+#             GENERATE_STREAM_MAX relay; slot penuh -> 202 + job_id, lalu polling)
+#   job     : /api/generate (job id) + polling /api/generate/<job_id> -> thread langsung dilepas,
+#             tapi tidak ada token sampai job selesai
+#   job+sse : job stream + subscribe /api/generate/<job_id>/events (maks GENERATE_STREAM_MAX relay,
+#             sisanya polling seperti dashboard)
+#
+# Cara pakai (dari root project):
+#   python benchmarks/bench_web_handoff.py --clients 6 --latency-ms 3000 --tokens 20
+import os
+import sys
+import time
+import uuid
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from flask import Flask, jsonify, request, Response
+from waitress.server import create_server
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("API_KEY", "bench")
+os.environ.setdefault("GENERATE_POLL_INTERVAL", "0.2")
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+def start_stub(latency_s, tokens):
+    """Stub model server: /api/jobs (antrian + events), /api/health."""
+    stub = Flask("stub_model_server")
+    jobs = {}
+    resep = "Nama Masakan: Ayam Kecap\nBahan-bahan:\n- ayam\nCara Membuat:\n1. Masak."
+
+    def token_events(started):
+        # token ke-i dikirim pada started + (i + 1) * latency / tokens, lalu done
+        for i in range(tokens):
+            time.sleep(max(0.0, started + (i + 1) * latency_s / tokens - time.monotonic()))
+            yield 'event: token\ndata: {"text": "tok%d "}\n\n' % i
+        yield 'event: done\ndata: {"resep": "%s"}\n\n' % resep.replace("\n", "\\n")
+
+    @stub.route('/api/health', methods=['GET'])
+    def health():
+        return jsonify({'error_code': 0, 'success': True, 'message': 'Model server is running.'})
+
+    @stub.route('/api/jobs', methods=['POST'])
+    def submit():
+        job = {'job_id': uuid.uuid4().hex, 'status': 'running', 'mode': request.get_json().get('mode', 'normal')}
+        jobs[job['job_id']] = job
+        job['started'] = time.monotonic()
+        threading.Timer(latency_s, lambda: job.update(status='done', resep=resep)).start()
+        return jsonify({'error_code': 0, 'success': True, 'message': 'Job queued.', 'data': job}), 202
+
+    @stub.route('/api/jobs/<job_id>', methods=['GET'])
+    def status(job_id):
+        if job_id not in jobs:
+            return jsonify({'error_code': 16, 'success': False, 'message': 'Job not found or expired.'}), 404
+        return jsonify({'error_code': 0, 'success': True, 'message': 'ok', 'data': dict(jobs[job_id])})
+
+    @stub.route('/api/jobs/<job_id>/events', methods=['GET'])
+    def job_events(job_id):
+        return Response(token_events(jobs[job_id]['started']), mimetype='text/event-stream')
+
+    server = make_server("127.0.0.1", 0, stub, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def start_web(threads):
+    """Import app di direktori sementara (db/data.db baru), rate limit dimatikan untuk benchmark."""
+    os.chdir(tempfile.mkdtemp(prefix="bench_web_"))
+    import app as web
+    web.limiter.enabled = False
+    logging.getLogger("waitress.queue").setLevel(logging.ERROR)  # "Task queue depth" tiap request antri
+    server = create_server(web.app, host="127.0.0.1", port=0, threads=threads)
+    threading.Thread(target=server.run, daemon=True).start()
+    cookie = web.app.session_interface.get_signing_serializer(web.app).dumps({'user_id': 1, 'username': 'bench'})
+    return web, f"http://127.0.0.1:{server.effective_port}", {web.app.config['SESSION_COOKIE_NAME']: cookie}
+
+def read_events(response, started):
+    """Return: (ada event done, detik sampai token pertama atau None)."""
+    first_token = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line == "event: token" and first_token is None:
+            first_token = time.perf_counter() - started
+        elif line == "event: done":
+            return True, first_token
+    return False, first_token
+
+def poll_job(base, cookies, job_id):
+    while True:
+        time.sleep(0.25)
+        job = requests.get(f"{base}/api/generate/{job_id}", cookies=cookies).json()
+        if not job['success'] or job['data']['status'] == 'done':
+            return job['success'] and job['data'].get('history_id') is not None, None
+
+def generate_stream(base, cookies):
+    started = time.perf_counter()
+    with requests.post(f"{base}/api/generate/stream", json={"bahan": "ayam"}, cookies=cookies, stream=True) as response:
+        if response.status_code != 202:
+            return read_events(response, started)
+        job_id = response.json()['data']['job_id']  # slot stream penuh -> polling
+    return poll_job(base, cookies, job_id)
+
+def generate_job(base, cookies, stream=False):
+    started = time.perf_counter()
+    data = requests.post(f"{base}/api/generate", json={"bahan": "ayam", "stream": stream}, cookies=cookies).json()
+    if not data.get('success'):
+        return False, None
+    job_id = data['data']['job_id']
+    while stream:
+        with requests.get(f"{base}/api/generate/{job_id}/events", cookies=cookies, stream=True) as response:
+            if response.status_code != 429:
+                return read_events(response, started)
+        time.sleep(0.25)
+        job = requests.get(f"{base}/api/generate/{job_id}", cookies=cookies).json()
+        if not job['success'] or job['data']['status'] == 'done':
+            return job['success'] and job['data'].get('history_id') is not None, None
+    return poll_job(base, cookies, job_id)
+
+def generate_job_sse(base, cookies):
+    return generate_job(base, cookies, stream=True)
+
+def run(flow, base, cookies, clients):
+    latencies, stop = [], threading.Event()
+
+    def probe():
+        while not stop.is_set():
+            started = time.perf_counter()
+            requests.get(f"{base}/login")
+            latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.05)
+
+    prober = threading.Thread(target=probe)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        futures = [executor.submit(flow, base, cookies) for _ in range(clients)]
+        time.sleep(0.1)  # probe mulai setelah generate masuk
+        prober.start()
+        results = [f.result() for f in futures]
+    total_s = time.perf_counter() - started
+    stop.set()
+    prober.join()
+    ttft = [first for _, first in results if first is not None]
+    return sum(ok for ok, _ in results), total_s, latencies, ttft
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast-route latency under generation load: pinned stream vs job handoff")
+    parser.add_argument("--clients", type=int, default=6)
+    parser.add_argument("--latency-ms", type=float, default=3000)
+    parser.add_argument("--threads", type=int, default=3)
+    parser.add_argument("--tokens", type=int, default=20, help="token per generate di stub")
+    args = parser.parse_args()
+
+    os.environ["MODEL_SERVER_URL"] = start_stub(args.latency_ms / 1000.0, args.tokens)
+    web, base, cookies = start_web(args.threads)
+
+    print(f"=== Web tier (waitress threads={args.threads}, {args.clients} generate @ {args.latency_ms:.0f} ms) ===")
+    print(f"{'flow':<9}{'ok':>4}{'total s':>9}{'probe n':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}"
+          f"{'ttft n':>8}{'ttft p50':>10}")
+    for name, flow in (("stream", generate_stream), ("job", generate_job), ("job+sse", generate_job_sse)):
+        ok, total_s, latencies, ttft = run(flow, base, cookies, args.clients)
+        ttft_p50 = f"{np.percentile(ttft, 50) * 1000:>8.0f}ms" if ttft else f"{'-':>10}"
+        print(f"{name:<9}{ok:>4}{total_s:>9.2f}{len(latencies):>9}{np.percentile(latencies, 50):>9.1f}"
+              f"{np.percentile(latencies, 95):>9.1f}{max(latencies):>9.1f}{len(ttft):>8}{ttft_p50}")
+    print(f"tracker: {web.generation_jobs.get_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# ==========================================
+# Benchmark: Throughput vs Jumlah Proses Worker (Pre-Fork Pool)
+# ==========================================
+# Untuk tiap jumlah worker: start WorkerPool (spawn, CPU dibagi rata per worker kalau
+# WORKER_PIN_CPUS=true), tunggu semua worker selesai load, lalu kirim --requests request
+# generate sekaligus (cache dilewati). Dilaporkan: waktu siap, request/detik, latency
+# rata-rata & p95, dan sebaran task per worker.
+# --synthetic-ms N: worker diganti proses yang membakar N ms CPU (Python, memegang GIL) per task,
+# tanpa model/data, dan baris "threads" = task yang sama di thread satu proses. Ini mengukur
+# overhead dispatch pool + skala antar proses; angka model sungguhan butuh mode default.
+#
+# Cara pakai (dari root project):
+#   MODEL_BACKEND=cpu python benchmarks/bench_workers.py --workers 1,2,4 --requests 16
+#   python benchmarks/bench_workers.py --workers 1,2,4 --requests 32 --synthetic-ms 200
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+
+SAMPLE_BAHAN = [
+    ("ayam, bawang putih, kecap manis", "normal"),
+    ("tempe, cabai, bawang merah", "normal"),
+    ("telur, tomat", "diet"),
+    ("tahu, kangkung", "diet"),
+    ("udang, santan, cabai", "normal"),
+    ("ikan, kunyit, jahe", "diet"),
+]
+
+def make_params(i):
+    bahan, mode = SAMPLE_BAHAN[i % len(SAMPLE_BAHAN)]
+    return {'bahan_input': bahan, 'mode': mode, 'use_cache': False, 'retrieval': None,
+            'include': [], 'exclude': [], 'adapter': model_server.DEFAULT_ADAPTER}
+
+def burn(ms):
+    """Kerja CPU-bound murni Python (memegang GIL) selama ms milidetik CPU time thread ini."""
+    started = time.thread_time()
+    while time.thread_time() - started < ms / 1000.0:
+        pass
+
+def synthetic_worker(worker_id, cpus, task_queue, results, heartbeat):
+    """Pengganti pool_worker_main untuk --synthetic-ms: protokol sama, generate = burn()."""
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    send_lock = threading.Lock()
+    results.send(('ready', worker_id, os.getpid(), {}))
+
+    def _beat():
+        while True:
+            heartbeat.value = time.time()
+            time.sleep(1.0)
+
+    def _serve():
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            task_id, params = task
+            burn(params['synthetic_ms'])
+            with send_lock:
+                results.send(('result', task_id, True, ''))
+
+    threading.Thread(target=_beat, daemon=True).start()
+    threads = [threading.Thread(target=_serve) for _ in range(model_server.WORKER_THREADS)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+
+def run_threads(requests, synthetic_ms):
+    """Baseline --synthetic-ms: task yang sama di thread satu proses (GIL)."""
+    def timed(i):
+        t0 = time.perf_counter()
+        burn(synthetic_ms)
+        return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=requests) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    return requests / (time.perf_counter() - started), latencies
+
+def run(num_workers, requests, ready_timeout, synthetic_ms=None):
+    if synthetic_ms:
+        pool = model_server.WorkerPool(num_workers, target=synthetic_worker)
+        make = lambda i: {'synthetic_ms': synthetic_ms}
+    else:
+        pool = model_server.WorkerPool(num_workers)
+        make = make_params
+        model_server.prepare_rag_cache()  # sama seperti __main__ model_server: sync sekali sebelum spawn
+    started = time.perf_counter()
+    pool.start()
+    while not all(w['ready'] for w in pool.get_stats()['workers'].values()):
+        if time.perf_counter() - started > ready_timeout:
+            pool.stop()
+            sys.exit(f"Worker belum siap setelah {ready_timeout}s.")
+        time.sleep(0.5)
+    ready_s = time.perf_counter() - started
+
+    def timed(i):
+        t0 = time.perf_counter()
+        pool.generate(make(i))
+        return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=requests) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    total_s = time.perf_counter() - started
+
+    spread = [w['done'] for _, w in sorted(pool.get_stats()['workers'].items())]
+    pool.stop()
+    return ready_s, requests / total_s, latencies, spread
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput scaling of the multi-process model worker pool")
+    parser.add_argument("--workers", default="1,2,4", help="daftar jumlah worker, mis. 1,2,4")
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--ready-timeout", type=float, default=model_server.WORKER_READY_TIMEOUT)
+    parser.add_argument("--synthetic-ms", type=float, default=None,
+                        help="ganti model dengan N ms kerja CPU per task (tanpa model/data)")
+    args = parser.parse_args()
+
+    target = f"synthetic {args.synthetic_ms:.0f} ms CPU/task" if args.synthetic_ms else f"backend={model_server.MODEL_BACKEND}"
+    print(f"=== Worker pool scaling ({target}, {args.requests} concurrent requests, {os.cpu_count()} CPUs) ===")
+    print(f"{'workers':>8}{'ready s':>9}{'req/s':>8}{'mean s':>9}{'p95 s':>9}  per worker")
+    base = None
+    if args.synthetic_ms:
+        rps, latencies = run_threads(args.requests, args.synthetic_ms)
+        base = rps
+        print(f"{'threads':>8}{'-':>9}{rps:>8.2f}{np.mean(latencies):>9.2f}{np.percentile(latencies, 95):>9.2f}  (1 proses, GIL)")
+    for num_workers in [int(n) for n in args.workers.split(",")]:
+        ready_s, rps, latencies, spread = run(num_workers, args.requests, args.ready_timeout, args.synthetic_ms)
+        base = base or rps
+        print(f"{num_workers:>8}{ready_s:>9.1f}{rps:>8.2f}{np.mean(latencies):>9.2f}"
+              f"{np.percentile(latencies, 95):>9.2f}  {spread} ({rps / base:.2f}x)")
+
+if __name__ == "__main__":
+    main()
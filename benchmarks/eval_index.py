@@ -0,0 +1,99 @@
+# ==========================================
+# Tool: Build & Evaluate FAISS Index Configurations
+# ==========================================
+# Membangun beberapa konfigurasi index (flat / ivf / hnsw, l2 / ip) dari
+# models/embeddings.npy, lalu melaporkan recall@15 terhadap index flat
+# (metric yang sama) dan latency query per konfigurasi.
+#
+# Cara pakai (dari root project, embeddings.npy dibuat oleh load_resources):
+#   python benchmarks/eval_index.py --queries 200
+#   python benchmarks/eval_index.py --nprobe 1 4 8 16 32 --ef-search 16 32 64 128
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_server
+
+K = 15
+
+SAMPLE_QUERIES = [
+    "ayam, bawang putih, kecap manis", "tempe, cabai", "telur, tomat", "tahu, kangkung",
+    "udang, santan", "ikan, kunyit, jahe", "sapi, kentang, wortel", "mie, sawi, telur",
+    "cumi, cabai hijau", "bayam, jagung", "brokoli, wortel, bakso", "terong, terasi",
+]
+
+def load_queries(n):
+    """Query = contoh bahan + teks bahan dari resep acak di corpus."""
+    store = model_server.RecipeStore.load(model_server.RAG_STORE_DIR)
+    rng = np.random.default_rng(42)
+    picks = rng.choice(len(store), size=max(0, n - len(SAMPLE_QUERIES)), replace=False)
+    texts = SAMPLE_QUERIES + [store.text('Ingredients', i).replace('--', ' ')[:120] for i in picks]
+    vectors = model_server.SentenceTransformer(model_server.EMBEDDER_MODEL_NAME).encode(texts[:n])
+    return vectors
+
+def timed_search(index, queries):
+    latencies = []
+    results = []
+    for q in queries:
+        started = time.perf_counter()
+        _, ids = index.search(q[None, :], K)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(ids[0])
+    return np.array(results), np.array(latencies)
+
+def recall_at_k(truth, found):
+    hits = sum(len(set(t[t != -1]) & set(f[f != -1])) for t, f in zip(truth, found))
+    total = sum(len(t[t != -1]) for t in truth)
+    return hits / total if total else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@15 & latency of FAISS index configurations")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--metrics", nargs="+", default=["l2", "ip"])
+    parser.add_argument("--nlist", type=int, default=model_server.FAISS_IVF_NLIST)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--hnsw-m", type=int, default=model_server.FAISS_HNSW_M)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    args = parser.parse_args()
+
+    if not os.path.exists(model_server.EMBEDDINGS_PATH):
+        sys.exit(f"{model_server.EMBEDDINGS_PATH} belum ada. Jalankan model server sekali untuk build cache.")
+
+    embeddings = np.load(model_server.EMBEDDINGS_PATH)
+    raw_queries = load_queries(args.queries)
+    print(f"Corpus: {embeddings.shape[0]} vectors x {embeddings.shape[1]} dim, {len(raw_queries)} queries\n")
+    print(f"{'config':<34}{'build s':>9}{'recall@15':>11}{'p50 ms':>9}{'p95 ms':>9}")
+
+    for metric in args.metrics:
+        queries = model_server.prepare_vectors(raw_queries, metric)
+
+        started = time.perf_counter()
+        flat = model_server.build_faiss_index(embeddings, "flat", metric)
+        build_s = time.perf_counter() - started
+        truth, lat = timed_search(flat, queries)
+        print(f"{'flat/' + metric:<34}{build_s:>9.2f}{1.0:>11.3f}{np.percentile(lat, 50):>9.3f}{np.percentile(lat, 95):>9.3f}")
+
+        started = time.perf_counter()
+        ivf = model_server.build_faiss_index(embeddings, "ivf", metric, nlist=args.nlist)
+        build_s = time.perf_counter() - started
+        for nprobe in args.nprobe:
+            model_server.apply_search_params(ivf, nprobe=nprobe)
+            found, lat = timed_search(ivf, queries)
+            name = f"ivf{ivf.nlist}/{metric} nprobe={nprobe}"
+            print(f"{name:<34}{build_s:>9.2f}{recall_at_k(truth, found):>11.3f}{np.percentile(lat, 50):>9.3f}{np.percentile(lat, 95):>9.3f}")
+
+        started = time.perf_counter()
+        hnsw = model_server.build_faiss_index(embeddings, "hnsw", metric, hnsw_m=args.hnsw_m)
+        build_s = time.perf_counter() - started
+        for ef in args.ef_search:
+            model_server.apply_search_params(hnsw, ef_search=ef)
+            found, lat = timed_search(hnsw, queries)
+            name = f"hnsw{args.hnsw_m}/{metric} efSearch={ef}"
+            print(f"{name:<34}{build_s:>9.2f}{recall_at_k(truth, found):>11.3f}{np.percentile(lat, 50):>9.3f}{np.percentile(lat, 95):>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# ==========================================
+# Import Modules
+# ==========================================
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+
+# ==========================================
+# 1. Precompiled Patterns
+# ==========================================
+DASH_ITEM_PATTERN = re.compile(r'(?<!\n)- ')
+COMMA_SPACE_PATTERN = re.compile(r',(?!\s|\d)')
+
+# Kill Switch Phrases (satu regex alternation, dicari sekali di seluruh teks)
+KILL_SWITCH_PHRASES = (
+    "Tips:", "Tips :", "Note:", "Note :", "Catatan:", "P.S.",
+    "Selamat mencoba", "Happy cooking", "Semoga bermanfaat",
+    "Untuk mengetahui nutrisinya", "Data nutrisi ini",
+    "Kalau mau disajikan", "Sajikan hangat"
+)
+KILL_SWITCH_PATTERN = re.compile("|".join(re.escape(k) for k in KILL_SWITCH_PHRASES))
+
+GIZI_VALID_KEYS = ("kalori", "protein", "karbo", "lemak", "kcal", "gram", "g=")
+GIZI_FALLBACK = "\n- Kalori: Estimasi 350-500 kkal\n- Protein: Data spesifik belum tersedia"
+
+# ==========================================
+# 2. Anti-Loop Detector
+# ==========================================
+def common_prefix_length(a, b):
+    """Panjang prefix yang sama (binary search atas perbandingan slice, jalan di C)."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]: lo = mid
+        else: hi = mid - 1
+    return lo
+
+def common_suffix_length(a, b):
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[-mid:] == b[-mid:]: lo = mid
+        else: hi = mid - 1
+    return lo
+
+class LoopDetector:
+    """
+    Tugas: Cek apakah baris baru mirip (> threshold) dengan salah satu dari `window` baris terakhir.
+    Hasilnya identik dengan SequenceMatcher(None, baris, seen).ratio() > threshold, tapi
+    SequenceMatcher hanya dijalankan kalau batas-batas murah belum bisa memutuskan:
+      1. Baris sama persis -> ratio 1.0, langsung loop.
+      2. Batas atas dari panjang lalu multiset karakter (= real_quick_ratio / quick_ratio,
+         Counter dihitung sekali per baris) <= threshold -> pasti tidak loop.
+      3. Batas bawah: prefix / suffix yang sama adalah blok match, dan kalau seen < 200 karakter
+         (autojunk difflib tidak aktif) blok terpanjang SequenceMatcher >= itu -> > threshold pasti loop.
+         Ini kasus generation yang looping ("12. Tumis ..." vs "13. Tumis ...").
+      4. Sisanya: ratio exact, SequenceMatcher per baris seen dengan seq2 (b2j) yang sudah di-cache.
+    """
+
+    def __init__(self, window=5, threshold=0.85, min_length=10):
+        self.window = window
+        self.threshold = threshold
+        self.min_length = min_length
+        self.recent = []  # list of (teks, Counter karakter, SequenceMatcher dengan seq2 = teks)
+
+    def is_loop(self, line):
+        if len(line) <= self.min_length: return False
+
+        counts = None
+        # Baris terbaru dulu: loop biasanya mengulang baris yang paling dekat
+        for seen, seen_counts, matcher in reversed(self.recent):
+            if line == seen:
+                return True
+            total = len(line) + len(seen)
+            if 2.0 * min(len(line), len(seen)) / total <= self.threshold:
+                continue
+            if counts is None:
+                counts = Counter(line)
+            small, large = (counts, seen_counts) if len(counts) < len(seen_counts) else (seen_counts, counts)
+            upper = sum(min(n, large[ch]) for ch, n in small.items() if ch in large)
+            if 2.0 * upper / total <= self.threshold:
+                continue
+            if len(seen) < 200:
+                lower = max(common_prefix_length(line, seen), common_suffix_length(line, seen))
+                if 2.0 * lower / total > self.threshold:
+                    return True
+            matcher.set_seq1(line)
+            if matcher.ratio() > self.threshold:
+                return True
+        return False
+
+    def add(self, line):
+        matcher = SequenceMatcher(None)
+        matcher.set_seq2(line)
+        self.recent.append((line, Counter(line), matcher))
+        if len(self.recent) > self.window:
+            self.recent.pop(0)
+
+# ==========================================
+# 3. Output Cleaner
+# ==========================================
+def normalize_raw_output(text):
+    """Pre-processing: bullet / double dash jadi item baru, normalisasi header, spasi koma."""
+    text = text.replace("●", "\n- ").replace("•", "\n- ")
+    text = text.replace("--", "\n- ") # FIX: Double dash means new item
+
+    # FIX: Use regex to avoid adding newline if one already exists
+    text = DASH_ITEM_PATTERN.sub('\n- ', text)
+
+    # Normalize Headers
+    text = text.replace("Bahan-bahan Lengkap:", "Bahan-bahan:")
+    text = text.replace("Bahan Bahan:", "Bahan-bahan:")
+
+    return COMMA_SPACE_PATTERN.sub(', ', text) # Fix spasi koma
+
+class StreamingCleaner:
+    """
+    Tugas: Versi incremental super_clean_output. feed() menerima potongan teks hasil decode
+    (per token), baris yang sudah lengkap langsung diproses state machine yang sama, lalu
+    finish() mengembalikan hasil bersih. Dipakai sebagai dasar stopping criteria:
+      - killed    : kill switch sudah muncul (baris itu dan semua sesudahnya pasti dibuang)
+      - gizi_done : section Informasi Gizi sudah punya kalori + protein dan baris berikutnya
+                    bukan data gizi / header (hanya kalau stop_on_gizi=True)
+      - looping   : max_loop_lines baris berturut-turut dibuang anti-loop (None = nonaktif)
+    """
+
+    def __init__(self, stop_on_gizi=True, max_loop_lines=None):
+        self.stop_on_gizi = stop_on_gizi
+        self.max_loop_lines = max_loop_lines
+        self.loop_run = 0  # jumlah baris loop berturut-turut
+        self.pending = ""  # baris raw yang belum selesai (belum ketemu newline)
+        self.cleaned_lines = []
+        self.section = "HEADER"
+        self.loop_detector = LoopDetector()
+        self.gizi_seen = set()
+        self.killed = False
+        self.gizi_done = False
+        self.looping = False
+
+    @property
+    def should_stop(self):
+        return self.killed or self.gizi_done or self.looping
+
+    def feed(self, text):
+        if self.killed or not text: return self
+        *lines, self.pending = (self.pending + text).split('\n')
+        for raw_line in lines:
+            self._consume_raw_line(raw_line)
+            if self.killed: return self
+        # Kill switch di baris yang belum selesai: tidak perlu tunggu newline. Potongan sebelum
+        # kill switch (hasil split "--" / bullet) sudah final, jadi langsung diproses.
+        if KILL_SWITCH_PATTERN.search(self.pending) and KILL_SWITCH_PATTERN.search(normalize_raw_output(self.pending)):
+            self._consume_raw_line(self.pending)
+            self.pending = ""
+        return self
+
+    def finish(self):
+        if not self.killed and self.pending:
+            self._consume_raw_line(self.pending)
+        self.pending = ""
+
+        # Fallback Nutrisi
+        result = '\n'.join(self.cleaned_lines).strip()
+        if "Informasi Gizi" in result:
+            last_lines = result.split("Informasi Gizi")[-1]
+            if len(last_lines.strip()) < 5:
+                result += GIZI_FALLBACK
+        else:
+            result += "\n\nInformasi Gizi (Estimasi per porsi):" + GIZI_FALLBACK
+        return result
+
+    def _consume_raw_line(self, raw_line):
+        # Normalisasi per baris raw sama dengan normalisasi seluruh teks (pola tidak melewati newline;
+        # beda spasi di ujung baris hilang karena strip)
+        for line in normalize_raw_output(raw_line).split('\n'):
+            # Stop jika ketemu kata terlarang
+            if KILL_SWITCH_PATTERN.search(line):
+                self.killed = True
+                return
+            self._consume_line(line.strip())
+
+    def _consume_line(self, stripped):
+        # Skip baris kosong/strip doang
+        if not stripped or stripped == "-":
+            # FIX: Don't add random empty lines to keep it compact
+            return
+
+        # Anti-Looping Logic
+        if self.loop_detector.is_loop(stripped):
+            self.loop_run += 1
+            if self.max_loop_lines and self.loop_run >= self.max_loop_lines:
+                self.looping = True
+            return
+        self.loop_run = 0
+
+        # Deteksi Section
+        if "Bahan-bahan:" in stripped or "Bahan:" in stripped:
+            self.section = "BAHAN"
+            self.cleaned_lines.append("Bahan-bahan:")
+            return
+        elif "Cara Membuat:" in stripped or "Langkah:" in stripped:
+            self.section = "CARA"
+            self.cleaned_lines.append("Cara Membuat:")
+            return
+        elif "Informasi Gizi" in stripped or "Info Nutrisi" in stripped:
+            self.section = "GIZI"
+            self.cleaned_lines.append("Informasi Gizi (Estimasi per porsi):")
+            return
+
+        # Formatting per Section
+        if self.section == "BAHAN":
+            if stripped.startswith("-"):
+                self.cleaned_lines.append(stripped)
+            elif stripped[0].isdigit() or stripped[0].isalpha():
+                self.cleaned_lines.append(f"- {stripped}")
+        elif self.section == "CARA":
+            self.cleaned_lines.append(stripped)
+        elif self.section == "GIZI":
+            lowered = stripped.lower()
+            if any(k in lowered for k in GIZI_VALID_KEYS):
+                self.cleaned_lines.append(stripped)
+                if "protein" in lowered: self.gizi_seen.add("protein")
+                if "kalori" in lowered or "kcal" in lowered: self.gizi_seen.add("kalori")
+            elif self.stop_on_gizi and len(self.gizi_seen) == 2:
+                # Data gizi sudah lengkap dan model lanjut ke teks lain -> section selesai
+                self.gizi_done = True
+        else:
+            if "Nama Masakan:" in stripped: self.cleaned_lines.append(stripped)
+
+        self.loop_detector.add(stripped)
+
+def super_clean_output(text):
+    """
+    Tugas: Membersihkan output AI (Anti-Loop, Format Fix, Kill Switch).
+    """
+    if not text: return ""
+    return StreamingCleaner(stop_on_gizi=False).feed(text).finish()
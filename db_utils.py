@@ -4,6 +4,8 @@
 import os
 import sqlite3
 import math
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 # ==========================================
@@ -13,6 +15,68 @@ DB_FOLDER = 'db'
 DB_NAME = 'data.db'
 DB_PATH = os.path.join(DB_FOLDER, DB_NAME)
 
+# Tuning SQLite: WAL (pembaca tidak diblok penulis), synchronous NORMAL (aman di WAL, tanpa fsync
+# per commit), tunggu lock sampai DB_BUSY_TIMEOUT_MS, page cache per connection (KB), dan
+# cache prepared statement per connection (cached_statements).
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL").upper()
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "8192"))
+DB_STATEMENT_CACHE = int(os.environ.get("DB_STATEMENT_CACHE", "256"))
+
+if DB_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"DB_SYNCHRONOUS tidak valid: {DB_SYNCHRONOUS}")
+
+# ==========================================
+# Connection Manager (Thread-Local)
+# ==========================================
+_local = threading.local()
+
+def get_connection():
+    """
+    Tugas: Connection SQLite milik thread ini, dibuat sekali lalu dipakai ulang
+    (tanpa connect + parse schema per request). Dibuat ulang kalau DB_PATH berubah.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        # isolation_level=None: transaksi diatur sendiri oleh db_cursor()
+        conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                               cached_statements=DB_STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        _local.conn, _local.path = conn, DB_PATH
+    return conn
+
+def close_connection():
+    """Tutup connection thread ini (mis. sebelum thread selesai / saat test)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def db_cursor(write=False):
+    """
+    Tugas: Cursor dalam satu transaksi, commit saat blok selesai, rollback kalau error.
+    write=True -> BEGIN IMMEDIATE: lock tulis diambil di awal, jadi baca-lalu-tulis tidak gagal
+    "database is locked" di tengah jalan. Baca -> BEGIN biasa (satu snapshot untuk semua query).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        yield cursor
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
 # ==========================================
 # 1. Initialization
 # ==========================================
@@ -25,44 +89,43 @@ def init_db():
         os.makedirs(DB_FOLDER)
         print(f"[DB] Folder '{DB_FOLDER}' created.")
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # Journal mode tersimpan di file DB, cukup diset sekali
+    journal_mode = get_connection().execute("PRAGMA journal_mode = WAL").fetchone()[0]
 
-    cursor.execute('''
-                   CREATE TABLE IF NOT EXISTS users (
-                                                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                        username TEXT NOT NULL UNIQUE,
-                                                        email TEXT NOT NULL UNIQUE,
-                                                        password TEXT NOT NULL
-                   )
-                   ''')
-
-    cursor.execute('''
-                   CREATE TABLE IF NOT EXISTS history (
-                                                          id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                          user_id INTEGER NOT NULL,
-                                                          input_bahan TEXT NOT NULL,
-                                                          resep_text TEXT NOT NULL,
-                                                          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                                                          is_favorite INTEGER DEFAULT 0,
-                                                          FOREIGN KEY (user_id) REFERENCES users(id)
-                       )
-                   ''')
-
-    cursor.execute('''
-                   CREATE TABLE IF NOT EXISTS otp_verification (
-                                                          id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                                          email TEXT NOT NULL,
-                                                          otp_code TEXT NOT NULL,
-                                                          created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                                                          expires_at DATETIME NOT NULL,
-                                                          is_used INTEGER DEFAULT 0
+    with db_cursor(write=True) as cursor:
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS users (
+                                                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                            username TEXT NOT NULL UNIQUE,
+                                                            email TEXT NOT NULL UNIQUE,
+                                                            password TEXT NOT NULL
                        )
-                   ''')
+                       ''')
 
-    conn.commit()
-    conn.close()
-    print(f"[DB] Database initialized at {DB_PATH}.")
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS history (
+                                                              id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                              user_id INTEGER NOT NULL,
+                                                              input_bahan TEXT NOT NULL,
+                                                              resep_text TEXT NOT NULL,
+                                                              created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                                                              is_favorite INTEGER DEFAULT 0,
+                                                              FOREIGN KEY (user_id) REFERENCES users(id)
+                           )
+                       ''')
+
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS otp_verification (
+                                                              id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                              email TEXT NOT NULL,
+                                                              otp_code TEXT NOT NULL,
+                                                              created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                                                              expires_at DATETIME NOT NULL,
+                                                              is_used INTEGER DEFAULT 0
+                           )
+                       ''')
+
+    print(f"[DB] Database initialized at {DB_PATH} (journal_mode={journal_mode}, synchronous={DB_SYNCHRONOUS}).")
 
 # ==========================================
 # 2. User Authentication (Auth)
@@ -72,16 +135,11 @@ def add_user(username, email, password_hash):
     Tugas: Insert user baru ke SQLite
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-                       INSERT INTO users (username, email, password)
-                       VALUES (?, ?, ?)
-                       ''', (username, email, password_hash))
-
-        conn.commit()
-        conn.close()
+        with db_cursor(write=True) as cursor:
+            cursor.execute('''
+                           INSERT INTO users (username, email, password)
+                           VALUES (?, ?, ?)
+                           ''', (username, email, password_hash))
 
         return {
             'error_code': 0,
@@ -90,7 +148,6 @@ def add_user(username, email, password_hash):
         }
 
     except sqlite3.IntegrityError:
-        if 'conn' in locals(): conn.close()
         return {
             'error_code': 1,
             'success': False,
@@ -98,7 +155,6 @@ def add_user(username, email, password_hash):
         }
 
     except Exception as e:
-        if 'conn' in locals(): conn.close()
         return {
             'error_code': 2,
             'success': False,
@@ -110,16 +166,12 @@ def check_user(identifier):
     Tugas: Mencari user berdasarkan username ATAU email (Untuk Login).
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with db_cursor() as cursor:
+            cursor.execute('''
+                           SELECT * FROM users WHERE username = ? OR email = ?
+                           ''', (identifier, identifier))
 
-        cursor.execute('''
-                       SELECT * FROM users WHERE username = ? OR email = ?
-                       ''', (identifier, identifier))
-
-        user = cursor.fetchone()
-        conn.close()
+            user = cursor.fetchone()
 
         if user:
             return dict(user)
@@ -137,19 +189,14 @@ def save_recipe_to_history(user_id, bahan, resep_text):
     Tugas: Menyimpan hasil generate AI ke tabel history.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-                       INSERT INTO history (user_id, input_bahan, resep_text)
-                       VALUES (?, ?, ?)
-                       ''', (user_id, bahan, resep_text))
+        with db_cursor(write=True) as cursor:
+            cursor.execute('''
+                           INSERT INTO history (user_id, input_bahan, resep_text)
+                           VALUES (?, ?, ?)
+                           ''', (user_id, bahan, resep_text))
 
-        # Ambil ID dari data yang baru aja masuk
-        new_id = cursor.lastrowid
-
-        conn.commit()
-        conn.close()
+            # Ambil ID dari data yang baru aja masuk
+            new_id = cursor.lastrowid
 
         print(f"[DB] Saved history ID: {new_id} for User: {user_id}")
         return new_id
@@ -163,10 +210,6 @@ def get_user_history(user_id, search_query=None, start_date=None, end_date=None,
     Tugas: Mengambil daftar riwayat masak user (urut dari yang terbaru).
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
         # 1. Bangun Bagian WHERE (Filter)
         where_clause = "WHERE user_id = ?"
         params = [user_id]
@@ -185,21 +228,21 @@ def get_user_history(user_id, search_query=None, start_date=None, end_date=None,
             where_clause += " AND created_at <= ?"
             params.append(f"{end_date} 23:59:59")
 
-        # 2. Hitung TOTAL DATA (Tanpa Limit)
-        count_query = f"SELECT COUNT(*) FROM history {where_clause}"
-        cursor.execute(count_query, params)
-        total_items = cursor.fetchone()[0]
-
-        # 3. Ambil DATA HALAMAN INI (Pakai Limit & Offset)
         # Offset = (Halaman - 1) * Jumlah per halaman
         offset = (page - 1) * per_page
 
-        data_query = f"SELECT * FROM history {where_clause} ORDER BY created_at DESC LIMIT ? OFFSET ?"
-        data_params = params + [per_page, offset]
+        with db_cursor() as cursor:
+            # 2. Hitung TOTAL DATA (Tanpa Limit)
+            count_query = f"SELECT COUNT(*) FROM history {where_clause}"
+            cursor.execute(count_query, params)
+            total_items = cursor.fetchone()[0]
 
-        cursor.execute(data_query, data_params)
-        rows = cursor.fetchall()
-        conn.close()
+            # 3. Ambil DATA HALAMAN INI (Pakai Limit & Offset)
+            data_query = f"SELECT * FROM history {where_clause} ORDER BY created_at DESC LIMIT ? OFFSET ?"
+            data_params = params + [per_page, offset]
+
+            cursor.execute(data_query, data_params)
+            rows = cursor.fetchall()
 
         # Hitung Total Halaman
         total_pages = math.ceil(total_items / per_page)
@@ -227,26 +270,20 @@ def toggle_favorite(history_id):
     Return: Status Baru (True/False)
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with db_cursor(write=True) as cursor:
+            # 1. Cek status sekarang
+            cursor.execute('SELECT is_favorite FROM history WHERE id = ?', (history_id,))
+            current = cursor.fetchone()
 
-        # 1. Cek status sekarang
-        cursor.execute('SELECT is_favorite FROM history WHERE id = ?', (history_id,))
-        current = cursor.fetchone()
+            if not current:
+                return False
 
-        if not current:
-            conn.close()
-            return False
+            # 2. Balik statusnya (0 jadi 1, 1 jadi 0)
+            current_status = current[0]
+            new_status = 1 if current_status == 0 else 0
 
-        # 2. Balik statusnya (0 jadi 1, 1 jadi 0)
-        current_status = current[0]
-        new_status = 1 if current_status == 0 else 0
-
-        # 3. Update database
-        cursor.execute('UPDATE history SET is_favorite = ? WHERE id = ?', (new_status, history_id))
-
-        conn.commit()
-        conn.close()
+            # 3. Update database
+            cursor.execute('UPDATE history SET is_favorite = ? WHERE id = ?', (new_status, history_id))
 
         print(f"[DB] Toggled Favorite ID {history_id} to {new_status}")
         return new_status == 1 # Return True kalau jadi favorit
@@ -260,10 +297,6 @@ def get_user_favorites(user_id, search_query=None, start_date=None, end_date=Non
     Tugas: Mengambil history yang dilike saja (is_favorite = 1).
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
         # Create some Main Filter
         where_clause = ["user_id = ? AND is_favorite = 1"]
         params = [user_id]
@@ -285,21 +318,22 @@ def get_user_favorites(user_id, search_query=None, start_date=None, end_date=Non
         # Gabung semua kondisi WHERE
         full_where_clause = " WHERE " + " AND ".join(where_clause)
 
-        # 2. Hitung TOTAL DATA (Tanpa Limit)
-        count_query = f"SELECT COUNT(*) FROM history {full_where_clause}"
-        cursor.execute(count_query, params)
-        total_items = cursor.fetchone()[0]
-
-        # 3. Ambil DATA HALAMAN INI (Pakai Limit & Offset)
         # Offset = (Halaman - 1) * Jumlah per halaman
         offset = (page - 1) * per_page
-        data_query = f"SELECT * FROM history {full_where_clause} ORDER BY created_at DESC LIMIT ? OFFSET ?"
 
-        data_params = params + [per_page, offset]
+        with db_cursor() as cursor:
+            # 2. Hitung TOTAL DATA (Tanpa Limit)
+            count_query = f"SELECT COUNT(*) FROM history {full_where_clause}"
+            cursor.execute(count_query, params)
+            total_items = cursor.fetchone()[0]
 
-        cursor.execute(data_query, data_params)
-        rows = cursor.fetchall()
-        conn.close()
+            # 3. Ambil DATA HALAMAN INI (Pakai Limit & Offset)
+            data_query = f"SELECT * FROM history {full_where_clause} ORDER BY created_at DESC LIMIT ? OFFSET ?"
+
+            data_params = params + [per_page, offset]
+
+            cursor.execute(data_query, data_params)
+            rows = cursor.fetchall()
 
         # Hitung Total Halaman
         total_pages = math.ceil(total_items / per_page)
@@ -326,13 +360,8 @@ def delete_history_item(history_id):
     Tugas: Menghapus entry history berdasarkan ID.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('DELETE FROM history WHERE id = ?', (history_id,))
-
-        conn.commit()
-        conn.close()
+        with db_cursor(write=True) as cursor:
+            cursor.execute('DELETE FROM history WHERE id = ?', (history_id,))
 
         print(f"[DB] Deleted History ID: {history_id}")
     except Exception as e:
@@ -347,13 +376,9 @@ def get_user_by_id(user_id):
     Tugas: Mengambil data user berdasarkan ID.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        user = cursor.fetchone()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+            user = cursor.fetchone()
 
         if user:
             return dict(user)
@@ -367,19 +392,14 @@ def update_username(user_id, new_username):
     Tugas: Mengupdate username user.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with db_cursor(write=True) as cursor:
+            # Check availability
+            cursor.execute("SELECT id FROM users WHERE username = ?", (new_username,))
+            existing = cursor.fetchone()
+            if existing:
+                return False, "Username already taken."
 
-        # Check availability
-        cursor.execute("SELECT id FROM users WHERE username = ?", (new_username,))
-        existing = cursor.fetchone()
-        if existing:
-            conn.close()
-            return False, "Username already taken."
-
-        cursor.execute('UPDATE users SET username = ? WHERE id = ?', (new_username, user_id))
-        conn.commit()
-        conn.close()
+            cursor.execute('UPDATE users SET username = ? WHERE id = ?', (new_username, user_id))
 
         return True, "Username updated successfully."
     except Exception as e:
@@ -391,12 +411,8 @@ def update_password(user_id, new_password_hash):
     Tugas: Mengupdate password user.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('UPDATE users SET password = ? WHERE id = ?', (new_password_hash, user_id))
-        conn.commit()
-        conn.close()
+        with db_cursor(write=True) as cursor:
+            cursor.execute('UPDATE users SET password = ? WHERE id = ?', (new_password_hash, user_id))
 
         return True, "Password updated successfully."
     except Exception as e:
@@ -411,19 +427,14 @@ def create_otp(email, otp_code, expiry_minutes=10):
     Tugas: Menyimpan OTP ke database dengan waktu kadaluarsa.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
         # Calculate expiry time
         expires_at = datetime.now() + timedelta(minutes=expiry_minutes)
 
-        cursor.execute('''
-                       INSERT INTO otp_verification (email, otp_code, expires_at)
-                       VALUES (?, ?, ?)
-                       ''', (email, otp_code, expires_at.strftime('%Y-%m-%d %H:%M:%S')))
-
-        conn.commit()
-        conn.close()
+        with db_cursor(write=True) as cursor:
+            cursor.execute('''
+                           INSERT INTO otp_verification (email, otp_code, expires_at)
+                           VALUES (?, ?, ?)
+                           ''', (email, otp_code, expires_at.strftime('%Y-%m-%d %H:%M:%S')))
 
         print(f"[DB] OTP created for {email}")
         return True
@@ -436,38 +447,30 @@ def verify_otp(email, otp_code):
     Tugas: Verifikasi OTP. Return True jika valid, False jika tidak.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        # Get the most recent unused OTP for this email
-        cursor.execute('''
-                       SELECT * FROM otp_verification 
-                       WHERE email = ? AND otp_code = ? AND is_used = 0
-                       ORDER BY created_at DESC
-                       LIMIT 1
-                       ''', (email, otp_code))
-
-        otp_record = cursor.fetchone()
-
-        if not otp_record:
-            conn.close()
-            return False
-
-        # Check if OTP is expired
-        expires_at = datetime.strptime(otp_record['expires_at'], '%Y-%m-%d %H:%M:%S')
-        if datetime.now() > expires_at:
-            conn.close()
-            return False
-
-        # Mark OTP as used
-        cursor.execute('''
-                       UPDATE otp_verification SET is_used = 1 
-                       WHERE id = ?
-                       ''', (otp_record['id'],))
-
-        conn.commit()
-        conn.close()
+        with db_cursor(write=True) as cursor:
+            # Get the most recent unused OTP for this email
+            cursor.execute('''
+                           SELECT * FROM otp_verification 
+                           WHERE email = ? AND otp_code = ? AND is_used = 0
+                           ORDER BY created_at DESC
+                           LIMIT 1
+                           ''', (email, otp_code))
+
+            otp_record = cursor.fetchone()
+
+            if not otp_record:
+                return False
+
+            # Check if OTP is expired
+            expires_at = datetime.strptime(otp_record['expires_at'], '%Y-%m-%d %H:%M:%S')
+            if datetime.now() > expires_at:
+                return False
+
+            # Mark OTP as used
+            cursor.execute('''
+                           UPDATE otp_verification SET is_used = 1 
+                           WHERE id = ?
+                           ''', (otp_record['id'],))
 
         print(f"[DB] OTP verified for {email}")
         return True
@@ -480,20 +483,16 @@ def cleanup_old_otps():
     Tugas: Membersihkan OTP yang sudah kadaluarsa (opsional, untuk maintenance).
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
         # Delete OTPs older than 24 hours
         cutoff_time = datetime.now() - timedelta(hours=24)
 
-        cursor.execute('''
-                       DELETE FROM otp_verification 
-                       WHERE created_at < ?
-                       ''', (cutoff_time.strftime('%Y-%m-%d %H:%M:%S'),))
+        with db_cursor(write=True) as cursor:
+            cursor.execute('''
+                           DELETE FROM otp_verification 
+                           WHERE created_at < ?
+                           ''', (cutoff_time.strftime('%Y-%m-%d %H:%M:%S'),))
 
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+            deleted_count = cursor.rowcount
 
         if deleted_count > 0:
             print(f"[DB] Cleaned up {deleted_count} old OTP records")
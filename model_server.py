@@ -3,17 +3,36 @@
 # ==========================================
 import os
 import re
+import copy
+import time
+import queue
+import json
+import sqlite3
+import threading
+import uuid
+import atexit
+import pickle
+import multiprocessing as mp
+from multiprocessing import connection as mp_connection
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import numpy as np
 import pandas as pd
 import torch
-from difflib import SequenceMatcher
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
 
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, TextStreamer
+from transformers import (AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, TextStreamer, TextIteratorStreamer,
+                          StoppingCriteria, StoppingCriteriaList, LogitsProcessor, LogitsProcessorList, DynamicCache)
 from peft import PeftModel
 from sentence_transformers import SentenceTransformer
 import faiss
 
+from clean_utils import super_clean_output, StreamingCleaner
+from rag_utils import (RecipeStore, LexicalIndex, IngredientBitmapIndex, select_best_candidate, fuse_scores,
+                       parse_ingredient_list, nutrition_known_mask, rank_diet_candidates, NutritionMatcher,
+                       file_sha256, compute_row_ids, read_manifest, write_manifest, tokenize)
+
 # ==========================================
 # SETUP & SECURITY CONFIGURATION
 # ==========================================
@@ -30,8 +49,61 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_RESEP_PATH = os.path.join(BASE_DIR, 'data', 'Indonesian_Food_Recipes.csv')
 DATA_NUTRISI_PATH = os.path.join(BASE_DIR, 'data', 'nutrition.csv')
 MODEL_ADAPTER_PATH = os.path.join(BASE_DIR, 'models', 'model_chef_siap_pakai')
-FAISS_INDEX_PATH = os.path.join(BASE_DIR, 'models', 'faiss_index.bin')
-RAG_DATA_PATH = os.path.join(BASE_DIR, 'models', 'rag_data.pkl')
+RAG_STORE_DIR = os.path.join(BASE_DIR, 'models', 'rag_store')
+EMBEDDINGS_PATH = os.path.join(BASE_DIR, 'models', 'embeddings.npy')
+EMBEDDING_IDS_PATH = os.path.join(BASE_DIR, 'models', 'embedding_ids.npy')
+RAG_MANIFEST_PATH = os.path.join(BASE_DIR, 'models', 'rag_manifest.json')
+LEXICAL_INDEX_DIR = os.path.join(BASE_DIR, 'models', 'lexical_index')
+INGREDIENT_INDEX_DIR = os.path.join(BASE_DIR, 'models', 'ingredient_bitmap')
+EMBEDDER_MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+# ==========================================
+# Vector Index Configuration
+# ==========================================
+# FAISS_INDEX_TYPE: flat (brute force, exact) | ivf | hnsw
+# FAISS_METRIC: l2 | ip (inner product di vector ternormalisasi = cosine)
+FAISS_INDEX_TYPE = os.environ.get("FAISS_INDEX_TYPE", "flat").lower()
+FAISS_METRIC = os.environ.get("FAISS_METRIC", "l2").lower()
+FAISS_IVF_NLIST = int(os.environ.get("FAISS_IVF_NLIST", "256"))
+FAISS_NPROBE = int(os.environ.get("FAISS_NPROBE", "16"))
+FAISS_HNSW_M = int(os.environ.get("FAISS_HNSW_M", "32"))
+FAISS_EF_CONSTRUCTION = int(os.environ.get("FAISS_EF_CONSTRUCTION", "200"))
+FAISS_EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", "64"))
+# Buka index dengan mmap (read-only) supaya beberapa worker berbagi page cache yang sama
+FAISS_MMAP = os.environ.get("FAISS_MMAP", "true").lower() == "true"
+
+# Retrieval: dense (FAISS) | lexical (BM25) | hybrid (fusi skor keduanya)
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid").lower()
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+HYBRID_ALPHA = float(os.environ.get("HYBRID_ALPHA", "0.5"))  # bobot dense di skor fusi
+HYBRID_POOL = int(os.environ.get("HYBRID_POOL", "50"))  # kandidat per sumber sebelum fusi
+# Hybrid: kalau ada resep yang memuat SEMUA bahan query, pakai ranking BM25 saja (tanpa fusi dense).
+# Default mati: query umum (mis. "ayam") hampir selalu tercakup penuh sehingga hybrid jadi lexical saja,
+# dan encode query tetap jalan untuk semantic cache.
+HYBRID_LEXICAL_SHORTCUT = os.environ.get("HYBRID_LEXICAL_SHORTCUT", "false").lower() == "true"
+
+# Filter include/exclude: kalau resep yang lolos filter <= batas ini, cari exact (brute force)
+# langsung di embeddings resep tsb; di atas itu pakai FAISS + ID selector.
+FILTER_BRUTE_FORCE_MAX = int(os.environ.get("FILTER_BRUTE_FORCE_MAX", "4096"))
+
+# Join nutrisi fuzzy (char n-gram TF-IDF): judul resep -> nama di nutrition.csv.
+# Kecocokan di bawah NUTRITION_MATCH_MIN dianggap tidak ada data nutrisi (-1).
+NUTRITION_MATCH_MIN = float(os.environ.get("NUTRITION_MATCH_MIN", "0.6"))
+NUTRITION_NGRAM = int(os.environ.get("NUTRITION_NGRAM", "3"))
+
+# Mode diet: cari hanya di resep yang punya data nutrisi, ranking gabungan di pool DIET_POOL kandidat
+DIET_POOL = int(os.environ.get("DIET_POOL", "100"))
+DIET_W_SIMILARITY = float(os.environ.get("DIET_W_SIMILARITY", "0.6"))
+DIET_W_PROTEIN = float(os.environ.get("DIET_W_PROTEIN", "0.3"))
+DIET_W_CALORIES = float(os.environ.get("DIET_W_CALORIES", "0.1"))
+
+def faiss_index_path(index_type=FAISS_INDEX_TYPE, metric=FAISS_METRIC):
+    # Nama file lama (faiss_index.bin) tetap dipakai untuk flat + l2
+    if index_type == "flat" and metric == "l2":
+        return os.path.join(BASE_DIR, 'models', 'faiss_index.bin')
+    return os.path.join(BASE_DIR, 'models', f'faiss_index_{index_type}_{metric}.bin')
+
+FAISS_INDEX_PATH = faiss_index_path()
 
 # Validasi Path (Safety Check)
 if not BASE_DIR:
@@ -43,6 +115,102 @@ elif not DATA_NUTRISI_PATH:
 elif not MODEL_ADAPTER_PATH:
     raise ValueError("MODEL_ADAPTER_PATH tidak ditemukan.")
 
+# ==========================================
+# Model Backend Configuration
+# ==========================================
+# MODEL_BACKEND: gpu (bitsandbytes 4-bit, device_map auto) | cpu (adapter di-merge, int8 dinamis)
+# | auto (gpu kalau CUDA tersedia, selain itu cpu)
+BASE_MODEL_NAME = "Qwen/Qwen2-1.5B-Instruct"
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "auto").lower()
+if MODEL_BACKEND == "auto":
+    MODEL_BACKEND = "gpu" if torch.cuda.is_available() else "cpu"
+# CPU_QUANTIZE: int8 (torch dynamic quantization, semua nn.Linear) | none (float32)
+CPU_QUANTIZE = os.environ.get("CPU_QUANTIZE", "int8").lower()
+# Thread intra-op (matmul) = jumlah core yang boleh dipakai proses ini; inter-op cukup 1 (generate sekuensial)
+CPU_NUM_THREADS = int(os.environ.get("CPU_NUM_THREADS", str(len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count())))
+CPU_INTEROP_THREADS = int(os.environ.get("CPU_INTEROP_THREADS", "1"))
+# Checkpoint hasil merge adapter ke base (python model_server.py merge-adapter). Dipakai kalau ada
+# dan hash adapter di merge_info.json masih sama dengan MODEL_ADAPTER_PATH; selain itu base + PEFT.
+MERGED_MODEL_PATH = os.environ.get("MERGED_MODEL_PATH", os.path.join(BASE_DIR, 'models', 'model_chef_merged'))
+USE_MERGED_MODEL = os.environ.get("USE_MERGED_MODEL", "true").lower() == "true"
+
+# Multi-adapter: LoRA tambahan di atas base yang sama, format "nama=path,nama2=path2"
+# (path relatif terhadap BASE_DIR). Adapter utama (MODEL_ADAPTER_PATH) bernama DEFAULT_ADAPTER.
+# Request memilih adapter lewat field "adapter"; satu batch boleh campur adapter (PEFT adapter_names).
+# Kalau ada adapter tambahan, checkpoint merged / merge di CPU tidak dipakai.
+DEFAULT_ADAPTER = "default"
+MODEL_ADAPTERS = os.environ.get("MODEL_ADAPTERS", "")
+
+def parse_adapter_paths(spec):
+    adapters = {DEFAULT_ADAPTER: MODEL_ADAPTER_PATH}
+    for item in spec.split(","):
+        if "=" not in item: continue
+        name, path = (part.strip() for part in item.split("=", 1))
+        if name and path:
+            adapters[name] = path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+    return adapters
+
+ADAPTER_PATHS = parse_adapter_paths(MODEL_ADAPTERS)
+MULTI_ADAPTER = len(ADAPTER_PATHS) > 1
+
+# ==========================================
+# Generation & Batching Configuration
+# ==========================================
+MAX_NEW_TOKENS = 700
+# Early stop: hentikan decoding begitu cleaner pasti memotong (kill switch) / section gizi selesai
+EARLY_STOP_ENABLED = os.environ.get("EARLY_STOP_ENABLED", "true").lower() == "true"
+# Repetition stop: hentikan baris batch yang terjebak loop saat decoding
+# - LOOP_MAX_REPEATED_LINES: baris berturut-turut yang dianggap loop oleh anti-loop cleaner
+# - LOOP_NGRAM_SIZE / LOOP_NGRAM_MAX_REPEATS: n-gram token yang muncul sebanyak ini (loop tanpa newline)
+LOOP_STOP_ENABLED = os.environ.get("LOOP_STOP_ENABLED", "true").lower() == "true"
+LOOP_MAX_REPEATED_LINES = int(os.environ.get("LOOP_MAX_REPEATED_LINES", "3"))
+LOOP_NGRAM_SIZE = int(os.environ.get("LOOP_NGRAM_SIZE", "16"))
+LOOP_NGRAM_MAX_REPEATS = int(os.environ.get("LOOP_NGRAM_MAX_REPEATS", "4"))
+# LOOP_ACTION: stop (langsung berhenti) | steer (sekali per request paksa lanjut ke "Informasi Gizi:",
+# loop berikutnya / loop di section gizi -> stop)
+LOOP_ACTION = os.environ.get("LOOP_ACTION", "steer").lower()
+LOOP_STEER_TEXT = "Informasi Gizi:\n"
+# Prefix cache: KV cache bagian instruction statis (per mode & adapter) dihitung sekali,
+# lalu dipakai ulang sebagai past_key_values -> tiap request cuma prefill [CONTEXT] + ### Input.
+# Butuh template prefix-friendly (bahan dipindah dari kalimat Instruction) yang berbeda dari format
+# training adapter -> default mati sampai benchmarks/bench_prefill.py --quality dijalankan dengan model asli.
+PREFIX_CACHE_ENABLED = os.environ.get("PREFIX_CACHE_ENABLED", "false").lower() == "true"
+
+# Micro-batching: request dikumpulkan sampai BATCH_MAX_SIZE atau BATCH_MAX_WAIT_MS
+# (mana yang duluan), lalu di-generate sekaligus dalam satu panggilan model.generate.
+# BATCH_MAX_SIZE=1 mematikan scheduler (satu request = satu generate).
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "4"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "50"))
+
+# Generation cache (SQLite di disk, dipakai bareng oleh semua proses model server)
+GEN_CACHE_PATH = os.environ.get("GEN_CACHE_PATH", os.path.join(BASE_DIR, 'models', 'generation_cache.db'))
+GEN_CACHE_ENABLED = os.environ.get("GEN_CACHE_ENABLED", "true").lower() == "true"
+GEN_CACHE_TTL = int(os.environ.get("GEN_CACHE_TTL", str(7 * 24 * 3600)))  # detik
+GEN_CACHE_MAX_MB = float(os.environ.get("GEN_CACHE_MAX_MB", "64"))
+GEN_CACHE_STATS_FLUSH = float(os.environ.get("GEN_CACHE_STATS_FLUSH", "10"))  # detik antar tulis counter hit/miss
+
+# Semantic cache (tier 2): query mirip (cosine >= threshold) pakai resep yang sudah ada
+SEM_CACHE_ENABLED = os.environ.get("SEM_CACHE_ENABLED", "true").lower() == "true"
+SEM_CACHE_THRESHOLD = float(os.environ.get("SEM_CACHE_THRESHOLD", "0.92"))
+SEM_CACHE_MAX_ENTRIES = int(os.environ.get("SEM_CACHE_MAX_ENTRIES", "512"))
+
+# Pre-fork worker pool: WORKER_PROCESSES > 0 -> proses utama hanya HTTP + job queue, generate
+# dikirim ke N proses worker (masing-masing punya model sendiri; FAISS + RecipeStore di-mmap jadi
+# page cache-nya dipakai bersama). 0 = satu proses seperti biasa.
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "0"))
+WORKER_PIN_CPUS = os.environ.get("WORKER_PIN_CPUS", "true").lower() == "true"  # bagi core rata per worker
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", str(max(1, BATCH_MAX_SIZE))))  # request paralel per worker
+WORKER_HEARTBEAT_TIMEOUT = float(os.environ.get("WORKER_HEARTBEAT_TIMEOUT", "30"))  # detik tanpa heartbeat -> restart
+WORKER_READY_TIMEOUT = float(os.environ.get("WORKER_READY_TIMEOUT", "600"))  # tunggu worker selesai load model
+
+# Job queue: /api/jobs & /api/generate lewat antrian terbatas. Kalau antrian penuh request langsung
+# ditolak (429 + kedalaman antrian) daripada menumpuk sampai client timeout.
+# JOB_WORKERS sebaiknya >= BATCH_MAX_SIZE (x jumlah worker proses) supaya batch tetap bisa terisi.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", str(max(1, BATCH_MAX_SIZE) * max(1, WORKER_PROCESSES))))
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", "32"))
+JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", "600"))  # detik hasil job disimpan setelah selesai
+JOB_WAIT_TIMEOUT = float(os.environ.get("JOB_WAIT_TIMEOUT", "300"))  # batas tunggu /api/generate (sync)
+
 # ==========================================
 # Global Variables
 # ==========================================
@@ -50,24 +218,321 @@ model = None
 tokenizer = None
 embedder = None
 index = None
-df_rag = None
+recipe_store = None
+lexical_index = None
+ingredient_index = None
+corpus_embeddings = None  # embeddings.npy (mmap), baris = posisi store
+nutrition_mask = None     # bool per posisi store: resep dengan data nutrisi (subset mode diet)
+nutrition_selector = None # IDSelectorBatch untuk nutrition_mask (dibangun sekali saat load)
+adapter_registry = {}     # nama adapter -> info (path, parameter, memori, waktu load)
+# Semua forward / generate model lewat lock ini. PEFT memasang adapter_names (multi-adapter) sebagai
+# forward pre-hook global di model, jadi dua panggilan bersamaan (scheduler, stream, prefix cache)
+# bisa saling tertukar persona. Urutan lock: model_lock dulu, baru lock lain (mis. prefix cache).
+model_lock = threading.RLock()
 
 # ==========================================
-# Helper: Similarity Check (Anti-Looping)
+# Helper: Vector Index (FAISS)
 # ==========================================
-def similar(a, b):
-    """Mengecek kemiripan dua kalimat (0.0 - 1.0)"""
-    return SequenceMatcher(None, a, b).ratio()
+def prepare_vectors(vectors, metric=FAISS_METRIC):
+    """Float32 contiguous; dinormalisasi (L2) kalau metric inner product."""
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    if metric == "ip":
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    return vectors
+
+def build_faiss_index(embeddings, index_type=FAISS_INDEX_TYPE, metric=FAISS_METRIC,
+                      nlist=FAISS_IVF_NLIST, hnsw_m=FAISS_HNSW_M, ef_construction=FAISS_EF_CONSTRUCTION, ids=None):
+    """
+    Tugas: Membangun index FAISS sesuai konfigurasi (flat / ivf / hnsw, l2 / ip).
+    ids: label int64 per vector (row ID stabil). None -> label = posisi.
+    """
+    vectors = prepare_vectors(embeddings, metric)
+    dim = vectors.shape[1]
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+
+    if index_type == "flat":
+        new_index = faiss.IndexFlatIP(dim) if metric == "ip" else faiss.IndexFlatL2(dim)
+    elif index_type == "ivf":
+        # FAISS butuh ~39 titik training per centroid
+        nlist = max(1, min(nlist, len(vectors) // 39))
+        quantizer = faiss.IndexFlatIP(dim) if metric == "ip" else faiss.IndexFlatL2(dim)
+        new_index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss_metric)
+        new_index.train(vectors)
+    elif index_type == "hnsw":
+        new_index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss_metric)
+        new_index.hnsw.efConstruction = ef_construction
+    else:
+        raise ValueError(f"FAISS_INDEX_TYPE tidak dikenal: {index_type}")
+
+    if ids is None:
+        new_index.add(vectors)
+        return new_index
+
+    # IVF punya ID sendiri; flat / hnsw dibungkus IndexIDMap2 supaya label = row ID
+    if index_type != "ivf":
+        new_index = faiss.IndexIDMap2(new_index)
+    new_index.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+    return new_index
+
+def apply_search_params(target_index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH):
+    """Set parameter waktu query (nprobe untuk IVF, efSearch untuk HNSW)."""
+    ivf = faiss.try_extract_index_ivf(target_index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    hnsw = faiss.downcast_index(target_index)
+    if isinstance(hnsw, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        # Index dengan row ID dibungkus IndexIDMap2 -> parameter HNSW ada di index dalamnya
+        hnsw = faiss.downcast_index(hnsw.index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efSearch = ef_search
+    return target_index
+
+def encode_query(texts):
+    """Encode query dengan embedder RAG, siap dipakai index.search."""
+    return prepare_vectors(embedder.encode(texts), FAISS_METRIC)
+
+def read_faiss_index(path, mmap=FAISS_MMAP):
+    """
+    Tugas: Baca index FAISS. Dengan mmap, data index (codes / inverted lists)
+    tidak disalin ke heap proses; fallback ke read biasa kalau tipe index tidak mendukung.
+    """
+    if mmap:
+        # Flag dicoba satu per satu: kombinasi MMAP | MMAP_IFC ditolak untuk index IVF (faiss 1.15).
+        # IO_FLAG_MMAP_IFC (faiss >= 1.8) me-mmap codes IndexFlat / HNSW storage / inverted lists.
+        modes = [('mmap_ifc', getattr(faiss, 'IO_FLAG_MMAP_IFC', None)), ('mmap', faiss.IO_FLAG_MMAP)]
+        for mode, flags in modes:
+            if flags is None: continue
+            try:
+                loaded = faiss.read_index(path, flags)
+                print(f"   [FAISS] Index dibuka dengan {mode}.")
+                return loaded
+            except RuntimeError as e:
+                print(f"   [FAISS] {mode} tidak didukung untuk index ini ({str(e).splitlines()[0]}).")
+        print("   [FAISS] Fallback ke read biasa (index disalin ke memori).")
+    return faiss.read_index(path)
+
+def build_rag_dataframe():
+    """
+    Tugas: Baca CSV resep + merge nutrisi, siapkan kolom search_text untuk embedding.
+    """
+    df_resep = pd.read_csv(DATA_RESEP_PATH)
+    try:
+        df_nutri = pd.read_csv(DATA_NUTRISI_PATH)
+        # Fuzzy join: tiap judul -> nama nutrisi terbaik + skor kecocokan
+        matcher = NutritionMatcher(df_nutri['name'].fillna('').tolist(), ngram=NUTRITION_NGRAM)
+        best, score = matcher.match(df_resep['Title'].fillna('').tolist())
+        matched = (best != -1) & (score >= NUTRITION_MATCH_MIN)
+        take = np.where(matched, best, 0)
+
+        df_full = df_resep
+        for col in ('calories', 'proteins'):
+            values = df_nutri[col].to_numpy(dtype='float64', na_value=-1)
+            df_full[col] = np.where(matched, values[take], -1)
+        df_full['nutrition_score'] = np.where(matched, score, -1)
+        exact = int((matched & (score >= 0.9999)).sum())
+        print(f"   [NUTRISI] {int(matched.sum())}/{len(df_full)} resep punya data nutrisi "
+              f"(exact {exact}, fuzzy {int(matched.sum()) - exact}, min skor {NUTRITION_MATCH_MIN})")
+    except Exception as e:
+        print(f"   [WARN] Gagal merge nutrisi ({e}). Lanjut tanpa nutrisi.")
+        df_full = df_resep
+        df_full['calories'] = -1
+        df_full['proteins'] = -1
+        df_full['nutrition_score'] = -1
+
+    df_rag = df_full.copy()
+    # Clean Ingredients buat search
+    df_rag['Ingredients_Clean'] = df_rag['Ingredients'].astype(str).str.replace('--', ' ')
+    df_rag['search_text'] = "Masakan: " + df_rag['Title'] + " Bahan: " + df_rag['Ingredients_Clean']
+    return df_rag
+
+def update_faiss_index(embeddings, row_ids, removed_ids, added_mask):
+    """
+    Tugas: Update index lama secara incremental (remove ID lama, add ID baru).
+    Return: index baru, atau None kalau harus rebuild (tipe index tidak mendukung remove).
+    """
+    if not os.path.exists(FAISS_INDEX_PATH):
+        return None
+    current = faiss.read_index(FAISS_INDEX_PATH)
+    try:
+        if len(removed_ids):
+            current.remove_ids(np.asarray(removed_ids, dtype='int64'))
+        if added_mask.any():
+            current.add_with_ids(prepare_vectors(embeddings[added_mask], FAISS_METRIC), row_ids[added_mask])
+    except RuntimeError as e:
+        print(f"   [SYNC] Incremental update tidak didukung ({e}). Rebuild dari embeddings.")
+        return None
+    if current.ntotal != len(row_ids):
+        return None
+    return current
+
+def build_lexical_index(store):
+    """Bangun BM25 index dari Title + Ingredients (doc id = posisi baris store) dan simpan."""
+    documents = [f"{store.text('Title', i)} {store.text('Ingredients', i).replace('--', ' ')}" for i in range(len(store))]
+    lexical = LexicalIndex.build(documents)
+    lexical.save(LEXICAL_INDEX_DIR)
+    return LexicalIndex.load(LEXICAL_INDEX_DIR, mmap=True)
+
+def build_ingredient_index(store):
+    """Bangun bitmap bahan -> resep (posisi baris store) dan simpan."""
+    ingredient_index = IngredientBitmapIndex.build([store.text('Ingredients', i) for i in range(len(store))])
+    ingredient_index.save(INGREDIENT_INDEX_DIR)
+    return IngredientBitmapIndex.load(INGREDIENT_INDEX_DIR, mmap=True)
+
+def open_rag_resources(store, read_only=False):
+    """
+    Buka semua artefak turunan store (mmap); index turunan yang belum ada dibangun.
+    read_only=True (worker pool): tidak pernah menulis, artefak yang belum ada -> error.
+    """
+    build = not read_only
+    return {
+        'store': store,
+        'index': apply_search_params(read_faiss_index(FAISS_INDEX_PATH)),
+        'lexical': build_lexical_index(store) if build and not LexicalIndex.exists(LEXICAL_INDEX_DIR) else LexicalIndex.load(LEXICAL_INDEX_DIR),
+        'ingredients': build_ingredient_index(store) if build and not IngredientBitmapIndex.exists(INGREDIENT_INDEX_DIR) else IngredientBitmapIndex.load(INGREDIENT_INDEX_DIR),
+        'embeddings': np.load(EMBEDDINGS_PATH, mmap_mode='r'),
+    }
+
+def sync_rag_cache(read_only=False):
+    """
+    Tugas: Pastikan store + index di disk sesuai dengan CSV sumber, lalu buka (mmap).
+    - Manifest mencatat hash CSV, konfigurasi join nutrisi, nama embedder, konfigurasi index, dan row ID.
+    - CSV tidak berubah -> langsung buka cache.
+    - CSV berubah -> store dibangun ulang, hanya resep baru/berubah yang di-embed,
+      lalu ID lama di-remove / ID baru di-add ke index yang ada.
+    - Embedder berubah -> semua di-embed ulang (full rebuild).
+    - read_only=True -> cache tidak sinkron = error (worker pool: sinkronisasi hanya di proses utama).
+    Return: dict resources (store, index, lexical, ingredients, embeddings)
+    """
+    manifest = read_manifest(RAG_MANIFEST_PATH) or {}
+    sources = {
+        'recipes_sha256': file_sha256(DATA_RESEP_PATH),
+        'nutrition_sha256': file_sha256(DATA_NUTRISI_PATH) if os.path.exists(DATA_NUTRISI_PATH) else None,
+    }
+    index_config = {'type': FAISS_INDEX_TYPE, 'metric': FAISS_METRIC}
+    nutrition_config = {'min_score': NUTRITION_MATCH_MIN, 'ngram': NUTRITION_NGRAM}
+    same_embedder = manifest.get('embedder') == EMBEDDER_MODEL_NAME
+    # Hasil join nutrisi tersimpan di store -> konfigurasi matcher ikut menentukan validitas cache
+    same_sources = (all(manifest.get(key) == value for key, value in sources.items())
+                    and manifest.get('nutrition_match') == nutrition_config
+                    and manifest.get('store_format') == RecipeStore.FORMAT_VERSION)
+    same_index = manifest.get('index') == index_config
+
+    if same_embedder and same_sources and same_index and RecipeStore.exists(RAG_STORE_DIR) and os.path.exists(FAISS_INDEX_PATH):
+        print("   [CACHE HIT] Manifest cocok. Opening Vector DB & Dataset (mmap)...")
+        return open_rag_resources(RecipeStore.load(RAG_STORE_DIR, mmap=True), read_only=read_only)
+
+    if read_only:
+        raise RuntimeError("Cache RAG belum sinkron dengan CSV sumber (jalankan prepare_rag_cache di proses utama).")
+
+    print("   [SYNC] Sumber data / konfigurasi berubah. Sinkronisasi cache...")
+    df_rag = build_rag_dataframe()
+    row_ids = compute_row_ids(df_rag['search_text'].tolist())
+    order = np.argsort(row_ids, kind='stable')
+    df_rag = df_rag.iloc[order].reset_index(drop=True)
+    row_ids = row_ids[order]
+
+    # Embedding lama dipakai ulang per row ID (kecuali embedder berganti)
+    embeddings, reused = None, np.zeros(len(row_ids), dtype=bool)
+    old_ids = np.empty(0, dtype='int64')
+    if same_embedder and os.path.exists(EMBEDDINGS_PATH) and os.path.exists(EMBEDDING_IDS_PATH):
+        old_ids = np.load(EMBEDDING_IDS_PATH)
+        old_embeddings = np.load(EMBEDDINGS_PATH, mmap_mode='r')
+        old_sorter = np.argsort(old_ids)
+        pos = np.clip(np.searchsorted(old_ids, row_ids, sorter=old_sorter), 0, max(len(old_ids) - 1, 0))
+        if len(old_ids):
+            reused = old_ids[old_sorter[pos]] == row_ids
+            embeddings = np.zeros((len(row_ids), old_embeddings.shape[1]), dtype='float32')
+            embeddings[reused] = old_embeddings[old_sorter[pos[reused]]]
+
+    new_mask = ~reused
+    print(f"   [SYNC] {int(reused.sum())} embedding dipakai ulang, {int(new_mask.sum())} resep baru/berubah di-embed.")
+    if new_mask.any():
+        new_vectors = np.asarray(embedder.encode(df_rag['search_text'][new_mask].tolist(), show_progress_bar=True), dtype='float32')
+        if embeddings is None:
+            embeddings = np.zeros((len(row_ids), new_vectors.shape[1]), dtype='float32')
+        embeddings[new_mask] = new_vectors
+
+    # Update index: incremental kalau embedder & tipe index sama, selain itu rebuild dari embeddings
+    new_index = None
+    if same_embedder and same_index and len(old_ids):
+        removed_ids = np.setdiff1d(old_ids, row_ids)
+        new_index = update_faiss_index(embeddings, row_ids, removed_ids, new_mask)
+        if new_index is not None:
+            print(f"   [SYNC] Index updated: -{len(removed_ids)} / +{int(new_mask.sum())}")
+    if new_index is None:
+        print(f"   [SYNC] Building {FAISS_INDEX_TYPE}/{FAISS_METRIC} index dari {len(row_ids)} embeddings...")
+        new_index = build_faiss_index(embeddings, FAISS_INDEX_TYPE, FAISS_METRIC, ids=row_ids)
+
+    # Tulis semua artefak, manifest paling akhir
+    RecipeStore.from_dataframe(df_rag, row_ids).save(RAG_STORE_DIR)
+    store = RecipeStore.load(RAG_STORE_DIR, mmap=True)
+    build_lexical_index(store)
+    build_ingredient_index(store)
+    np.save(EMBEDDINGS_PATH, embeddings)
+    np.save(EMBEDDING_IDS_PATH, row_ids)
+    faiss.write_index(new_index, FAISS_INDEX_PATH)
+    write_manifest(RAG_MANIFEST_PATH, {
+        'format_version': 1,
+        'embedder': EMBEDDER_MODEL_NAME,
+        'index': index_config,
+        'nutrition_match': nutrition_config,
+        'store_format': RecipeStore.FORMAT_VERSION,
+        **sources,
+        'rows': len(row_ids),
+        'row_ids': row_ids.tolist(),
+    })
+    print(f"   [CACHE] Store, embeddings, FAISS/BM25/bitmap index, manifest saved to {os.path.dirname(RAG_MANIFEST_PATH)}")
+
+    # Buka ulang dari disk (mmap) supaya layout memori sama dengan jalur cache hit
+    del df_rag, embeddings, new_index
+    return open_rag_resources(store)
+
+def load_rag_resources(read_only=False):
+    """
+    Tugas: Load embedder + sinkronisasi cache RAG, lalu isi global variable retrieval.
+    (Dipisah dari load_resources supaya bisa dipakai tanpa load LLM, misal di benchmark.)
+    read_only=True: cache hanya dibuka, tidak pernah ditulis (proses worker pool).
+    """
+    global embedder, index, recipe_store, lexical_index, ingredient_index, corpus_embeddings
+    global nutrition_mask, nutrition_selector
+
+    # Embedder selalu dibutuhkan (query encoding + embed resep baru)
+    embedder = SentenceTransformer(EMBEDDER_MODEL_NAME)
+    resources = sync_rag_cache(read_only=read_only)
+    recipe_store = resources['store']
+    index = resources['index']
+    lexical_index = resources['lexical']
+    ingredient_index = resources['ingredients']
+    corpus_embeddings = resources['embeddings']
+
+    # Subset mode diet dihitung sekali; selector-nya dipakai ulang di setiap query diet
+    nutrition_mask = nutrition_known_mask(recipe_store)
+    nutrition_selector = faiss.IDSelectorBatch(np.ascontiguousarray(recipe_store.row_ids[nutrition_mask]))
+    print(f"   [DIET] {int(nutrition_mask.sum())}/{len(recipe_store)} resep punya data nutrisi")
+
+def prepare_rag_cache():
+    """
+    Tugas: Sinkronisasi cache RAG di disk sekali, di proses utama sebelum worker pool start.
+    Worker lalu hanya membuka artefak (read_only), jadi tidak ada proses yang menulis ulang
+    file yang sedang di-mmap proses lain. Embedder & resources dilepas lagi setelahnya.
+    """
+    global embedder
+    embedder = SentenceTransformer(EMBEDDER_MODEL_NAME)
+    try:
+        sync_rag_cache()
+    finally:
+        embedder = None
 
 # ==========================================
 # 1. Load Resources Function
 # ==========================================
-def load_resources():
+def load_resources(rag_read_only=False):
     """
     Tugas: Memuat Model AI, Vector DB, dan Dataset ke RAM.
-    Jalan sekali saja saat server start.
+    Jalan sekali saja saat server start. rag_read_only=True dipakai proses worker pool.
     """
-    global model, tokenizer, embedder, index, df_rag
+    global model, tokenizer
 
     if model is not None:
         print("Resources sudah termuat sebelumnya.")
@@ -75,96 +540,28 @@ def load_resources():
 
     print("--- [UTILS] LOADING RESOURCES... ---")
 
-    # A. LOAD DATASET & MERGE NUTRISI (WITH CACHE)
-    print("   [1/3] Checking Cache for RAG & FAISS...")
-    
-    # Check if cache exists
-    if os.path.exists(FAISS_INDEX_PATH) and os.path.exists(RAG_DATA_PATH):
-        print("   [CACHE HIT] Loading Vector DB & Dataset from disk...")
-        try:
-            df_rag = pd.read_pickle(RAG_DATA_PATH)
-            index = faiss.read_index(FAISS_INDEX_PATH)
-            
-            # Load Embedder only (needed for query encoding)
-            embedder = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
-            print("   [CACHE] Resources loaded successfully!")
-        except Exception as e:
-            print(f"   [CACHE ERR] Corrupt cache ({e}). Rebuilding...")
-            # Fallback to rebuild if cache fails
-            pass
-    
-    # If not loaded from cache, Build it
-    if df_rag is None or index is None:
-        print("   [BUILD] Start Building Resources...")
-        try:
-            df_resep = pd.read_csv(DATA_RESEP_PATH)
-            try:
-                df_nutri = pd.read_csv(DATA_NUTRISI_PATH)
-                # Normalisasi
-                df_resep['temp_key'] = df_resep['Title'].str.lower().str.strip()
-                df_nutri['temp_key'] = df_nutri['name'].str.lower().str.strip()
-                # Merge
-                df_full = df_resep.merge(df_nutri[['temp_key', 'calories', 'proteins']], on='temp_key', how='left')
-                df_full[['calories', 'proteins']] = df_full[['calories', 'proteins']].fillna(-1)
-                df_full.drop(columns=['temp_key'], inplace=True)
-            except Exception as e:
-                print(f"   [WARN] Gagal merge nutrisi ({e}). Lanjut tanpa nutrisi.")
-                df_full = df_resep
-                df_full['calories'] = -1
-                df_full['proteins'] = -1
-
-            df_rag = df_full.copy()
-            # Clean Ingredients buat search
-            df_rag['Ingredients_Clean'] = df_rag['Ingredients'].astype(str).str.replace('--', ' ')
-            df_rag['search_text'] = "Masakan: " + df_rag['Title'] + " Bahan: " + df_rag['Ingredients_Clean']
-            
-            # Save DF Cache
-            df_rag.to_pickle(RAG_DATA_PATH)
-            print(f"   [CACHE] Dataset saved to {RAG_DATA_PATH}")
-
-        except Exception as e:
-            print(f"   [FATAL] Gagal load dataset: {e}")
-            return
+    # A + B. DATASET, NUTRISI & VECTOR DB (cache divalidasi lewat manifest)
+    print("   [1/3] Checking Cache for RAG & FAISS (manifest)...")
+    try:
+        load_rag_resources(read_only=rag_read_only)
+        print(f"   [2/3] Vector DB ready (index: {FAISS_INDEX_TYPE}/{FAISS_METRIC}, {index.ntotal} vectors)")
+    except Exception as e:
+        print(f"   [FATAL] Gagal load dataset / FAISS: {e}")
+        return
 
-        # B. BUILD VECTOR DB (FAISS)
-        print("   [2/3] Building Vector Database (FAISS)...")
-        try:
-            embedder = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
-            embeddings = embedder.encode(df_rag['search_text'].tolist(), show_progress_bar=True)
-            index = faiss.IndexFlatL2(embeddings.shape[1])
-            index.add(embeddings)
-            
-            # Save FAISS Cache
-            faiss.write_index(index, FAISS_INDEX_PATH)
-            print(f"   [CACHE] FAISS Index saved to {FAISS_INDEX_PATH}")
-            
-        except Exception as e:
-            print(f"   [FATAL] Gagal build FAISS: {e}")
-            return
+    print(f"   [STORE] {len(recipe_store)} recipes in columnar store ({recipe_store.nbytes / 1e6:.1f} MB on disk)")
 
     # C. LOAD AI MODEL (Qwen + Adapter)
-    print("   [3/3] Loading AI Model (Qwen 1.5B)...")
+    print(f"   [3/3] Loading AI Model (Qwen 1.5B, backend: {MODEL_BACKEND})...")
     try:
-        base_model_name = "Qwen/Qwen2-1.5B-Instruct"
-
-        # Lower memory usage with 4-bit quantization
-        bnb_config = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_quant_type="nf4",
-            bnb_4bit_compute_dtype=torch.float16,
-            bnb_4bit_use_double_quant=True,
-        )
-
-        base_model = AutoModelForCausalLM.from_pretrained(
-            base_model_name,
-            # torch_dtype=torch.float16,
-            quantization_config=bnb_config,
-            device_map="auto",
-            trust_remote_code=True
-        )
-        model = PeftModel.from_pretrained(base_model, MODEL_ADAPTER_PATH)
-        tokenizer = AutoTokenizer.from_pretrained(base_model_name, trust_remote_code=True)
+        model = load_model()
+        tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME, trust_remote_code=True)
+        # Batch generate butuh padding di kiri supaya token baru nyambung ke prompt
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
         model.eval()
+        register_adapters()
     except Exception as e:
         print(f"   [FATAL] Gagal load AI Model: {e}")
         return
@@ -172,143 +569,280 @@ def load_resources():
     print("--- [UTILS] SYSTEM READY! Semua resource siap. ---")
 
 
-# ==========================================
-# 2. Cleanup Output Function (Nuclear)
-# ==========================================
-def super_clean_output(text):
+def adapter_fingerprint():
+    """Hash file adapter (config + bobot) -> deteksi checkpoint merged yang basi."""
+    files = sorted(f for f in os.listdir(MODEL_ADAPTER_PATH) if f.startswith(("adapter_config", "adapter_model")))
+    return {f: file_sha256(os.path.join(MODEL_ADAPTER_PATH, f)) for f in files}
+
+def merged_model_ready():
+    if MULTI_ADAPTER:
+        return False  # merged hanya memuat adapter utama
+    if not USE_MERGED_MODEL or not os.path.exists(os.path.join(MERGED_MODEL_PATH, 'config.json')):
+        return False
+    info = read_manifest(os.path.join(MERGED_MODEL_PATH, 'merge_info.json')) or {}
+    # Deploy tanpa folder adapter (hanya artifact merged) -> langsung pakai merged
+    if os.path.isdir(MODEL_ADAPTER_PATH) and info.get('adapter') != adapter_fingerprint():
+        print(f"   [MERGED] {MERGED_MODEL_PATH} dibuat dari adapter lain, pakai base + PEFT. "
+              "Jalankan ulang: python model_server.py merge-adapter")
+        return False
+    return True
+
+def merge_adapter(output_dir=MERGED_MODEL_PATH, dtype="float16"):
     """
-    Tugas: Membersihkan output AI (Anti-Loop, Format Fix, Kill Switch).
+    Tugas: Build offline checkpoint standalone = bobot base + LoRA adapter yang sudah di-merge.
+    Disimpan unquantized (dtype pilihan); kuantisasi tetap dilakukan saat load sesuai backend
+    (bnb 4-bit di GPU, int8 dinamis di CPU), jadi satu artifact bisa dipakai kedua backend.
     """
-    if not text: return ""
-
-    # Pre-processing
-    text = text.replace("●", "\n- ").replace("•", "\n- ")
-    text = text.replace("--", "\n- ") # FIX: Double dash means new item
-    
-    # FIX: Use regex to avoid adding newline if one already exists
-    text = re.sub(r'(?<!\n)- ', '\n- ', text)
-
-    # Normalize Headers
-    text = text.replace("Bahan-bahan Lengkap:", "Bahan-bahan:")
-    text = text.replace("Bahan Bahan:", "Bahan-bahan:")
-    
-    text = re.sub(r',(?!\s|\d)', ', ', text) # Fix spasi koma
-
-    # FIX: Changed split('') to split('\n')
-    lines = text.split('\n')
-    cleaned_lines = []
-
-    section = "HEADER"
-    seen_lines = []
-
-    # Kill Switch Phrases
-    kill_switch = [
-        "Tips:", "Tips :", "Note:", "Note :", "Catatan:", "P.S.",
-        "Selamat mencoba", "Happy cooking", "Semoga bermanfaat",
-        "Untuk mengetahui nutrisinya", "Data nutrisi ini",
-        "Kalau mau disajikan", "Sajikan hangat"
-    ]
-
-    for line in lines:
-        stripped = line.strip()
-
-        # Skip baris kosong/strip doang
-        if not stripped or stripped in ["-", "- "]:
-            # FIX: Don't add random empty lines to keep it compact
-            continue
-
-        # Stop jika ketemu kata terlarang
-        if any(k in stripped for k in kill_switch): break
-
-        # Anti-Looping Logic
-        is_looping = False
-        for seen in seen_lines[-5:]:
-            if similar(stripped, seen) > 0.85 and len(stripped) > 10:
-                is_looping = True
-                break
-        if is_looping: continue
-
-        # Deteksi Section
-        if "Bahan-bahan:" in stripped or "Bahan:" in stripped:
-            section = "BAHAN"
-            cleaned_lines.append("Bahan-bahan:")
-            continue
-        elif "Cara Membuat:" in stripped or "Langkah:" in stripped:
-            section = "CARA"
-            cleaned_lines.append("Cara Membuat:")
-            continue
-        elif "Informasi Gizi" in stripped or "Info Nutrisi" in stripped:
-            section = "GIZI"
-            cleaned_lines.append("Informasi Gizi (Estimasi per porsi):")
-            continue
-
-        # Formatting per Section
-        if section == "BAHAN":
-            if stripped.startswith("-"):
-                cleaned_lines.append(stripped)
-            elif stripped[0].isdigit() or stripped[0].isalpha():
-                cleaned_lines.append(f"- {stripped}")
-        elif section == "CARA":
-            cleaned_lines.append(stripped)
-        elif section == "GIZI":
-            valid_keys = ["kalori", "protein", "karbo", "lemak", "kcal", "gram", "g="]
-            if any(k in stripped.lower() for k in valid_keys):
-                cleaned_lines.append(stripped)
-        else:
-            if "Nama Masakan:" in stripped: cleaned_lines.append(stripped)
-
-        seen_lines.append(stripped)
+    print(f"[MERGE] Loading {BASE_MODEL_NAME} + {MODEL_ADAPTER_PATH} ({dtype})...")
+    base_model = AutoModelForCausalLM.from_pretrained(
+        BASE_MODEL_NAME,
+        torch_dtype=getattr(torch, dtype),
+        low_cpu_mem_usage=True,
+        trust_remote_code=True
+    )
+    merged = PeftModel.from_pretrained(base_model, MODEL_ADAPTER_PATH).merge_and_unload()
+
+    os.makedirs(output_dir, exist_ok=True)
+    merged.save_pretrained(output_dir, safe_serialization=True)
+    AutoTokenizer.from_pretrained(BASE_MODEL_NAME, trust_remote_code=True).save_pretrained(output_dir)
+    write_manifest(os.path.join(output_dir, 'merge_info.json'), {
+        'base_model': BASE_MODEL_NAME,
+        'adapter': adapter_fingerprint(),
+        'dtype': dtype,
+        'created_at': time.time()
+    })
+    print(f"[MERGE] Checkpoint merged tersimpan di {output_dir}")
+
+def load_model():
+    """Model sesuai MODEL_BACKEND; checkpoint merged dipakai kalau tersedia (tanpa LoRA per forward)."""
+    merged = merged_model_ready()
+    print(f"   [MODEL] {'merged checkpoint: ' + MERGED_MODEL_PATH if merged else 'base + PEFT adapter'}")
+    if MODEL_BACKEND == "cpu":
+        return load_model_cpu(merged)
+    return load_model_gpu(merged)
+
+def load_model_gpu(merged=False):
+    """Qwen + LoRA adapter dengan bitsandbytes 4-bit, device_map auto."""
+    # Lower memory usage with 4-bit quantization
+    bnb_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=torch.float16,
+        bnb_4bit_use_double_quant=True,
+    )
+
+    base_model = AutoModelForCausalLM.from_pretrained(
+        MERGED_MODEL_PATH if merged else BASE_MODEL_NAME,
+        # torch_dtype=torch.float16,
+        quantization_config=bnb_config,
+        device_map="auto",
+        trust_remote_code=True
+    )
+    if merged:
+        return base_model
+    return PeftModel.from_pretrained(base_model, MODEL_ADAPTER_PATH)
+
+def load_model_cpu(merged=False):
+    """
+    Tugas: Qwen + LoRA adapter untuk node tanpa GPU.
+    Adapter di-merge ke bobot base (tidak ada komputasi LoRA per forward), lalu semua
+    nn.Linear dikuantisasi int8 dinamis (bobot int8, aktivasi dikuantisasi per batch).
+    Jumlah thread intra-op diatur lewat CPU_NUM_THREADS.
+    """
+    torch.set_num_threads(CPU_NUM_THREADS)
+    try:
+        torch.set_num_interop_threads(CPU_INTEROP_THREADS)
+    except RuntimeError:
+        pass  # hanya bisa di-set sebelum ada operasi paralel pertama
+    print(f"   [CPU] threads intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}, quantize={CPU_QUANTIZE}")
+
+    cpu_model = AutoModelForCausalLM.from_pretrained(
+        MERGED_MODEL_PATH if merged else BASE_MODEL_NAME,
+        torch_dtype=torch.float32,
+        low_cpu_mem_usage=True,
+        trust_remote_code=True
+    )
+    if MULTI_ADAPTER:
+        # Adapter harus tetap terpisah supaya bisa dipilih per request
+        cpu_model = PeftModel.from_pretrained(cpu_model, MODEL_ADAPTER_PATH)
+        for name, path in ADAPTER_PATHS.items():
+            if name != DEFAULT_ADAPTER:
+                cpu_model.load_adapter(path, adapter_name=name)
+    elif not merged:
+        cpu_model = PeftModel.from_pretrained(cpu_model, MODEL_ADAPTER_PATH).merge_and_unload()
+    cpu_model.eval()
+
+    if CPU_QUANTIZE == "int8":
+        from torch.ao.quantization import quantize_dynamic, default_dynamic_qconfig
+        # Hanya Linear base yang dikuantisasi; lora_A / lora_B tetap float (dipakai per adapter)
+        spec = {name: default_dynamic_qconfig for name, module in cpu_model.named_modules()
+                if isinstance(module, torch.nn.Linear) and 'lora_' not in name}
+        cpu_model = quantize_dynamic(cpu_model, spec, dtype=torch.qint8)
+    return cpu_model
+
+def adapter_memory(name):
+    """Jumlah parameter & byte bobot LoRA milik satu adapter (lora_A.<nama>, lora_B.<nama>, ...)."""
+    params, nbytes = 0, 0
+    for param_name, param in model.named_parameters():
+        if f".{name}." in param_name or param_name.endswith(f".{name}"):
+            params += param.numel()
+            nbytes += param.numel() * param.element_size()
+    return params, nbytes
+
+def register_adapters():
+    """
+    Tugas: Muat adapter tambahan (MODEL_ADAPTERS) ke base model yang sudah ada, tanpa load ulang base.
+    Catat memori per adapter di adapter_registry (untuk /api/adapters).
+    """
+    adapter_registry.clear()
+    if not isinstance(model, PeftModel):
+        # Adapter utama sudah di-merge ke bobot -> tidak ada bobot LoRA terpisah
+        adapter_registry[DEFAULT_ADAPTER] = {'path': MODEL_ADAPTER_PATH, 'merged': True, 'params': 0,
+                                             'memory_mb': 0.0, 'load_seconds': 0.0}
+        return
 
-    # Fallback Nutrisi
-    result = '\n'.join(cleaned_lines).strip()
-    if "Informasi Gizi" in result:
-        last_lines = result.split("Informasi Gizi")[-1]
-        if len(last_lines.strip()) < 5:
-            result += "\n- Kalori: Estimasi 350-500 kkal\n- Protein: Data spesifik belum tersedia"
-    else:
-        result += "\n\nInformasi Gizi (Estimasi per porsi):\n- Kalori: Estimasi 350-500 kkal\n- Protein: Data spesifik belum tersedia"
+    for name, path in ADAPTER_PATHS.items():
+        started = time.perf_counter()
+        if name not in model.peft_config:
+            model.load_adapter(path, adapter_name=name)
+        params, nbytes = adapter_memory(name)
+        adapter_registry[name] = {'path': path, 'merged': False, 'params': params,
+                                  'memory_mb': round(nbytes / 1e6, 2),
+                                  'load_seconds': round(time.perf_counter() - started, 3)}
+        print(f"   [ADAPTER] {name}: {params} parameter LoRA, {nbytes / 1e6:.1f} MB ({path})")
+
+def adapter_kwargs(adapters):
+    """kwargs forward / generate untuk memilih adapter per baris batch (hanya kalau multi-adapter)."""
+    if not MULTI_ADAPTER or not isinstance(model, PeftModel):
+        return {}
+    return {'adapter_names': list(adapters)}
 
-    return result
+# ==========================================
+# 2. Cleanup Output Function (Nuclear)
+# ==========================================
+# super_clean_output (+ LoopDetector, pattern precompiled) ada di clean_utils.py,
+# supaya bisa dipakai / di-benchmark tanpa load model.
 
 # ==========================================
 # 3. Smart Retrieval Function
 # ==========================================
-def retrieve_smart_filter(query, mode="normal"):
+def make_search_params(selector):
+    """SearchParameters sesuai tipe index, dengan ID selector (label = row ID)."""
+    if FAISS_INDEX_TYPE == "ivf":
+        return faiss.SearchParametersIVF(sel=selector, nprobe=FAISS_NPROBE)
+    if FAISS_INDEX_TYPE == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=FAISS_EF_SEARCH)
+    return faiss.SearchParameters(sel=selector)
+
+def dense_search(query, k, allowed=None):
+    """
+    Return: (posisi baris, skor makin besar makin mirip).
+    allowed: bool mask posisi yang boleh (filter bahan). Filter sangat selektif dicari
+    exact di embeddings-nya langsung; selain itu FAISS dibatasi lewat IDSelectorBatch.
+    """
+    query_vector = encode_query([query])
+    if allowed is None:
+        distances, indices = index.search(query_vector, k)
+    else:
+        allowed_pos = np.flatnonzero(allowed)
+        if len(allowed_pos) == 0:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='float32')
+
+        if len(allowed_pos) <= FILTER_BRUTE_FORCE_MAX and corpus_embeddings is not None:
+            vectors = prepare_vectors(corpus_embeddings[allowed_pos], FAISS_METRIC)
+            if FAISS_METRIC == "ip":
+                scores = vectors @ query_vector[0]
+            else:
+                scores = -((vectors - query_vector[0]) ** 2).sum(axis=1)
+            top = np.argsort(-scores, kind='stable')[:k]
+            return allowed_pos[top], scores[top]
+
+        if allowed is nutrition_mask and nutrition_selector is not None:
+            selector = nutrition_selector  # subset diet tanpa filter bahan: tidak perlu bangun ulang
+        else:
+            selector = faiss.IDSelectorBatch(np.ascontiguousarray(recipe_store.row_ids[allowed_pos]))
+        distances, indices = index.search(query_vector, k, params=make_search_params(selector))
+
+    scores = distances[0] if FAISS_METRIC == "ip" else -distances[0]
+    return recipe_store.positions(indices[0]), scores
+
+def search_candidates(query, k=15, retrieval=None, allowed=None, return_scores=False):
+    """
+    Tugas: Cari kandidat resep sesuai mode retrieval (dense / lexical / hybrid).
+    allowed: bool mask hasil filter bahan (None = tanpa filter).
+    Return: posisi baris store, urut relevansi (bisa mengandung -1),
+    atau (posisi, skor relevansi) kalau return_scores=True.
+    """
+    retrieval = (retrieval or RETRIEVAL_MODE).lower()
+    if retrieval == "dense" or lexical_index is None:
+        result = dense_search(query, k, allowed)
+        return result if return_scores else result[0]
+
+    lex_ids, lex_scores, coverage = lexical_index.search(query, max(k, HYBRID_POOL), mask=allowed)
+    if retrieval == "lexical":
+        # Tidak ada token yang cocok -> fallback dense supaya tetap ada hasil
+        if not len(lex_ids):
+            result = dense_search(query, k, allowed)
+            return result if return_scores else result[0]
+        return (lex_ids[:k], lex_scores[:k]) if return_scores else lex_ids[:k]
+
+    # Hybrid + shortcut (opsional): resep yang memuat semua bahan query cukup dijawab BM25
+    if HYBRID_LEXICAL_SHORTCUT and len(lex_ids) and coverage.max() >= 1.0:
+        # Coverage penuh di depan, sisanya tetap urut skor BM25
+        order = np.argsort(-coverage, kind='stable')[:k]
+        if return_scores:
+            # Skor = coverage (urutan utama) + BM25 ternormalisasi (< 1, penentu seri)
+            return lex_ids[order], coverage[order] + lex_scores[order] / (lex_scores.max() + 1e-9)
+        return lex_ids[order]
+
+    dense_ids, dense_scores = dense_search(query, max(k, HYBRID_POOL), allowed)
+    return fuse_scores(dense_ids, dense_scores, lex_ids, lex_scores, HYBRID_ALPHA, k, return_scores)
+
+def retrieve_smart_filter(query, mode="normal", retrieval=None, include=None, exclude=None):
     """
     Tugas: Mencari resep (RAG) dengan filter Normal/Diet.
+    retrieval: dense / lexical / hybrid (default RETRIEVAL_MODE).
+    include / exclude: list bahan yang wajib ada / tidak boleh ada di resep referensi.
     """
-    if index is None or df_rag is None:
+    if index is None or recipe_store is None:
         print("[ERR] Resources belum dimuat!")
         return None
 
-    print(f"--- [RAG] Searching for: '{query}' (Mode: {mode}) ---")
+    print(f"--- [RAG] Searching for: '{query}' (Mode: {mode}, Retrieval: {retrieval or RETRIEVAL_MODE}) ---")
 
-    # Encode & Search
-    query_vector = embedder.encode([query])
-    distances, indices = index.search(query_vector, 15)
+    # Filter bahan (bitmap) -> mask posisi resep yang boleh dipakai
+    allowed = ingredient_index.allowed_mask(include, exclude) if ingredient_index is not None else None
+    if allowed is not None:
+        print(f"   [FILTER] include={include} exclude={exclude}: {int(allowed.sum())} resep lolos")
+        if not allowed.any(): return None
 
-    candidates = []
-    for i in range(15):
-        idx = indices[0][i]
-        if idx == -1: continue
-        row = df_rag.iloc[idx].copy()
-        candidates.append(row)
+    best_idx = None
+    if mode == "diet" and nutrition_mask is not None:
+        # Diet: search hanya di subset resep bernutrisi, ranking relevansi + protein - kalori
+        diet_allowed = nutrition_mask if allowed is None else (allowed & nutrition_mask)
+        if diet_allowed.any():
+            positions, scores = search_candidates(query, DIET_POOL, retrieval, diet_allowed, return_scores=True)
+            best_idx = rank_diet_candidates(recipe_store, positions, scores,
+                                            DIET_W_SIMILARITY, DIET_W_PROTEIN, DIET_W_CALORIES)
 
-    if not candidates: return None
+    if best_idx is None:
+        # Search (dense / lexical / hybrid)
+        candidates = search_candidates(query, 15, retrieval, allowed)
 
-    # Logic Filter
-    best_item = candidates[0]
-    if mode == "diet":
-        valid_candidates = [c for c in candidates if c['proteins'] > 0]
-        if valid_candidates:
-            valid_candidates.sort(key=lambda x: x['proteins'], reverse=True)
-            best_item = valid_candidates[0]
-            print(f"   [FILTER] Mode Diet: {best_item['Title']} ({best_item['proteins']}g Protein)")
+        # Logic Filter (vectorized di atas hasil search)
+        best_idx = select_best_candidate(recipe_store, candidates, mode)
+        if best_idx is None: return None
+
+    best_item = recipe_store.row(best_idx)
+    if mode == "diet" and best_item['proteins'] > 0:
+        print(f"   [FILTER] Mode Diet: {best_item['Title']} ({best_item['proteins']}g Protein, {best_item['calories']} kcal)")
 
     # Prepare Context
     nutri_str = "Data tidak tersedia"
     if best_item['calories'] != -1:
         nutri_str = f"Kalori: {best_item['calories']} kcal, Protein: {best_item['proteins']} g"
+        if best_item['nutrition_score'] < 0.9999:
+            nutri_str += " (perkiraan dari makanan serupa)"
 
     return (f"Judul: {best_item['Title']}\n"
             f"Bahan Asli: {best_item['Ingredients']}\n"
@@ -317,25 +851,44 @@ def retrieve_smart_filter(query, mode="normal"):
 
 
 # ==========================================
-# 4. Main Generator (Controller)
+# 4. Prompt & Batched Generation
 # ==========================================
-def generate_resep_final(bahan_input, mode="normal"):
+def build_prompt_prefix(mode):
     """
-    Tugas: Pipeline Utama (Load -> Retrieve -> Generate -> Clean).
+    Tugas: Bagian statis prompt (Instruction + Aturan) -> sama untuk semua request satu mode,
+    jadi KV cache-nya bisa dihitung sekali (lihat PromptPrefixCache).
     """
-    if model is None: load_resources()
+    diet_instruction = ""
+    if mode == "diet":
+        diet_instruction = "Karena user meminta MODE DIET, kurangi penggunaan minyak, gula, dan santan."
 
-    # 1. Retrieve
-    context = retrieve_smart_filter(bahan_input, mode)
-    if context is None:
-        return f"Maaf, stok resep untuk '{bahan_input}' tidak ditemukan."
+    return f"""### Instruction:
+Anda adalah Chef Profesional. Buat SATU resep lengkap menggunakan bahan pada ### Input berdasarkan referensi [CONTEXT] berikut.
 
-    # 2. Prompt Engineering
+ATURAN PENTING:
+1. Format Output WAJIB:
+   - Nama Masakan: [Nama yang menarik]
+   - Bahan-bahan: [Wajib pakai tanda '-' di setiap baris baru]
+   - Cara Membuat: [Langkah-langkah dengan nomor]
+   - Informasi Gizi: [Estimasi Kalori & Protein]
+2. Gunakan Bahasa Indonesia yang rapi.
+3. JANGAN mengulang-ulang kalimat.
+4. {diet_instruction}
+
+"""
+
+def build_prompt_original(bahan_input, mode, context, exclude=None):
+    """
+    Tugas: Template prompt asli (format data training adapter: bahan di kalimat Instruction).
+    Dipakai kalau prefix cache mati, dan jadi pembanding kualitas di benchmarks/bench_prefill.py.
+    """
     diet_instruction = ""
     if mode == "diet":
         diet_instruction = "Karena user meminta MODE DIET, kurangi penggunaan minyak, gula, dan santan."
+    if exclude:
+        diet_instruction = f"{diet_instruction} JANGAN gunakan bahan: {', '.join(exclude)}.".strip()
 
-    prompt = f"""### Instruction:
+    return f"""### Instruction:
 Anda adalah Chef Profesional. Buat SATU resep lengkap menggunakan bahan '{bahan_input}' berdasarkan referensi [CONTEXT] berikut.
 
 ATURAN PENTING:
@@ -357,25 +910,704 @@ Buatkan resep untuk: {bahan_input}
 ### Response:
 """
 
-    # 3. Generate
+def build_prompt(bahan_input, mode, context, exclude=None):
+    """
+    Tugas: Menyusun prompt final (Instruction + Context + Input) untuk model.
+    exclude: bahan yang tidak boleh dipakai (filter user).
+    Return: prefix cache aktif -> (prefix statis per mode, suffix per request), prompt lengkap = prefix + suffix;
+            prefix cache mati -> string template asli (build_prompt_original).
+    """
+    if not PREFIX_CACHE_ENABLED:
+        return build_prompt_original(bahan_input, mode, context, exclude)
+    exclude_rule = f"\nJANGAN gunakan bahan: {', '.join(exclude)}." if exclude else ""
+
+    return build_prompt_prefix(mode), f"""[CONTEXT]:
+{context}
+
+### Input:
+Buatkan resep untuk: {bahan_input}{exclude_rule}
+
+### Response:
+"""
+
+class PromptPrefixCache:
+    """
+    Tugas: Simpan token + KV cache (DynamicCache) prefix prompt per (adapter, teks prefix).
+    Dihitung sekali saat pertama dipakai; tiap generate memakai salinan (deepcopy), karena
+    generate menulis token baru ke cache yang sama.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.stats = {'hits': 0, 'misses': 0, 'prefix_tokens_reused': 0}
+
+    def get(self, prefix, adapter=DEFAULT_ADAPTER):
+        key = (adapter, prefix)
+        with model_lock, self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                prefix_ids = tokenizer(prefix, return_tensors="pt")["input_ids"].to(model.device)
+                with torch.no_grad():
+                    # DynamicCache eksplisit: versi lama mengembalikan tuple legacy kalau tidak diberi cache
+                    past = model(input_ids=prefix_ids, past_key_values=DynamicCache(), use_cache=True,
+                                 **adapter_kwargs([adapter])).past_key_values
+                entry = self._entries[key] = (prefix_ids, past)
+                print(f"   [PREFIX] KV cache prefix dihitung: {prefix_ids.shape[1]} token (adapter={key[0]})")
+            else:
+                self.stats['hits'] += 1
+            self.stats['prefix_tokens_reused'] += entry[0].shape[1]
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        stats['enabled'] = PREFIX_CACHE_ENABLED
+        return stats
+
+prefix_cache = PromptPrefixCache()
+
+def prepare_generate_inputs(prompts, adapters=None):
+    """
+    Tugas: Tokenisasi prompt untuk satu model.generate.
+    prompts: list of str atau (prefix, suffix); adapters: nama adapter per prompt (default: DEFAULT_ADAPTER).
+    Kalau semua prefix + adapter sama dan prefix cache aktif:
+    input = prefix + [pad] + suffix (padding di tengah, attention mask 0) supaya posisi prefix
+    sama dengan KV cache-nya, dan past_key_values = salinan cache prefix (diulang per baris batch).
+    Return: dict kwargs untuk model.generate (input_ids, attention_mask, [past_key_values], [adapter_names]).
+    """
+    adapters = adapters or [DEFAULT_ADAPTER] * len(prompts)
+    parts = [p if isinstance(p, tuple) else None for p in prompts]
+    if (not PREFIX_CACHE_ENABLED or any(p is None for p in parts)
+            or len({p[0] for p in parts}) != 1 or len(set(adapters)) != 1):
+        texts = [p if isinstance(p, str) else p[0] + p[1] for p in prompts]
+        inputs = dict(tokenizer(texts, return_tensors="pt", padding=True).to(model.device))
+        inputs.update(adapter_kwargs(adapters))
+        return inputs
+
+    prefix_ids, prefix_past = prefix_cache.get(parts[0][0], adapters[0])
+    suffixes = [tokenizer(p[1], add_special_tokens=False)["input_ids"] for p in parts]
+    longest = max(len(ids) for ids in suffixes)
+    prefix_len = prefix_ids.shape[1]
+
+    input_ids = torch.full((len(prompts), prefix_len + longest), tokenizer.pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros_like(input_ids)
+    input_ids[:, :prefix_len] = prefix_ids[0].cpu()
+    attention_mask[:, :prefix_len] = 1
+    for row, ids in enumerate(suffixes):
+        input_ids[row, prefix_len + longest - len(ids):] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, prefix_len + longest - len(ids):] = 1
+
+    past = copy.deepcopy(prefix_past)
+    if len(prompts) > 1:
+        past.batch_repeat_interleave(len(prompts))
+    return {'input_ids': input_ids.to(model.device), 'attention_mask': attention_mask.to(model.device),
+            'past_key_values': past, **adapter_kwargs(adapters)}
+
+class ForcedTokensProcessor(LogitsProcessor):
+    """Logits processor: kalau antrian baris tidak kosong, token berikutnya dipaksa dari antrian."""
+
+    def __init__(self, batch_size):
+        self.forced = [deque() for _ in range(batch_size)]
+
+    def __call__(self, input_ids, scores):
+        for row, forced in enumerate(self.forced):
+            if forced:
+                token = forced.popleft()
+                scores[row, :] = -float('inf')
+                scores[row, token] = 0.0
+        return scores
+
+class CleanerStoppingCriteria(StoppingCriteria):
+    """
+    Stopping criteria per baris batch: token baru di-decode incremental (seperti TextStreamer,
+    cache token di-reset tiap newline) lalu diumpankan ke StreamingCleaner. Baris berhenti
+    begitu cleaner bilang semua sisa output akan dibuang (kill switch), gizi sudah lengkap,
+    atau output terjebak loop (baris berulang / n-gram token berulang). Dengan steering
+    (LOOP_ACTION=steer + processor), loop pertama dibelokkan ke section gizi, bukan dihentikan.
+    """
+
+    def __init__(self, prompt_len, batch_size, early_stop=True, loop_stop=True, steering=None):
+        self.prompt_len = prompt_len
+        self.early_stop = early_stop
+        self.loop_stop = loop_stop
+        self.steering = steering  # ForcedTokensProcessor atau None (loop -> langsung stop)
+        self.steer_ids = tokenizer(LOOP_STEER_TEXT, add_special_tokens=False)["input_ids"] if steering else []
+        self.steered = [False] * batch_size
+        self.steer_wait = [False] * batch_size  # steering menunggu baris yang sedang ditulis selesai
+        self.cleaners = [StreamingCleaner(stop_on_gizi=early_stop,
+                                          max_loop_lines=LOOP_MAX_REPEATED_LINES if loop_stop else None)
+                         for _ in range(batch_size)]
+        self.ngram_counts = [{} for _ in range(batch_size)]
+        self.line_start = [prompt_len] * batch_size  # awal token baris yang sedang di-decode
+        self.printed = [0] * batch_size              # panjang teks baris itu yang sudah di-feed
+        self.finished = [False] * batch_size         # sudah EOS (bukan early stop)
+        self.stopped_at = [None] * batch_size        # jumlah token baru saat berhenti
+        self.reasons = [None] * batch_size           # kill_switch / gizi_done / repetition
+
+    def _repeated_ngram(self, row, input_ids):
+        if input_ids.shape[1] - self.prompt_len < LOOP_NGRAM_SIZE: return False
+        key = tuple(input_ids[row, -LOOP_NGRAM_SIZE:].tolist())
+        counts = self.ngram_counts[row]
+        counts[key] = counts.get(key, 0) + 1
+        return counts[key] >= LOOP_NGRAM_MAX_REPEATS
+
+    def _on_loop(self, row):
+        """Loop terdeteksi: belokkan ke section gizi (sekali) atau hentikan baris."""
+        cleaner = self.cleaners[row]
+        if self.steering is None or self.steered[row] or self.steer_wait[row] or cleaner.section == "GIZI":
+            return 'repetition'
+        # Token paksaan baru disuntik di awal baris berikutnya, supaya tidak memotong baris di tengah
+        self.steer_wait[row] = True
+        cleaner.looping, cleaner.loop_run = False, 0
+        self.ngram_counts[row].clear()
+        return None
+
+    def _stop_reason(self, row, input_ids):
+        if self.steering is not None and self.steering.forced[row]:
+            return None  # token paksaan belum selesai
+        if self.loop_stop and self._repeated_ngram(row, input_ids):
+            return self._on_loop(row)
+
+        text = tokenizer.decode(input_ids[row, self.line_start[row]:], skip_special_tokens=True)
+        # Karakter multi-byte yang belum lengkap ditunggu token berikutnya
+        if text.endswith("\ufffd"): return None
+        cleaner = self.cleaners[row]
+        cleaner.feed(text[self.printed[row]:])
+        if text.endswith("\n"):
+            self.line_start[row], self.printed[row] = input_ids.shape[1], 0
+            if self.steer_wait[row]:
+                self.steer_wait[row], self.steered[row] = False, True
+                self.steering.forced[row].extend(self.steer_ids)
+        else:
+            self.printed[row] = len(text)
+
+        if cleaner.looping: return self._on_loop(row)
+        if self.early_stop and cleaner.killed: return 'kill_switch'
+        if self.early_stop and cleaner.gizi_done: return 'gizi_done'
+        return None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = []
+        for row in range(len(self.cleaners)):
+            if not self.finished[row] and self.reasons[row] is None:
+                if input_ids[row, -1].item() in (tokenizer.eos_token_id, tokenizer.pad_token_id):
+                    self.finished[row] = True  # sisa baris ini cuma padding
+                else:
+                    reason = self._stop_reason(row, input_ids)
+                    if reason:
+                        self.reasons[row] = reason
+                        self.stopped_at[row] = input_ids.shape[1] - self.prompt_len
+            done.append(self.finished[row] or self.reasons[row] is not None)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+class EarlyStopStats:
+    """Statistik early stop: berapa request berhenti lebih awal (per alasan) dan token yang dihemat."""
+
+    REASONS = ('kill_switch', 'gizi_done', 'repetition')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'tokens_generated': 0, 'tokens_saved': 0, 'loops_steered': 0,
+                      'stopped': {reason: 0 for reason in self.REASONS},
+                      'tokens_saved_by_reason': {reason: 0 for reason in self.REASONS}}
+
+    def record(self, criteria, new_tokens):
+        with self._lock:
+            self.stats['loops_steered'] += sum(criteria.steered)
+            for reason, stopped_at, tokens in zip(criteria.reasons, criteria.stopped_at, new_tokens):
+                self.stats['requests'] += 1
+                self.stats['tokens_generated'] += tokens
+                if reason is None: continue
+                # Perkiraan atas: tanpa early stop model bisa jalan sampai MAX_NEW_TOKENS
+                saved = max(0, MAX_NEW_TOKENS - stopped_at)
+                self.stats['stopped'][reason] += 1
+                self.stats['tokens_saved_by_reason'][reason] += saved
+                self.stats['tokens_saved'] += saved
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['stopped'] = dict(self.stats['stopped'])
+            stats['tokens_saved_by_reason'] = dict(self.stats['tokens_saved_by_reason'])
+        stats['enabled'] = {'early_stop': EARLY_STOP_ENABLED, 'loop_stop': LOOP_STOP_ENABLED}
+        stats['loop_thresholds'] = {'action': LOOP_ACTION, 'max_repeated_lines': LOOP_MAX_REPEATED_LINES,
+                                    'ngram_size': LOOP_NGRAM_SIZE, 'ngram_max_repeats': LOOP_NGRAM_MAX_REPEATS}
+        stats['avg_tokens_saved_per_request'] = round(stats['tokens_saved'] / stats['requests'], 2) if stats['requests'] else 0.0
+        return stats
+
+early_stop_stats = EarlyStopStats()
+
+def generate_raw_batch(prompts, streamer=None, adapters=None):
+    """
+    Tugas: Menjalankan SATU model.generate untuk beberapa prompt sekaligus (padded batch).
+    prompts: list of str atau (prefix, suffix) dari build_prompt (prefix KV cache dipakai ulang).
+    adapters: nama adapter LoRA per prompt (boleh campur dalam satu batch).
+    Dijalankan di bawah model_lock (satu generate per proses pada satu waktu).
+    Return: List of (raw_output, jumlah_token_baru), urutan sama dengan prompts.
+    """
+    with model_lock:
+        return _generate_raw_batch(prompts, streamer, adapters)
+
+def _generate_raw_batch(prompts, streamer=None, adapters=None):
+    inputs = prepare_generate_inputs(prompts, adapters)
+    prompt_len = inputs["input_ids"].shape[1]
+    criteria, steering = None, None
+    if EARLY_STOP_ENABLED or LOOP_STOP_ENABLED:
+        if LOOP_STOP_ENABLED and LOOP_ACTION == "steer":
+            steering = ForcedTokensProcessor(len(prompts))
+        criteria = CleanerStoppingCriteria(prompt_len, len(prompts), EARLY_STOP_ENABLED, LOOP_STOP_ENABLED, steering)
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs, max_new_tokens=MAX_NEW_TOKENS,
+            temperature=0.3,
+            repetition_penalty=1.2,
+            do_sample=True,
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.pad_token_id,
+            stopping_criteria=StoppingCriteriaList([criteria]) if criteria else None,
+            logits_processor=LogitsProcessorList([steering]) if steering else None,
+            streamer=streamer
+        )
+
+    results = []
+    for i, row in enumerate(outputs):
+        new_tokens = int((row[prompt_len:] != tokenizer.pad_token_id).sum().item())
+        response = tokenizer.decode(row, skip_special_tokens=True)
+        raw_output = response.split("### Response:")[-1].strip() if "### Response:" in response else response
+        if criteria and criteria.reasons[i] == 'repetition' and '\n' in raw_output:
+            raw_output = raw_output[:raw_output.rfind('\n')]  # baris terakhir terpotong di tengah loop
+        results.append((raw_output, new_tokens))
+    if criteria:
+        early_stop_stats.record(criteria, [tokens for _, tokens in results])
+    return results
+
+class BatchScheduler:
+    """
+    Micro-batching scheduler: mengantrikan prompt dari banyak request HTTP,
+    menggabungkannya jadi satu batch (maks max_batch_size atau tunggu max_wait_ms),
+    lalu mengembalikan hasil ke masing-masing pemanggil lewat Future.
+    """
+
+    def __init__(self, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'batches': 0,
+            'requests': 0,
+            'tokens': 0,
+            'generate_seconds': 0.0,
+            'batch_sizes': {},
+        }
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="batch-scheduler", daemon=True)
+                self._thread.start()
+
+    def submit(self, prompt, mode="normal", adapter=DEFAULT_ADAPTER):
+        """Masukkan prompt ke antrian. Return: Future berisi (raw_output, jumlah_token_baru)."""
+        self.start()
+        future = Future()
+        self.queue.put({'prompt': prompt, 'mode': mode, 'adapter': adapter, 'future': future})
+        return future
+
+    def _collect(self):
+        # Blok sampai ada request pertama, lalu kumpulkan sisanya dalam jendela waktu
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = generate_raw_batch([item['prompt'] for item in batch],
+                                             adapters=[item['adapter'] for item in batch])
+            except Exception as e:
+                print(f"[ERR] Error Generate (batch={len(batch)}): {e}")
+                for item in batch:
+                    item['future'].set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+
+            for item, result in zip(batch, results):
+                item['future'].set_result(result)
+
+            modes = ", ".join(item['mode'] if item['adapter'] == DEFAULT_ADAPTER else f"{item['mode']}@{item['adapter']}"
+                              for item in batch)
+            print(f"--- [BATCH] size={len(batch)} ({modes}) in {elapsed:.2f}s ---")
+            with self._stats_lock:
+                self.stats['batches'] += 1
+                self.stats['requests'] += len(batch)
+                self.stats['tokens'] += sum(tokens for _, tokens in results)
+                self.stats['generate_seconds'] += elapsed
+                sizes = self.stats['batch_sizes']
+                sizes[len(batch)] = sizes.get(len(batch), 0) + 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+            stats['batch_sizes'] = {str(k): v for k, v in sorted(self.stats['batch_sizes'].items())}
+        stats['avg_batch_size'] = round(stats['requests'] / stats['batches'], 2) if stats['batches'] else 0.0
+        stats['tokens_per_sec'] = round(stats['tokens'] / stats['generate_seconds'], 2) if stats['generate_seconds'] else 0.0
+        stats['queue_depth'] = self.queue.qsize()
+        stats['max_batch_size'] = self.max_batch_size
+        stats['max_wait_ms'] = self.max_wait * 1000.0
+        return stats
+
+batch_scheduler = BatchScheduler()
+
+# ==========================================
+# 5. Generation Caches (Exact Disk + Semantic)
+# ==========================================
+def normalize_bahan(bahan_input):
+    """
+    Tugas: Kanonikalisasi input bahan (lowercase, trim, dedupe, urut abjad).
+    Contoh: " Bawang Putih,ayam " -> "ayam, bawang putih"
+    """
+    items = re.split(r'[,;\n]+', str(bahan_input).lower())
+    items = {re.sub(r'\s+', ' ', item).strip() for item in items}
+    return ", ".join(sorted(item for item in items if item))
+
+def is_cacheable(resep_text):
+    """Hanya hasil generate yang sukses yang boleh disimpan ke cache."""
+    return bool(resep_text) and not resep_text.startswith("Maaf")
+
+class GenerationCache:
+    """
+    Cache hasil generate di SQLite (on-disk): tahan restart dan dipakai bareng
+    oleh beberapa proses model server. Key = mode + bahan yang sudah dinormalisasi.
+    Entry punya TTL, dan cache dibatasi total ukuran (eviksi LRU berdasarkan last_access).
+    """
+
+    def __init__(self, path=GEN_CACHE_PATH, ttl=GEN_CACHE_TTL, max_mb=GEN_CACHE_MAX_MB, enabled=GEN_CACHE_ENABLED,
+                 stats_flush=GEN_CACHE_STATS_FLUSH):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.enabled = enabled
+        self.stats_flush = stats_flush
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'bypass': 0, 'saved_seconds': 0.0}
+        self._pending = {}  # counter yang belum ditulis ke gen_cache_stats
+        self._last_flush = time.time()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS gen_cache (
+                             key TEXT PRIMARY KEY,
+                             resep TEXT NOT NULL,
+                             size INTEGER NOT NULL,
+                             gen_seconds REAL NOT NULL,
+                             created_at REAL NOT NULL,
+                             last_access REAL NOT NULL,
+                             hits INTEGER DEFAULT 0
+                         )
+                         ''')
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS gen_cache_stats (
+                             name TEXT PRIMARY KEY,
+                             value REAL NOT NULL
+                         )
+                         ''')
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(bahan_input, mode):
+        return f"{str(mode).strip().lower()}|{normalize_bahan(bahan_input)}"
+
+    def _count(self, name, amount):
+        # Counter dikumpulkan di memori, ditulis ke SQLite per stats_flush detik (bukan tiap lookup)
+        with self._stats_lock:
+            self.stats[name] += amount
+            self._pending[name] = self._pending.get(name, 0) + amount
+
+    def flush_stats(self, force=False):
+        with self._stats_lock:
+            if not self._pending or (not force and time.time() - self._last_flush < self.stats_flush):
+                return
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.time()
+        try:
+            conn = self._conn()
+            conn.executemany('''
+                             INSERT INTO gen_cache_stats (name, value) VALUES (?, ?)
+                             ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+                             ''', list(pending.items()))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"   [GEN CACHE ERR] Flush stats: {e}")
+            with self._stats_lock:
+                for name, amount in pending.items():
+                    self._pending[name] = self._pending.get(name, 0) + amount
+
+    def get(self, bahan_input, mode):
+        """Return: resep (str) kalau ada & belum expired, else None."""
+        if not self.enabled: return None
+        key = self.make_key(bahan_input, mode)
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT resep, gen_seconds, created_at FROM gen_cache WHERE key = ?", (key,)).fetchone()
+            if row and now - row[2] <= self.ttl:
+                conn.execute("UPDATE gen_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+                conn.commit()
+                self._count('hits', 1)
+                self._count('saved_seconds', row[1])
+                self.flush_stats()
+                print(f"   [GEN CACHE] HIT '{key}'")
+                return row[0]
+
+            # Miss = hanya SELECT (tulis hanya kalau entry expired dibuang)
+            if row:
+                conn.execute("DELETE FROM gen_cache WHERE key = ?", (key,))
+                conn.commit()
+            self._count('misses', 1)
+            self.flush_stats()
+        except sqlite3.Error as e:
+            print(f"   [GEN CACHE ERR] Get: {e}")
+        return None
+
+    def put(self, bahan_input, mode, resep_text, gen_seconds):
+        if not self.enabled or not is_cacheable(resep_text): return
+        key = self.make_key(bahan_input, mode)
+        now = time.time()
+        size = len(resep_text.encode('utf-8'))
+        try:
+            conn = self._conn()
+            conn.execute('''
+                         INSERT OR REPLACE INTO gen_cache (key, resep, size, gen_seconds, created_at, last_access, hits)
+                         VALUES (?, ?, ?, ?, ?, ?, 0)
+                         ''', (key, resep_text, size, gen_seconds, now, now))
+            self._evict(conn, now)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"   [GEN CACHE ERR] Put: {e}")
+
+    def _evict(self, conn, now):
+        # 1. Buang yang expired, 2. Buang yang paling lama tidak diakses sampai di bawah batas ukuran
+        conn.execute("DELETE FROM gen_cache WHERE created_at < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM gen_cache").fetchone()[0]
+        if total <= self.max_bytes: return
+        for key, size in conn.execute("SELECT key, size FROM gen_cache ORDER BY last_access ASC").fetchall():
+            conn.execute("DELETE FROM gen_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes: break
+
+    def record_bypass(self):
+        with self._stats_lock:
+            self.stats['bypass'] += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = {'process': dict(self.stats)}
+        stats['enabled'] = self.enabled
+        if not self.enabled: return stats
+        self.flush_stats(force=True)
+        try:
+            conn = self._conn()
+            stats['global'] = {name: value for name, value in conn.execute("SELECT name, value FROM gen_cache_stats")}
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM gen_cache").fetchone()
+            stats['entries'] = entries
+            stats['size_bytes'] = total
+            stats['max_bytes'] = self.max_bytes
+        except sqlite3.Error as e:
+            stats['error'] = str(e)
+        lookups = stats['process']['hits'] + stats['process']['misses']
+        stats['process']['hit_rate'] = round(stats['process']['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+generation_cache = GenerationCache()
+atexit.register(generation_cache.flush_stats, True)  # sisa counter saat proses berhenti
+
+class SemanticCache:
+    """
+    Cache tier 2 (in-memory): embedding bahan (SentenceTransformer yang sama dengan RAG)
+    disimpan di FAISS IndexFlatIP (vector ternormalisasi -> inner product = cosine).
+    Query yang mirip di atas threshold (dan mode sama) langsung dapat resep tersimpan.
+    Ukuran dibatasi max_entries dengan eviksi LRU.
+    """
+
+    def __init__(self, threshold=SEM_CACHE_THRESHOLD, max_entries=SEM_CACHE_MAX_ENTRIES, enabled=SEM_CACHE_ENABLED):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.enabled = enabled
+        self.index = None
+        self.entries = OrderedDict()  # id -> {'mode', 'bahan', 'resep'} (urutan = LRU)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+        self.recent_scores = deque(maxlen=100)  # skor similarity terbaik per lookup
+        self.hit_scores = deque(maxlen=100)
+
+    def _embed(self, bahan_input):
+        vector = embedder.encode([normalize_bahan(bahan_input)], normalize_embeddings=True)
+        return np.asarray(vector, dtype='float32')
+
+    def get(self, bahan_input, mode):
+        """Return: resep (str) dari query yang mirip, else None."""
+        if not self.enabled or embedder is None: return None
+        vector = self._embed(bahan_input)
+
+        with self._lock:
+            best_score, best_id = -1.0, None
+            if self.index is not None and self.index.ntotal > 0:
+                scores, ids = self.index.search(vector, min(8, self.index.ntotal))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id != -1 and self.entries[entry_id]['mode'] == mode:
+                        best_score, best_id = float(score), int(entry_id)
+                        break
+
+            self.recent_scores.append(round(best_score, 4))
+            if best_id is None or best_score < self.threshold:
+                self.stats['misses'] += 1
+                return None
+
+            self.entries.move_to_end(best_id)
+            self.stats['hits'] += 1
+            self.hit_scores.append(round(best_score, 4))
+            entry = self.entries[best_id]
+
+        print(f"   [SEM CACHE] HIT '{bahan_input}' ~ '{entry['bahan']}' (cos={best_score:.3f})")
+        return entry['resep']
+
+    def put(self, bahan_input, mode, resep_text):
+        if not self.enabled or embedder is None or not is_cacheable(resep_text): return
+        vector = self._embed(bahan_input)
+
+        with self._lock:
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(vector, np.array([entry_id], dtype='int64'))
+            self.entries[entry_id] = {'mode': mode, 'bahan': bahan_input, 'resep': resep_text}
+
+            while len(self.entries) > self.max_entries:
+                old_id, _ = self.entries.popitem(last=False)
+                self.index.remove_ids(np.array([old_id], dtype='int64'))
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            hit_scores = list(self.hit_scores)
+            return {
+                'enabled': self.enabled,
+                'threshold': self.threshold,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.stats['hits'],
+                'misses': self.stats['misses'],
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0.0,
+                'avg_hit_similarity': round(sum(hit_scores) / len(hit_scores), 4) if hit_scores else None,
+                'recent_scores': list(self.recent_scores)[-20:],
+            }
+
+semantic_cache = SemanticCache()
+
+# ==========================================
+# 6. Main Generator (Controller)
+# ==========================================
+def generate_resep_final(bahan_input, mode="normal", use_cache=True, retrieval=None, include=None, exclude=None,
+                         adapter=DEFAULT_ADAPTER):
+    """
+    Tugas: Pipeline Utama (Cache -> Semantic Cache -> Load -> Retrieve -> Generate -> Clean).
+    use_cache=False melewati pembacaan cache (hasil baru tetap disimpan).
+    include / exclude: filter bahan wajib ada / tidak boleh ada.
+    adapter: nama adapter LoRA (persona chef) dari ADAPTER_PATHS.
+    """
+    scope = cache_scope(mode, include, exclude, adapter)
+    cached = lookup_caches(bahan_input, scope, use_cache)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    resep_text = _generate_resep(bahan_input, mode, retrieval, include, exclude, adapter)
+    store_caches(bahan_input, scope, resep_text, time.perf_counter() - started)
+    return resep_text
+
+def cache_scope(mode, include=None, exclude=None, adapter=DEFAULT_ADAPTER):
+    """Key mode untuk cache: filter bahan & adapter ikut jadi bagian key supaya hasilnya tidak tertukar."""
+    scope = mode
+    if include or exclude:
+        scope = f"{mode}|+{','.join(sorted(include or []))}|-{','.join(sorted(exclude or []))}"
+    if adapter != DEFAULT_ADAPTER:
+        scope = f"{scope}@{adapter}"
+    return scope
+
+def lookup_caches(bahan_input, mode, use_cache=True):
+    """
+    Tugas: Cek cache tier 1 (exact, disk) lalu tier 2 (semantic, in-memory).
+    mode: hasil cache_scope (mode + filter bahan).
+    """
+    if not use_cache:
+        generation_cache.record_bypass()
+        return None
+
+    cached = generation_cache.get(bahan_input, mode)
+    if cached is not None:
+        return cached
+
+    if model is None: load_resources()
+    return semantic_cache.get(bahan_input, mode)
+
+def store_caches(bahan_input, mode, resep_text, gen_seconds):
+    generation_cache.put(bahan_input, mode, resep_text, gen_seconds)
+    semantic_cache.put(bahan_input, mode, resep_text)
+
+def _generate_resep(bahan_input, mode="normal", retrieval=None, include=None, exclude=None, adapter=DEFAULT_ADAPTER):
+    """
+    Tugas: Pipeline tanpa cache (Load -> Retrieve -> Generate -> Clean).
+    """
+    if model is None: load_resources()
+
+    # 1. Retrieve
+    context = retrieve_smart_filter(bahan_input, mode, retrieval, include, exclude)
+    if context is None:
+        return f"Maaf, stok resep untuk '{bahan_input}' tidak ditemukan."
+
+    # 2. Prompt Engineering
+    prompt = build_prompt(bahan_input, mode, context, exclude)
+
+    # 3. Generate (via micro-batching scheduler kalau aktif)
     print("--- [AI] Generating Recipe... ---")
     try:
-        streamer = TextStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
-
-        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs, max_new_tokens=700,
-                temperature=0.3,
-                repetition_penalty=1.2,
-                do_sample=True,
-                eos_token_id=tokenizer.eos_token_id,
-                pad_token_id=tokenizer.pad_token_id,
-                streamer=streamer
-            )
-
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        raw_output = response.split("### Response:")[-1].strip() if "### Response:" in response else response
+        if batch_scheduler.max_batch_size > 1:
+            raw_output, _ = batch_scheduler.submit(prompt, mode, adapter).result()
+        else:
+            streamer = TextStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+            raw_output, _ = generate_raw_batch([prompt], streamer=streamer, adapters=[adapter])[0]
 
     except Exception as e:
         print(f"[ERR] Error Generate: {e}")
@@ -384,6 +1616,437 @@ Buatkan resep untuk: {bahan_input}
     # 4. Clean & Return
     return super_clean_output(raw_output)
 
+def stream_resep_final(bahan_input, mode="normal", use_cache=True, retrieval=None, include=None, exclude=None,
+                       adapter=DEFAULT_ADAPTER):
+    """
+    Tugas: Versi streaming dari generate_resep_final.
+    Yield: ('token', potongan_teks) selama decoding, lalu ('done', resep_bersih) atau ('error', pesan).
+    Jalur ini tidak lewat batch scheduler (TextIteratorStreamer hanya untuk batch 1).
+    """
+    scope = cache_scope(mode, include, exclude, adapter)
+    cached = lookup_caches(bahan_input, scope, use_cache)
+    if cached is not None:
+        yield 'token', cached
+        yield 'done', cached
+        return
+
+    if model is None: load_resources()
+    started = time.perf_counter()
+
+    context = retrieve_smart_filter(bahan_input, mode, retrieval, include, exclude)
+    if context is None:
+        yield 'done', f"Maaf, stok resep untuk '{bahan_input}' tidak ditemukan."
+        return
+
+    prompt = build_prompt(bahan_input, mode, context, exclude)
+
+    print("--- [AI] Streaming Recipe... ---")
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=120)
+    errors, results = [], []
+
+    def _run():
+        try:
+            results.extend(generate_raw_batch([prompt], streamer=streamer, adapters=[adapter]))
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    worker = threading.Thread(target=_run, name="stream-generate", daemon=True)
+    worker.start()
+
+    chunks = []
+    try:
+        for text in streamer:
+            if not text: continue
+            chunks.append(text)
+            yield 'token', text
+    except Exception as e:
+        errors.append(e)
+    worker.join()
+
+    if errors:
+        print(f"[ERR] Error Generate (stream): {errors[0]}")
+        yield 'error', "Maaf, dapur sedang kendala teknis."
+        return
+
+    # Hasil generate_raw_batch sudah dirapikan (misal baris loop yang terpotong)
+    raw_output = results[0][0] if results else "".join(chunks)
+    if "### Response:" in raw_output:
+        raw_output = raw_output.split("### Response:")[-1]
+    resep_text = super_clean_output(raw_output.strip())
+    store_caches(bahan_input, scope, resep_text, time.perf_counter() - started)
+    yield 'done', resep_text
+
+def format_sse(event, data):
+    """Format satu Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# ==========================================
+# 7. Job Queue (Async Generation + Backpressure)
+# ==========================================
+class QueueFullError(Exception):
+    def __init__(self, depth):
+        super().__init__(f"Job queue is full ({depth} waiting).")
+        self.depth = depth
+
+class JobQueue:
+    """
+    Tugas: Antrian job generate berkapasitas tetap (max_queue) dengan num_workers thread pekerja.
+    submit() langsung gagal (QueueFullError) kalau antrian penuh -> backpressure ke client.
+    Status job: queued -> running -> done / error. Hasil disimpan result_ttl detik setelah selesai.
+    Idempotency key (header Idempotency-Key): submit ulang dengan key yang sama (retry client setelah
+    koneksi putus) mengembalikan job yang sudah ada, bukan generate kedua.
+    Job stream=True dijalankan lewat stream_resep_final: token dikumpulkan di job['chunks'] supaya
+    client bisa subscribe (GET /api/jobs/<id>/events) begitu job jalan. Di mode worker pool
+    (model tidak di proses ini) job stream tetap lewat run_generation, hasil dikirim utuh.
+    """
+
+    def __init__(self, num_workers=JOB_WORKERS, max_queue=JOB_QUEUE_MAX, result_ttl=JOB_RESULT_TTL):
+        self.num_workers = max(1, num_workers)
+        self.queue = queue.Queue(maxsize=max(1, max_queue))
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self.keys = {}  # idempotency key -> job id
+        self._lock = threading.Lock()
+        self._workers = []
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'rejected': 0, 'done': 0, 'failed': 0,
+                      'wait_seconds': 0.0, 'run_seconds': 0.0}
+
+    def start(self):
+        with self._lock:
+            self._workers = [w for w in self._workers if w.is_alive()]
+            for i in range(len(self._workers), self.num_workers):
+                worker = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, params, key=None, stream=False):
+        """params: kwargs generate_resep_final. Return: job dict (punya 'id' & 'event')."""
+        self.start()
+        job = {'id': uuid.uuid4().hex, 'status': 'queued', 'params': params, 'result': None, 'error': None,
+               'created_at': time.time(), 'started_at': None, 'finished_at': None, 'event': threading.Event(),
+               'stream': stream, 'chunks': [], 'progress': threading.Condition()}
+        with self._lock:
+            self._purge(job['created_at'])
+            if key and self.keys.get(key) in self.jobs:
+                self.stats['deduplicated'] += 1
+                return self.jobs[self.keys[key]]
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self.stats['rejected'] += 1
+                raise QueueFullError(self.queue.qsize())
+            self.jobs[job['id']] = job
+            if key:
+                self.keys[key] = job['id']
+            self.stats['submitted'] += 1
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def position(self, job):
+        """Perkiraan posisi di antrian (0 = berikutnya diambil worker)."""
+        with self.queue.mutex:
+            waiting = list(self.queue.queue)
+        return waiting.index(job) if job in waiting else None
+
+    def _purge(self, now):
+        # Dipanggil dengan _lock: buang hasil job yang sudah lewat TTL
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job['finished_at'] and now - job['finished_at'] > self.result_ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+        if expired:
+            self.keys = {key: job_id for key, job_id in self.keys.items() if job_id in self.jobs}
+
+    def _loop(self):
+        while True:
+            job = self.queue.get()
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+            try:
+                if job['stream'] and worker_pool is None:
+                    job['result'] = self._run_streaming(job)
+                else:
+                    job['result'] = run_generation(job['params'])
+                job['status'] = 'done'
+            except Exception as e:
+                print(f"[JOB ERROR] {job['id']}: {e}")
+                job['error'] = str(e)
+                job['status'] = 'error'
+            job['finished_at'] = time.time()
+            with self._lock:
+                self.stats['done' if job['status'] == 'done' else 'failed'] += 1
+                self.stats['wait_seconds'] += job['started_at'] - job['created_at']
+                self.stats['run_seconds'] += job['finished_at'] - job['started_at']
+            with job['progress']:
+                job['event'].set()
+                job['progress'].notify_all()
+
+    def _run_streaming(self, job):
+        # Tanpa batch scheduler (TextIteratorStreamer hanya batch 1), sama seperti /api/generate/stream
+        for event, payload in stream_resep_final(**job['params']):
+            if event == 'token':
+                with job['progress']:
+                    job['chunks'].append(payload)
+                    job['progress'].notify_all()
+            else:
+                return payload  # 'done' -> resep bersih, 'error' -> pesan "Maaf ... kendala"
+        return "Maaf, dapur sedang kendala teknis."
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['tracked_jobs'] = len(self.jobs)
+            running = sum(1 for job in self.jobs.values() if job['status'] == 'running')
+        finished = stats['done'] + stats['failed']
+        stats['avg_wait_seconds'] = round(stats['wait_seconds'] / finished, 3) if finished else 0.0
+        stats['avg_run_seconds'] = round(stats['run_seconds'] / finished, 3) if finished else 0.0
+        stats['queue_depth'] = self.queue.qsize()
+        stats['queue_max'] = self.queue.maxsize
+        stats['running'] = running
+        stats['workers'] = self.num_workers
+        return stats
+
+job_queue = JobQueue()
+
+# ==========================================
+# 8. Multi-Process Worker Pool (Pre-Fork)
+# ==========================================
+def split_cpus(num_workers):
+    """Bagi core yang boleh dipakai proses ini jadi num_workers potongan berurutan (None = tidak dipin)."""
+    if not hasattr(os, 'sched_getaffinity'):
+        return [None] * num_workers
+    cpus = sorted(os.sched_getaffinity(0))
+    per_worker = len(cpus) // num_workers
+    if per_worker == 0:
+        return [None] * num_workers
+    return [cpus[i * per_worker:(i + 1) * per_worker] for i in range(num_workers)]
+
+def adapter_report():
+    """Info adapter + memori model di proses ini (untuk /api/adapters)."""
+    adapters_mb = sum(info['memory_mb'] for info in adapter_registry.values())
+    return {
+        'default': DEFAULT_ADAPTER,
+        'adapters': adapter_registry,
+        'base_model': BASE_MODEL_NAME,
+        'base_memory_mb': round(model.get_memory_footprint() / 1e6 - adapters_mb, 2),
+        'adapters_memory_mb': round(adapters_mb, 2)
+    }
+
+def pool_worker_main(worker_id, cpus, task_queue, results, heartbeat):
+    """
+    Tugas: Entry point proses worker. Pin CPU, load model + RAG (mmap, read-only), lalu WORKER_THREADS
+    thread mengambil task (task_id, params) dari task_queue dan mengirim hasil lewat results
+    (pipe milik worker ini saja). Thread heartbeat menandai proses masih hidup (dipantau supervisor).
+    """
+    global CPU_NUM_THREADS
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+        CPU_NUM_THREADS = len(cpus)
+        torch.set_num_threads(len(cpus))
+    print(f"[WORKER {worker_id}] pid={os.getpid()} cpus={cpus or 'all'}")
+
+    load_resources(rag_read_only=True)
+    if model is None:
+        raise SystemExit(1)  # supervisor akan restart
+
+    send_lock = threading.Lock()  # Connection tidak thread-safe, dipakai bersama thread serve
+
+    def _send(message):
+        with send_lock:
+            results.send(message)
+
+    _send(('ready', worker_id, os.getpid(), adapter_report()))
+
+    def _beat():
+        while True:
+            heartbeat.value = time.time()
+            time.sleep(1.0)
+
+    def _serve():
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            task_id, params = task
+            try:
+                result = ('result', task_id, True, generate_resep_final(**params))
+            except Exception as e:
+                result = ('result', task_id, False, str(e))
+            _send(result)
+
+    threading.Thread(target=_beat, name="worker-heartbeat", daemon=True).start()
+    threads = [threading.Thread(target=_serve, name=f"worker-serve-{i}") for i in range(WORKER_THREADS)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+
+class WorkerPool:
+    """
+    Tugas: Supervisor N proses worker model (spawn). Tiap worker punya antrian task sendiri;
+    task dikirim ke worker siap dengan task in-flight paling sedikit. Thread monitor me-restart
+    worker yang mati / heartbeat-nya berhenti, dan menggagalkan task yang sedang dipegangnya.
+    Hasil dikirim lewat pipe per worker: worker yang di-kill di tengah menulis hanya merusak
+    pipe-nya sendiri, yang dibuang bersama proses lamanya.
+    """
+
+    def __init__(self, num_workers=WORKER_PROCESSES, pin_cpus=WORKER_PIN_CPUS, target=pool_worker_main):
+        self.num_workers = num_workers
+        self.pin_cpus = pin_cpus
+        self.target = target
+        self.ctx = mp.get_context("spawn")
+        self.workers = {}
+        self.adapters = None
+        self.cpus = [None] * num_workers
+        self._cond = threading.Condition()
+        self._retired = []  # read end pipe worker lama, ditutup oleh thread collector
+        self._started = False
+        self.stats = {'tasks': 0, 'failed': 0, 'restarts': 0}
+
+    def start(self):
+        with self._cond:
+            if self._started: return
+            self._started = True
+            self.cpus = split_cpus(self.num_workers) if self.pin_cpus else [None] * self.num_workers
+            for worker_id in range(self.num_workers):
+                self._spawn(worker_id)
+        threading.Thread(target=self._collect, name="pool-collector", daemon=True).start()
+        threading.Thread(target=self._monitor, name="pool-monitor", daemon=True).start()
+
+    def _spawn(self, worker_id):
+        # Dipanggil dengan _cond
+        task_queue = self.ctx.Queue()
+        heartbeat = self.ctx.Value('d', time.time())
+        reader, writer = self.ctx.Pipe(duplex=False)
+        process = self.ctx.Process(target=self.target, name=f"model-worker-{worker_id}",
+                                   args=(worker_id, self.cpus[worker_id], task_queue, writer, heartbeat),
+                                   daemon=True)
+        process.start()
+        writer.close()  # proses utama hanya memegang read end -> EOF saat worker mati
+        previous = self.workers.get(worker_id)
+        if previous:
+            self._retired.append(previous['results'])
+        self.workers[worker_id] = {'process': process, 'tasks': task_queue, 'results': reader, 'heartbeat': heartbeat,
+                                   'inflight': {}, 'ready': False, 'started_at': time.time(), 'died_at': None,
+                                   'done': previous['done'] if previous else 0,
+                                   'restarts': previous['restarts'] + 1 if previous else 0,
+                                   'failures': previous['failures'] if previous else 0}
+
+    def generate(self, params):
+        """Kirim satu request generate ke worker, blok sampai hasil (resep) kembali."""
+        future = Future()
+        task_id = uuid.uuid4().hex
+        with self._cond:
+            ready = lambda: [w for w in self.workers.values() if w['ready']]
+            if not self._cond.wait_for(lambda: ready(), timeout=WORKER_READY_TIMEOUT):
+                raise RuntimeError("No model worker is ready.")
+            # Least outstanding; seri -> worker yang paling sedikit menerima task (merata)
+            worker = min(ready(), key=lambda w: (len(w['inflight']), w['done'] + len(w['inflight'])))
+            worker['inflight'][task_id] = future
+            worker['tasks'].put((task_id, params))
+            self.stats['tasks'] += 1
+        return future.result()
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                for conn in self._retired:
+                    conn.close()
+                self._retired = []
+                readers = [w['results'] for w in self.workers.values() if not w['results'].closed]
+            for conn in mp_connection.wait(readers, timeout=0.5):
+                try:
+                    kind, key, ok, payload = conn.recv()
+                except (EOFError, OSError, pickle.UnpicklingError):
+                    conn.close()  # worker mati / pesan terpotong; monitor yang menangani restart
+                    continue
+                self._handle(kind, key, ok, payload)
+
+    def _handle(self, kind, key, ok, payload):
+        with self._cond:
+            if kind == 'ready':
+                worker = self.workers.get(key)
+                if worker and worker['process'].pid == ok:
+                    worker['ready'] = True
+                    worker['failures'] = 0
+                    self.adapters = payload
+                    print(f"[POOL] Worker {key} siap (pid={ok}, load {time.time() - worker['started_at']:.1f}s)")
+                    self._cond.notify_all()
+                return
+            future = None
+            for worker in self.workers.values():
+                future = worker['inflight'].pop(key, None)
+                if future is not None:
+                    worker['done'] += 1
+                    break
+        if future is None:
+            return  # task milik worker yang sudah di-restart
+        if ok:
+            future.set_result(payload)
+        else:
+            with self._cond: self.stats['failed'] += 1
+            future.set_exception(RuntimeError(payload))
+
+    def _monitor(self):
+        while True:
+            time.sleep(1.0)
+            with self._cond:
+                for worker_id, worker in list(self.workers.items()):
+                    process = worker['process']
+                    if worker['died_at'] is None:
+                        stale = worker['ready'] and time.time() - worker['heartbeat'].value > WORKER_HEARTBEAT_TIMEOUT
+                        if process.is_alive() and not stale:
+                            continue
+                        if stale:
+                            print(f"[POOL] Worker {worker_id} tidak ada heartbeat, dihentikan")
+                            process.kill()
+                            process.join(5)
+                        print(f"[POOL] Worker {worker_id} mati (exit code {process.exitcode})")
+                        worker['ready'] = False
+                        worker['died_at'] = time.time()
+                        worker['failures'] += 1
+                        for future in worker['inflight'].values():
+                            future.set_exception(RuntimeError(f"Model worker {worker_id} crashed."))
+                        self.stats['failed'] += len(worker['inflight'])
+                        worker['inflight'] = {}
+
+                    # Backoff eksponensial kalau worker gagal berturut-turut (mis. gagal load model)
+                    if time.time() - worker['died_at'] >= min(60.0, 2.0 ** (worker['failures'] - 1)):
+                        print(f"[POOL] Restart worker {worker_id} (gagal berturut-turut: {worker['failures']})")
+                        self.stats['restarts'] += 1
+                        self._spawn(worker_id)
+
+    def stop(self):
+        with self._cond:
+            for worker in self.workers.values():
+                worker['process'].kill()
+            self._started = False
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats['workers'] = {str(worker_id): {
+                'pid': w['process'].pid,
+                'alive': w['process'].is_alive(),
+                'ready': w['ready'],
+                'cpus': self.cpus[worker_id],
+                'inflight': len(w['inflight']),
+                'done': w['done'],
+                'restarts': w['restarts'],
+                'heartbeat_age': round(time.time() - w['heartbeat'].value, 1)
+            } for worker_id, w in self.workers.items()}
+        return stats
+
+worker_pool = WorkerPool() if WORKER_PROCESSES > 0 else None
+
+def run_generation(params):
+    """Generate lewat worker pool kalau aktif, selain itu langsung di proses ini."""
+    if worker_pool is not None:
+        return worker_pool.generate(params)
+    return generate_resep_final(**params)
+
 # ==========================================
 # API ROUTES
 # ==========================================
@@ -411,66 +2074,347 @@ def health_check():
         'message': 'Model server is running.'
     })
 
-@app.route('/api/generate', methods=['POST'])
+@app.route('/api/stats', methods=['GET'])
 @api_key_required
-def generate_recipe_api():
-    # Get JSON Data from Request
-    data = request.get_json()
-    if not data:
+def stats_api():
+    return jsonify({
+        'error_code': 0,
+        'success': True,
+        'data': {
+            'batching': batch_scheduler.get_stats(),
+            'cache': generation_cache.get_stats(),
+            'semantic_cache': semantic_cache.get_stats(),
+            'early_stop': early_stop_stats.get_stats(),
+            'prefix_cache': prefix_cache.get_stats(),
+            'jobs': job_queue.get_stats(),
+            'worker_pool': worker_pool.get_stats() if worker_pool else None
+        }
+    })
+
+@app.route('/api/adapters', methods=['GET'])
+@api_key_required
+def adapters_api():
+    # Mode worker pool: model ada di proses worker, info dikirim saat worker siap
+    report = adapter_report() if model is not None else (worker_pool.adapters if worker_pool else None)
+    if report is None:
         return jsonify({
+            'error_code': 13,
+            'success': False,
+            'message': 'Model is not loaded.'
+        }), 503
+
+    return jsonify({
+        'error_code': 0,
+        'success': True,
+        'data': report
+    })
+
+def parse_generate_request(data):
+    """
+    Tugas: Validasi body JSON /api/generate, /api/jobs, /api/generate/stream.
+    Return: (kwargs generate_resep_final, None) atau (None, (response, status)).
+    """
+    if not data:
+        return None, (jsonify({
             'error_code': 400,
             'success': False,
             'message': 'Invalid JSON data.'
-        }), 400
+        }), 400)
 
     # Bahan Input
     bahan = data.get("bahan")
-    mode = data.get("mode", "normal")  # default mode is 'normal'
+    retrieval = data.get("retrieval")  # dense / lexical / hybrid (default: RETRIEVAL_MODE)
+    adapter = data.get("adapter") or DEFAULT_ADAPTER  # persona chef (adapter LoRA)
 
     # Validate Bahan
     if not bahan:
-        return jsonify({
+        return None, (jsonify({
             'error_code': 7,
             'success': False,
             'message': 'Ingredient is required to generate recipe.'
-        }), 400
+        }), 400)
 
-    # Execute Recipe Generation
+    if retrieval and retrieval not in RETRIEVAL_MODES:
+        return None, (jsonify({
+            'error_code': 11,
+            'success': False,
+            'message': f'Invalid retrieval mode. Use one of: {", ".join(RETRIEVAL_MODES)}.'
+        }), 400)
+
+    if adapter not in ADAPTER_PATHS:
+        return None, (jsonify({
+            'error_code': 12,
+            'success': False,
+            'message': f'Unknown adapter. Use one of: {", ".join(ADAPTER_PATHS)}.'
+        }), 400)
+
+    include = parse_ingredient_list(data.get("include"))  # bahan wajib ada, list / "a, b"
+    exclude = parse_ingredient_list(data.get("exclude"))  # bahan tidak boleh ada
+
+    # Bahan filter yang isinya cuma satuan / kata pengisi (mis. "buah") tidak bisa difilter
+    empty = [item for item in include + exclude if not tokenize(item)]
+    if empty:
+        return None, (jsonify({
+            'error_code': 17,
+            'success': False,
+            'message': f'Ingredient filter has no searchable words: {", ".join(empty)}.'
+        }), 400)
+
+    return {
+        'bahan_input': bahan,
+        'mode': data.get("mode", "normal"),  # default mode is 'normal'
+        'use_cache': not data.get("no_cache", False),  # bypass cache per request
+        'retrieval': retrieval,
+        'include': include,
+        'exclude': exclude,
+        'adapter': adapter
+    }, None
+
+def submit_job(params, stream=False):
+    """Return: (job, None) atau (None, response 429 dengan kedalaman antrian)."""
     try:
-        # Call AI Utility to Generate Recipe
-        resep_text = generate_resep_final(bahan, mode)
-
-        # Check if AI returned an error message
-        if "Maaf" in resep_text and "kendala" in resep_text:
-            return jsonify({
-                'error_code': 8,
-                'success': False,
-                'message': 'AI failed to generate recipe. Try different ingredients.'
-            }), 500
-        
+        return job_queue.submit(params, key=request.headers.get('Idempotency-Key'), stream=stream), None
+    except QueueFullError as e:
+        print(f"[JOB] Ditolak, antrian penuh ({e.depth}/{job_queue.queue.maxsize})")
+        response = jsonify({
+            'error_code': 14,
+            'success': False,
+            'message': 'Model server is busy. Try again later.',
+            'data': {'queue_depth': e.depth, 'queue_max': job_queue.queue.maxsize}
+        })
+        response.headers['Retry-After'] = '5'
+        return None, (response, 429)
+
+def job_payload(job):
+    params = job['params']
+    payload = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'mode': params['mode'],
+        'adapter': params['adapter'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+    if job['status'] == 'queued':
+        payload['queue_position'] = job_queue.position(job)
+        payload['queue_depth'] = job_queue.queue.qsize()
+    elif job['status'] == 'done':
+        payload['resep'] = job['result']
+    elif job['status'] == 'error':
+        payload['error'] = job['error']
+    return payload
+
+def job_failed(job):
+    # Pipeline mengembalikan pesan "Maaf ... kendala" kalau generate gagal
+    return job['status'] == 'error' or ("Maaf" in job['result'] and "kendala" in job['result'])
+
+def wait_job_events(job):
+    """
+    Event ala stream_resep_final dari job queue: ('token', teks) untuk tiap chunk job stream (mulai
+    dari awal, jadi subscriber yang telat tetap dapat teks lengkap), lalu ('done', resep) / ('error', pesan).
+    Job tanpa chunk (bukan stream / worker pool / cache) -> satu token berisi resep utuh.
+    """
+    sent, deadline = 0, time.monotonic() + JOB_WAIT_TIMEOUT
+    while True:
+        with job['progress']:
+            job['progress'].wait_for(lambda: len(job['chunks']) > sent or job['event'].is_set(),
+                                     timeout=max(0.0, deadline - time.monotonic()))
+            chunks = job['chunks'][sent:]
+            finished = job['event'].is_set()
+        for chunk in chunks:
+            yield 'token', chunk
+        sent += len(chunks)
+        if finished:
+            break
+        if not chunks and time.monotonic() >= deadline:
+            yield 'error', "Generation is taking too long. Poll the job for the result."
+            return
+
+    if job['status'] == 'error' or job_failed(job):
+        yield 'error', "Maaf, dapur sedang kendala teknis."
+        return
+    if not sent:
+        yield 'token', job['result']
+    yield 'done', job['result']
+
+@app.route('/api/jobs', methods=['POST'])
+@api_key_required
+def submit_job_api():
+    params, error = parse_generate_request(request.get_json())
+    if error:
+        return error
+
+    # stream=true -> token bisa diikuti lewat GET /api/jobs/<job_id>/events selama job jalan
+    job, error = submit_job(params, stream=bool(request.get_json().get('stream')))
+    if error:
+        return error
+
+    return jsonify({
+        'error_code': 0,
+        'success': True,
+        'message': 'Job queued.',
+        'data': job_payload(job)
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@api_key_required
+def job_status_api(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
         return jsonify({
-            'error_code': 0,
-            'success': True,
-            'message': 'Recipe generated successfully!',
-            'data': {
-                'resep': resep_text,
-                'mode': mode
-            }
+            'error_code': 16,
+            'success': False,
+            'message': 'Job not found or expired.'
+        }), 404
+
+    if job['status'] == 'done' and job_failed(job):
+        return jsonify({
+            'error_code': 8,
+            'success': False,
+            'message': 'AI failed to generate recipe. Try different ingredients.',
+            'data': job_payload(job)
         })
 
-    except Exception as e:
-        print(f"[AI ERROR] {e}")
+    return jsonify({
+        'error_code': 9 if job['status'] == 'error' else 0,
+        'success': job['status'] != 'error',
+        'message': f"Job {job['status']}.",
+        'data': job_payload(job)
+    })
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+@api_key_required
+def job_events_api(job_id):
+    # Subscribe ke job yang sudah di-submit: token (job stream) lalu done / error, format sama dengan /api/generate/stream
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'error_code': 16,
+            'success': False,
+            'message': 'Job not found or expired.'
+        }), 404
+
+    def event_stream():
+        for event, payload in wait_job_events(job):
+            if event == 'token':
+                yield format_sse('token', {'text': payload})
+            elif event == 'done':
+                yield format_sse('done', {'resep': payload, 'mode': job['params']['mode']})
+            else:
+                yield format_sse('error', {'error_code': 8, 'message': payload})
+
+    return Response(stream_with_context(event_stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/generate', methods=['POST'])
+@api_key_required
+def generate_recipe_api():
+    # Sinkron: submit ke job queue lalu tunggu hasilnya
+    params, error = parse_generate_request(request.get_json())
+    if error:
+        return error
+
+    job, error = submit_job(params)
+    if error:
+        return error
+
+    if not job['event'].wait(JOB_WAIT_TIMEOUT):
+        return jsonify({
+            'error_code': 15,
+            'success': False,
+            'message': 'Generation is taking too long. Poll the job for the result.',
+            'data': {'job_id': job['id']}
+        }), 504
+
+    if job['status'] == 'error':
         return jsonify({
             'error_code': 9,
             'success': False,
-            'message': f'Server Error during generation: {str(e)}'
+            'message': f"Server Error during generation: {job['error']}"
+        }), 500
+
+    # Check if AI returned an error message
+    if job_failed(job):
+        return jsonify({
+            'error_code': 8,
+            'success': False,
+            'message': 'AI failed to generate recipe. Try different ingredients.'
         }), 500
 
+    return jsonify({
+        'error_code': 0,
+        'success': True,
+        'message': 'Recipe generated successfully!',
+        'data': {
+            'resep': job['result'],
+            'mode': params['mode'],
+            'adapter': params['adapter']
+        }
+    })
+
+@app.route('/api/generate/stream', methods=['POST'])
+@api_key_required
+def generate_recipe_stream_api():
+    # Streaming tidak lewat job queue (token dikirim langsung selama decoding)
+    params, error = parse_generate_request(request.get_json())
+    if error:
+        return error
+
+    events = None
+    if worker_pool is not None:
+        # Model ada di proses worker: tidak ada token per token, hasil dikirim utuh saat job selesai
+        job, error = submit_job(params)
+        if error:
+            return error
+        events = wait_job_events(job)
+
+    def event_stream():
+        try:
+            for event, payload in events or stream_resep_final(**params):
+                if event == 'token':
+                    yield format_sse('token', {'text': payload})
+                elif event == 'done':
+                    yield format_sse('done', {'resep': payload, 'mode': params['mode']})
+                else:
+                    yield format_sse('error', {'error_code': 8, 'message': payload})
+        except Exception as e:
+            print(f"[AI ERROR] {e}")
+            yield format_sse('error', {'error_code': 9, 'message': f'Server Error during generation: {str(e)}'})
+
+    return Response(stream_with_context(event_stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 # ==========================================
 # Run the Flask Application
 # ==========================================
 if __name__ == '__main__':
-    print("[APP] Starting AI...")
-    load_resources()
-    print("[APP] Server Ready...")
-    app.run(host='0.0.0.0', port=5001, debug=False)
\ No newline at end of file
+    import argparse
+    from werkzeug.serving import WSGIRequestHandler
+    # HTTP/1.1 -> koneksi keep-alive dari client pooled web app (utils.model_session) dipakai ulang
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    parser = argparse.ArgumentParser(description="Smart Kitchen model server")
+    subparsers = parser.add_subparsers(dest="command")
+    merge_parser = subparsers.add_parser("merge-adapter", help="merge LoRA adapter ke base, simpan checkpoint standalone")
+    merge_parser.add_argument("--output", default=MERGED_MODEL_PATH)
+    merge_parser.add_argument("--dtype", choices=["float16", "bfloat16", "float32"], default="float16")
+    args = parser.parse_args()
+
+    if args.command == "merge-adapter":
+        merge_adapter(args.output, args.dtype)
+    elif worker_pool is not None:
+        print("[APP] Sinkronisasi cache RAG (sekali, sebelum worker start)...")
+        prepare_rag_cache()
+        print(f"[APP] Starting {WORKER_PROCESSES} model workers...")
+        worker_pool.start()
+        print("[APP] Server Ready (model dimuat di worker)...")
+        app.run(host='0.0.0.0', port=5001, debug=False, threaded=True)
+    else:
+        print("[APP] Starting AI...")
+        load_resources()
+        print("[APP] Server Ready...")
+        app.run(host='0.0.0.0', port=5001, debug=False)
\ No newline at end of file
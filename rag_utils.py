@@ -0,0 +1,587 @@
+# ==========================================
+# Import Modules
+# ==========================================
+import os
+import json
+import re
+import math
+import hashlib
+from collections import Counter
+import numpy as np
+import scipy.sparse as sp
+
+def save_array_atomic(path, arr):
+    """np.save ke file .tmp lalu os.replace: proses lain (mmap) melihat file lama atau baru, tidak setengah tertulis."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(arr))
+    os.replace(tmp_path, path)
+
+def save_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+# ==========================================
+# 1. Columnar Recipe Store
+# ==========================================
+class RecipeStore:
+    """
+    Tugas: Menyimpan corpus RAG dalam bentuk kolom (array-backed), bukan DataFrame.
+    - Kolom numerik (calories, proteins, nutrition_score) -> NumPy float64 array (nilai sama persis dengan CSV).
+    - Kolom teks (Title, Ingredients, Steps) -> satu buffer UTF-8 + array offset int64,
+      jadi satu baris = slice buffer[offsets[i]:offsets[i+1]] tanpa objek Python per sel.
+    """
+
+    NUMERIC_COLUMNS = ('calories', 'proteins', 'nutrition_score')
+    TEXT_COLUMNS = ('Title', 'Ingredients', 'Steps')
+
+    def __init__(self, numeric, text_buffers, text_offsets, row_ids=None):
+        self.numeric = numeric            # nama kolom -> float64 array (n,)
+        self.text_buffers = text_buffers  # nama kolom -> uint8 array (total bytes,)
+        self.text_offsets = text_offsets  # nama kolom -> int64 array (n + 1,)
+        self.calories = numeric['calories']
+        self.proteins = numeric['proteins']
+        # Row ID stabil (label FAISS), urut naik -> posisi baris = searchsorted
+        self.row_ids = row_ids if row_ids is not None else np.arange(len(self.calories), dtype='int64')
+
+    @classmethod
+    def from_dataframe(cls, df, row_ids=None):
+        """Bangun store dari DataFrame hasil merge resep + nutrisi (row_ids harus urut naik)."""
+        numeric = {
+            col: df[col].to_numpy(dtype='float64', na_value=-1) if col in df else np.full(len(df), -1, dtype='float64')
+            for col in cls.NUMERIC_COLUMNS
+        }
+        text_buffers, text_offsets = {}, {}
+        for col in cls.TEXT_COLUMNS:
+            buffer, offsets = pack_strings(df[col].fillna('').astype(str).tolist())
+            text_buffers[col] = buffer
+            text_offsets[col] = offsets
+        if row_ids is not None:
+            row_ids = np.asarray(row_ids, dtype='int64')
+        return cls(numeric, text_buffers, text_offsets, row_ids)
+
+    def __len__(self):
+        return len(self.calories)
+
+    def text(self, col, i):
+        offsets = self.text_offsets[col]
+        return self.text_buffers[col][offsets[i]:offsets[i + 1]].tobytes().decode('utf-8')
+
+    def positions(self, labels):
+        """Ubah label FAISS (row ID) jadi posisi baris; label tidak dikenal / -1 -> -1."""
+        labels = np.asarray(labels, dtype='int64')
+        if len(self.row_ids) == 0:
+            return np.full(labels.shape, -1, dtype='int64')
+        pos = np.clip(np.searchsorted(self.row_ids, labels), 0, len(self.row_ids) - 1)
+        valid = (labels != -1) & (self.row_ids[pos] == labels)
+        return np.where(valid, pos, -1)
+
+    def row(self, i):
+        """Return: dict satu resep (hanya dipakai untuk kandidat terpilih)."""
+        item = {col: self.text(col, i) for col in self.TEXT_COLUMNS}
+        for col in self.NUMERIC_COLUMNS:
+            item[col] = float(self.numeric[col][i])
+        return item
+
+    # ------------------------------------------
+    # On-disk format (memory-mappable)
+    # ------------------------------------------
+    # <dir>/meta.json                     -> versi format, jumlah baris, daftar kolom
+    # <dir>/<numeric>.npy                 -> float64 (n,)
+    # <dir>/<text>.offsets.npy            -> int64 (n + 1,)
+    # <dir>/<text>.data.npy               -> uint8 buffer UTF-8
+    # <dir>/row_ids.npy                   -> int64 (n,), urut naik
+    # Semua file .npy dibuka dengan np.load(mmap_mode='r'), jadi beberapa proses
+    # berbagi page cache yang sama dan cold start hanya menyentuh halaman yang dibaca.
+    FORMAT_VERSION = 3
+
+    def save(self, directory):
+        """Tulis store ke direktori (atomic per file lewat rename)."""
+        os.makedirs(directory, exist_ok=True)
+        arrays = {f"{col}.npy": arr for col, arr in self.numeric.items()}
+        arrays["row_ids.npy"] = self.row_ids
+        for col in self.text_buffers:
+            arrays[f"{col}.offsets.npy"] = self.text_offsets[col]
+            arrays[f"{col}.data.npy"] = self.text_buffers[col]
+        for name, arr in arrays.items():
+            tmp_path = os.path.join(directory, name + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(arr))
+            os.replace(tmp_path, os.path.join(directory, name))
+
+        meta = {
+            'format_version': self.FORMAT_VERSION,
+            'rows': len(self),
+            'numeric_columns': list(self.numeric),
+            'text_columns': list(self.text_buffers),
+        }
+        # meta.json ditulis terakhir: kalau ada, berarti semua array sudah lengkap
+        tmp_path = os.path.join(directory, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, 'meta.json'))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Buka store dari direktori. mmap=True -> array read-only berbasis page cache."""
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != cls.FORMAT_VERSION:
+            raise ValueError(f"Format store tidak didukung: {meta.get('format_version')}")
+
+        mmap_mode = 'r' if mmap else None
+        numeric = {col: np.load(os.path.join(directory, f"{col}.npy"), mmap_mode=mmap_mode)
+                   for col in meta['numeric_columns']}
+        text_buffers, text_offsets = {}, {}
+        for col in meta['text_columns']:
+            text_offsets[col] = np.load(os.path.join(directory, f"{col}.offsets.npy"), mmap_mode=mmap_mode)
+            text_buffers[col] = np.load(os.path.join(directory, f"{col}.data.npy"), mmap_mode=mmap_mode)
+
+        row_ids = np.load(os.path.join(directory, "row_ids.npy"), mmap_mode=mmap_mode)
+        store = cls(numeric, text_buffers, text_offsets, row_ids)
+        if len(store) != meta['rows']:
+            raise ValueError("Jumlah baris store tidak cocok dengan meta.json")
+        return store
+
+    @property
+    def nbytes(self):
+        total = self.row_ids.nbytes + sum(arr.nbytes for arr in self.numeric.values())
+        total += sum(arr.nbytes for arr in self.text_buffers.values())
+        total += sum(arr.nbytes for arr in self.text_offsets.values())
+        return total
+
+def pack_strings(values):
+    """
+    Tugas: Gabungkan list string jadi (buffer uint8, offsets int64) berbasis UTF-8.
+    """
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    buffer = np.frombuffer(b"".join(encoded), dtype='uint8')
+    return buffer, offsets
+
+# ==========================================
+# 2. Lexical Index (BM25)
+# ==========================================
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Kata satuan / pengisi yang muncul di hampir semua resep (tidak informatif)
+STOPWORDS = frozenset([
+    'dan', 'atau', 'yang', 'untuk', 'dengan', 'secukupnya', 'sesuai', 'selera',
+    'buah', 'siung', 'batang', 'lembar', 'ruas', 'butir', 'ekor', 'potong', 'bungkus',
+    'sdm', 'sdt', 'gr', 'gram', 'kg', 'ml', 'liter', 'gelas', 'cm', 'iris', 'ikat', 'genggam',
+])
+
+def tokenize(text):
+    """Lowercase + ambil token alfanumerik, buang stopword & angka."""
+    return [t for t in TOKEN_PATTERN.findall(str(text).lower()) if t not in STOPWORDS and not t.isdigit()]
+
+class LexicalIndex:
+    """
+    Tugas: Inverted index BM25 di atas Title + Ingredients_Clean.
+    Postings disimpan CSR (term_offsets -> doc_ids / tfs) sebagai array NumPy,
+    doc id = posisi baris di RecipeStore. Bisa disimpan & dibuka memory-mapped.
+    """
+
+    def __init__(self, terms, term_offsets, doc_ids, tfs, doc_len, k1=1.2, b=0.75):
+        self.terms = terms
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.term_offsets = term_offsets  # int64 (V + 1,)
+        self.doc_ids = doc_ids            # int32 (total postings,)
+        self.tfs = tfs                    # float32 (total postings,)
+        self.doc_len = doc_len            # float32 (n_docs,)
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(doc_len)
+        self.avgdl = float(doc_len.mean()) if self.n_docs else 0.0
+        df = np.diff(term_offsets).astype('float32')
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5)).astype('float32')
+
+    @classmethod
+    def build(cls, documents):
+        """documents: list teks (urutan = posisi baris store)."""
+        vocab, postings = {}, {}
+        doc_len = np.zeros(len(documents), dtype='float32')
+        for doc_id, text in enumerate(documents):
+            tokens = tokenize(text)
+            doc_len[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                term_id = vocab.setdefault(token, len(vocab))
+                postings.setdefault(term_id, []).append((doc_id, tf))
+
+        terms = [None] * len(vocab)
+        for term, term_id in vocab.items():
+            terms[term_id] = term
+        term_offsets = np.zeros(len(terms) + 1, dtype='int64')
+        np.cumsum([len(postings[i]) for i in range(len(terms))], out=term_offsets[1:])
+        doc_ids = np.empty(term_offsets[-1], dtype='int32')
+        tfs = np.empty(term_offsets[-1], dtype='float32')
+        for term_id in range(len(terms)):
+            start, end = term_offsets[term_id], term_offsets[term_id + 1]
+            doc_ids[start:end], tfs[start:end] = zip(*postings[term_id])
+        return cls(terms, term_offsets, doc_ids, tfs, doc_len)
+
+    def query_terms(self, query):
+        """Term id unik dari query yang ada di vocabulary."""
+        return sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+
+    def search(self, query, k=15, mask=None):
+        """
+        Return: (doc_ids, scores, coverage) top-k, urut skor turun.
+        coverage = fraksi term query (yang dikenal) yang muncul di dokumen.
+        mask: bool array (n_docs,) opsional, dokumen False tidak ikut hasil.
+        """
+        term_ids = self.query_terms(query)
+        if not term_ids or self.n_docs == 0:
+            empty = np.empty(0, dtype='int64')
+            return empty, np.empty(0, dtype='float32'), np.empty(0, dtype='float32')
+
+        slices = [slice(self.term_offsets[t], self.term_offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[sl] for sl in slices])
+        tfs = np.concatenate([self.tfs[sl] for sl in slices])
+        idf = np.concatenate([np.full(sl.stop - sl.start, self.idf[t], dtype='float32') for t, sl in zip(term_ids, slices)])
+
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / max(self.avgdl, 1e-6))
+        weights = idf * tfs * (self.k1 + 1) / (tfs + norm)
+        scores = np.bincount(docs, weights=weights, minlength=self.n_docs)
+        matched = np.bincount(docs, minlength=self.n_docs)
+        if mask is not None:
+            matched[~mask] = 0
+
+        hit_docs = np.flatnonzero(matched)
+        if len(hit_docs) > k:
+            hit_docs = hit_docs[np.argpartition(-scores[hit_docs], k - 1)[:k]]
+        hit_docs = hit_docs[np.argsort(-scores[hit_docs], kind='stable')]
+        return hit_docs.astype('int64'), scores[hit_docs].astype('float32'), (matched[hit_docs] / len(term_ids)).astype('float32')
+
+    def save(self, directory):
+        """Tulis index ke direktori (atomic per file lewat rename, terms.json terakhir)."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ('term_offsets', 'doc_ids', 'tfs', 'doc_len'):
+            save_array_atomic(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        save_json_atomic(os.path.join(directory, 'terms.json'), {'k1': self.k1, 'b': self.b, 'terms': self.terms})
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, 'terms.json'))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(directory, 'terms.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in ('term_offsets', 'doc_ids', 'tfs', 'doc_len')}
+        return cls(meta['terms'], k1=meta['k1'], b=meta['b'], **arrays)
+
+# ==========================================
+# 3. Ingredient Bitmap Index (Include / Exclude Filter)
+# ==========================================
+class IngredientBitmapIndex:
+    """
+    Tugas: Bitmap per token bahan -> resep (bit ke-i = posisi baris i di RecipeStore).
+    Matrix uint8 (V, ceil(n/8)) hasil np.packbits, jadi filter include/exclude cukup
+    AND / OR / NOT per byte tanpa loop per resep. Disimpan sebagai .npy (mmap).
+    Bahan multi-kata dicocokkan lewat posting list bigram (dua token berurutan di satu item
+    bahan "--"), jadi "bawang putih" tidak cocok dengan "bawang merah" + "putih telur".
+    """
+
+    def __init__(self, terms, bitmaps, n_docs, bigrams=None, bigram_offsets=None, bigram_docs=None):
+        self.terms = terms
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.bitmaps = bitmaps  # uint8 (V, ceil(n_docs / 8))
+        self.n_docs = n_docs
+        self.bigram_vocab = {bigram: i for i, bigram in enumerate(bigrams or [])}
+        self.bigram_offsets = bigram_offsets  # CSR: doc bigram ke-i = bigram_docs[offsets[i]:offsets[i+1]]
+        self.bigram_docs = bigram_docs
+
+    @classmethod
+    def build(cls, ingredient_texts):
+        """ingredient_texts: kolom Ingredients asli (item bahan dipisah '--')."""
+        vocab, rows = {}, []
+        bigram_vocab, bigram_rows = {}, set()
+        for doc_id, text in enumerate(ingredient_texts):
+            doc_tokens = set()
+            for item in str(text).split('--'):
+                tokens = tokenize(item)
+                doc_tokens.update(tokens)
+                for pair in zip(tokens, tokens[1:]):
+                    bigram_rows.add((bigram_vocab.setdefault(' '.join(pair), len(bigram_vocab)), doc_id))
+            for token in doc_tokens:
+                rows.append((vocab.setdefault(token, len(vocab)), doc_id))
+        n_docs = len(ingredient_texts)
+        # Set bit langsung di matrix packed (urutan bit big-endian, sama dengan np.packbits)
+        bitmaps = np.zeros((len(vocab), (n_docs + 7) // 8), dtype='uint8')
+        if rows:
+            term_idx, doc_idx = np.array(rows, dtype='int64').T
+            np.bitwise_or.at(bitmaps, (term_idx, doc_idx >> 3), (128 >> (doc_idx & 7)).astype('uint8'))
+        terms = [None] * len(vocab)
+        for term, term_id in vocab.items():
+            terms[term_id] = term
+
+        # Posting list bigram (CSR, doc id urut per bigram)
+        pairs = np.array(sorted(bigram_rows), dtype='int64').reshape(-1, 2)
+        bigram_offsets = np.zeros(len(bigram_vocab) + 1, dtype='int64')
+        np.add.at(bigram_offsets, pairs[:, 0] + 1, 1)
+        bigram_offsets = np.cumsum(bigram_offsets)
+        bigrams = [None] * len(bigram_vocab)
+        for bigram, bigram_id in bigram_vocab.items():
+            bigrams[bigram_id] = bigram
+        return cls(terms, bitmaps, n_docs, bigrams, bigram_offsets, pairs[:, 1].astype('int32'))
+
+    def _bigram_bitmap(self, bigram):
+        bigram_id = self.bigram_vocab.get(bigram)
+        bits = np.zeros(self.n_docs, dtype=bool)
+        if bigram_id is not None:
+            bits[self.bigram_docs[self.bigram_offsets[bigram_id]:self.bigram_offsets[bigram_id + 1]]] = True
+        return np.packbits(bits)
+
+    def _phrase_bitmap(self, phrase):
+        """Satu token -> bitmap token; multi-kata -> AND bigram berurutan ("daun bawang merah")."""
+        tokens = tokenize(phrase)
+        if not tokens:
+            raise ValueError(f"Bahan filter '{phrase}' tidak punya kata yang bisa dicari.")
+        if len(tokens) == 1:
+            if tokens[0] not in self.vocab:
+                return np.zeros(self.bitmaps.shape[1], dtype='uint8')
+            return np.asarray(self.bitmaps[self.vocab[tokens[0]]])
+        return np.bitwise_and.reduce([self._bigram_bitmap(' '.join(pair)) for pair in zip(tokens, tokens[1:])], axis=0)
+
+    def allowed_mask(self, include=None, exclude=None):
+        """
+        Return: bool array (n_docs,) resep yang memuat SEMUA include dan TIDAK memuat exclude,
+        atau None kalau tidak ada filter. Raise ValueError kalau ada bahan tanpa kata yang bisa dicari.
+        """
+        include = [self._phrase_bitmap(p) for p in include or []]
+        exclude = [self._phrase_bitmap(p) for p in exclude or []]
+        if not include and not exclude:
+            return None
+
+        packed = np.full(self.bitmaps.shape[1], 0xFF, dtype='uint8')
+        for bitmap in include:
+            packed &= bitmap
+        for bitmap in exclude:
+            packed &= ~bitmap
+        return np.unpackbits(packed, count=self.n_docs).astype(bool)
+
+    def save(self, directory):
+        """Tulis index ke direktori (atomic per file lewat rename, terms.json terakhir)."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ('bitmaps', 'bigram_offsets', 'bigram_docs'):
+            save_array_atomic(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        bigrams = sorted(self.bigram_vocab, key=self.bigram_vocab.get)
+        save_json_atomic(os.path.join(directory, 'terms.json'), {'n_docs': self.n_docs, 'terms': self.terms, 'bigrams': bigrams})
+
+    @classmethod
+    def exists(cls, directory):
+        # Cache lama (tanpa bigram) dianggap tidak ada -> dibangun ulang
+        return all(os.path.exists(os.path.join(directory, name)) for name in ('terms.json', 'bigram_docs.npy'))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, 'terms.json')) as f:
+            meta = json.load(f)
+        mmap_mode = 'r' if mmap else None
+        bitmaps = np.load(os.path.join(directory, 'bitmaps.npy'), mmap_mode=mmap_mode)
+        bigram_offsets = np.load(os.path.join(directory, 'bigram_offsets.npy'), mmap_mode=mmap_mode)
+        bigram_docs = np.load(os.path.join(directory, 'bigram_docs.npy'), mmap_mode=mmap_mode)
+        return cls(meta['terms'], bitmaps, meta['n_docs'], meta['bigrams'], bigram_offsets, bigram_docs)
+
+def parse_ingredient_list(value):
+    """Terima list atau string dipisah koma -> list bahan (lowercase, tanpa kosong)."""
+    if not value: return []
+    items = value if isinstance(value, (list, tuple)) else str(value).split(',')
+    return [str(item).strip().lower() for item in items if str(item).strip()]
+
+def minmax_normalize(scores):
+    """Skala skor ke [0, 1] (semua sama -> 1)."""
+    scores = np.asarray(scores, dtype='float32')
+    if len(scores) == 0: return scores
+    span = scores.max() - scores.min()
+    return (scores - scores.min()) / span if span > 0 else np.ones_like(scores)
+
+def fuse_scores(dense_ids, dense_scores, lexical_ids, lexical_scores, alpha=0.5, k=15, return_scores=False):
+    """
+    Tugas: Gabungkan skor dense & lexical (min-max per sumber, lalu alpha * dense + (1 - alpha) * lexical).
+    dense_scores harus "makin besar makin mirip". Return: doc id top-k (urut skor fusi),
+    atau (doc id, skor fusi) kalau return_scores=True.
+    """
+    normalize = minmax_normalize
+    dense_ids = np.asarray(dense_ids, dtype='int64')
+    keep = dense_ids != -1
+    dense_ids, dense_scores = dense_ids[keep], np.asarray(dense_scores)[keep]
+
+    all_ids = np.union1d(dense_ids, lexical_ids)
+    fused = np.zeros(len(all_ids), dtype='float32')
+    fused[np.searchsorted(all_ids, dense_ids)] += alpha * normalize(dense_scores)
+    fused[np.searchsorted(all_ids, lexical_ids)] += (1 - alpha) * normalize(lexical_scores)
+    order = np.argsort(-fused, kind='stable')[:k]
+    if return_scores:
+        return all_ids[order], fused[order]
+    return all_ids[order]
+
+# ==========================================
+# 4. Fuzzy Nutrition Matcher (Char N-gram TF-IDF)
+# ==========================================
+def normalize_name(text):
+    """Lowercase, semua non-alfanumerik jadi satu spasi."""
+    return re.sub(r'[^0-9a-z]+', ' ', str(text).lower()).strip()
+
+class NutritionMatcher:
+    """
+    Tugas: Cocokkan judul resep ke nama makanan di nutrition.csv lewat cosine TF-IDF
+    karakter n-gram. Nama nutrisi jadi matrix sparse (CSR) sekali; judul di-vectorize per batch
+    lalu dikalikan matrix itu (sparse x sparse), jadi hanya pasangan yang berbagi n-gram yang
+    dihitung -> mendekati linear terhadap jumlah resep, bukan resep x nama.
+    Judul yang sama persis (setelah normalisasi) selalu dapat skor 1.0.
+    """
+
+    def __init__(self, names, ngram=3):
+        self.ngram = ngram
+        grams = [self._grams(normalize_name(name)) for name in names]
+        self.vocab = {}
+        doc_freq = Counter()
+        for gram_list in grams:
+            for gram in set(gram_list):
+                self.vocab.setdefault(gram, len(self.vocab))
+                doc_freq[gram] += 1
+        n_names = len(grams)
+        self.idf = np.zeros(len(self.vocab), dtype='float64')
+        for gram, term_id in self.vocab.items():
+            self.idf[term_id] = math.log((1 + n_names) / (1 + doc_freq[gram])) + 1
+        # n-gram yang tidak ada di nama nutrisi tetap ikut norm judul (idf maksimum),
+        # supaya judul panjang tidak dapat skor tinggi hanya karena sebagian kecil cocok
+        self.unknown_idf = math.log(1 + n_names) + 1
+        self.matrix = self._vectorize(grams).T.tocsr()  # (V, n_names)
+
+    def _grams(self, text):
+        if not text: return []
+        padded = f" {text} "
+        return [padded[i:i + self.ngram] for i in range(max(1, len(padded) - self.ngram + 1))]
+
+    def _vectorize(self, gram_lists):
+        """List n-gram per teks -> CSR (n, V), sublinear tf x idf, L2-normalized."""
+        indptr, indices, data = [0], [], []
+        for gram_list in gram_lists:
+            known, unknown_sq = {}, 0.0
+            for gram, count in Counter(gram_list).items():
+                tf = 1 + math.log(count)
+                term_id = self.vocab.get(gram)
+                if term_id is None:
+                    unknown_sq += (tf * self.unknown_idf) ** 2
+                else:
+                    known[term_id] = tf * self.idf[term_id]
+            norm = math.sqrt(sum(w * w for w in known.values()) + unknown_sq) or 1.0
+            indices.extend(known)
+            data.extend(w / norm for w in known.values())
+            indptr.append(len(indices))
+        return sp.csr_matrix((np.array(data, dtype='float64'), np.array(indices, dtype='int64'), np.array(indptr, dtype='int64')),
+                             shape=(len(gram_lists), len(self.vocab)))
+
+    def match(self, titles, batch_size=4096):
+        """
+        Return: (index nama terbaik int64 (-1 = tidak ada n-gram sama), skor cosine float64 [0, 1]).
+        """
+        best = np.full(len(titles), -1, dtype='int64')
+        scores = np.zeros(len(titles), dtype='float64')
+        for start in range(0, len(titles), batch_size):
+            batch = titles[start:start + batch_size]
+            sims = (self._vectorize([self._grams(normalize_name(t)) for t in batch]) @ self.matrix).tocsr()
+            top = np.asarray(sims.max(axis=1).toarray()).ravel()
+            arg = np.asarray(sims.argmax(axis=1)).ravel()
+            found = top > 0
+            best[start:start + len(batch)] = np.where(found, arg, -1)
+            scores[start:start + len(batch)] = np.minimum(top, 1.0)
+        return best, scores
+
+# ==========================================
+# 5. Cache Manifest (Fingerprint & Row IDs)
+# ==========================================
+def file_sha256(path):
+    """Hash isi file (dibaca per blok 1 MB)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def compute_row_ids(texts):
+    """
+    Tugas: Row ID stabil per resep = hash 63-bit dari teks yang di-embed (+ nomor kemunculan
+    untuk teks duplikat). Resep yang teks embed-nya tidak berubah -> ID sama -> embedding dipakai ulang.
+    """
+    seen = {}
+    row_ids = np.empty(len(texts), dtype='int64')
+    for i, text in enumerate(texts):
+        occurrence = seen.get(text, 0)
+        seen[text] = occurrence + 1
+        digest = hashlib.blake2b(f"{occurrence}\x00{text}".encode('utf-8'), digest_size=8).digest()
+        row_ids[i] = int.from_bytes(digest, 'little') & 0x7FFF_FFFF_FFFF_FFFF
+    return row_ids
+
+def read_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+# ==========================================
+# 6. Vectorized Candidate Selection
+# ==========================================
+def select_best_candidate(store, candidate_ids, mode="normal"):
+    """
+    Tugas: Pilih kandidat terbaik dari hasil FAISS (urut relevansi) secara vectorized.
+    Mode diet: protein tertinggi di antara kandidat yang punya data nutrisi
+    (seri -> yang lebih relevan menang, sama dengan sort stabil versi lama).
+    Return: posisi baris di store, atau None kalau tidak ada kandidat.
+    """
+    candidate_ids = np.asarray(candidate_ids, dtype='int64')
+    candidate_ids = candidate_ids[candidate_ids != -1]
+    if len(candidate_ids) == 0:
+        return None
+
+    if mode == "diet":
+        proteins = store.proteins[candidate_ids]
+        valid = proteins > 0
+        if valid.any():
+            return int(candidate_ids[np.argmax(np.where(valid, proteins, -np.inf))])
+
+    return int(candidate_ids[0])
+
+def nutrition_known_mask(store):
+    """Bool mask resep yang punya data nutrisi (protein > 0 dan kalori diketahui)."""
+    return (np.asarray(store.proteins) > 0) & (np.asarray(store.calories) >= 0)
+
+def rank_diet_candidates(store, candidate_ids, scores, w_similarity=0.6, w_protein=0.3, w_calories=0.1):
+    """
+    Tugas: Ranking mode diet atas pool kandidat (semua sudah punya data nutrisi).
+    Skor = w_similarity * relevansi + w_protein * protein - w_calories * kalori,
+    masing-masing dinormalisasi min-max di dalam pool (vectorized, tanpa loop).
+    Return: posisi baris terbaik, atau None kalau pool kosong.
+    """
+    candidate_ids = np.asarray(candidate_ids, dtype='int64')
+    keep = candidate_ids != -1
+    candidate_ids, scores = candidate_ids[keep], np.asarray(scores)[keep]
+    if len(candidate_ids) == 0:
+        return None
+
+    combined = (w_similarity * minmax_normalize(scores)
+                + w_protein * minmax_normalize(store.proteins[candidate_ids])
+                - w_calories * minmax_normalize(store.calories[candidate_ids]))
+    return int(candidate_ids[np.argmax(combined)])
@@ -2,11 +2,16 @@
 # Library Imports
 # ==========================================
 import os
-import gc
 import re
+import json
+import time
 import random
 import string
+import threading
+import uuid
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -43,40 +48,502 @@ def load_resources():
     pass
 
 # ==========================================
-# 4. Main Generator (Controller)
+# 2. Model Server HTTP Client (Pooled + Resilient)
 # ==========================================
-def generate_resep_final(bahan_input, mode="normal"):
+# Satu Session untuk semua request ke model server: koneksi keep-alive dipakai ulang (tanpa
+# TCP handshake per request). Timeout connect/read selalu dipasang (read > JOB_WAIT_TIMEOUT model server).
+MODEL_CONNECT_TIMEOUT = float(os.environ.get("MODEL_CONNECT_TIMEOUT", "3.05"))
+MODEL_READ_TIMEOUT = float(os.environ.get("MODEL_READ_TIMEOUT", "330"))
+MODEL_POOL_SIZE = int(os.environ.get("MODEL_POOL_SIZE", "10"))
+# Retry hanya untuk kegagalan yang aman diulang: koneksi gagal (request belum sampai) dan
+# 429 / 503 (server menolak sebelum generate). Read timeout TIDAK di-retry (generate mungkin jalan).
+# Koneksi putus setelah POST terkirim hanya di-retry kalau request punya idempotency key.
+MODEL_RETRIES = int(os.environ.get("MODEL_RETRIES", "2"))
+MODEL_RETRY_BACKOFF = float(os.environ.get("MODEL_RETRY_BACKOFF", "0.5"))  # detik, dikali 2^attempt + jitter
+# Circuit breaker: setelah CIRCUIT_FAIL_THRESHOLD kegagalan berturut-turut, request langsung gagal
+# selama CIRCUIT_RESET_SECONDS, lalu satu request percobaan (half-open) menentukan tutup / buka lagi.
+CIRCUIT_FAIL_THRESHOLD = int(os.environ.get("CIRCUIT_FAIL_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+
+# Routing multi model server: MODEL_SERVER_URLS (dipisah koma) menggantikan MODEL_SERVER_URL.
+# Request dikirim ke endpoint sehat dengan request berjalan paling sedikit, seri -> latency EWMA terendah.
+# Health check /api/health tiap MODEL_HEALTH_INTERVAL detik: gagal -> dikeluarkan, pulih -> masuk lagi.
+MODEL_HEALTH_INTERVAL = float(os.environ.get("MODEL_HEALTH_INTERVAL", "5"))
+MODEL_HEALTH_TIMEOUT = float(os.environ.get("MODEL_HEALTH_TIMEOUT", "2"))
+MODEL_EWMA_ALPHA = float(os.environ.get("MODEL_EWMA_ALPHA", "0.3"))
+
+RETRYABLE_STATUS = (429, 503)
+# Yang dihitung gagal oleh circuit breaker: koneksi gagal + 502 / 504 (server/gateway tidak menjawab).
+# 500 dari aplikasi (mis. generate error) berarti server hidup -> bukan alasan ejection.
+CIRCUIT_FAILURE_STATUS = (502, 504)
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Model server dianggap down, request tidak dikirim."""
+
+class CircuitBreaker:
+    """
+    Tugas: State closed -> open (setelah `threshold` gagal berturut-turut) -> half_open
+    (setelah `reset_seconds`, satu request percobaan) -> closed kalau berhasil / open lagi kalau gagal.
+    """
+
+    def __init__(self, name="model server", threshold=CIRCUIT_FAIL_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"  # hanya satu request percobaan yang lolos
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    print(f"[MODEL CLIENT] Circuit OPEN {self.name} ({self.failures} gagal berturut-turut)")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+def create_model_session(pool_size=MODEL_POOL_SIZE):
+    session_ = requests.Session()
+    # pool_connections = jumlah host (model server) yang pool koneksinya disimpan
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size, max_retries=0)
+    session_.mount("http://", adapter)
+    session_.mount("https://", adapter)
+    return session_
+
+model_session = create_model_session()
+
+def model_server_urls():
+    urls = os.environ.get("MODEL_SERVER_URLS") or os.environ.get("MODEL_SERVER_URL") or ""
+    return [url.strip().rstrip("/") for url in urls.split(",") if url.strip()]
+
+class EndpointPool:
     """
-    Tugas: Pipeline Utama (Load -> Retrieve -> Generate -> Clean).
-    Bagian utama yang memanggil Model AI via API
+    Tugas: Load balancing ke beberapa model server.
+    acquire(): endpoint sehat + circuit-nya mengizinkan, request berjalan (outstanding) paling sedikit,
+    seri -> latency EWMA terendah. Tiap endpoint punya CircuitBreaker sendiri (ejection karena error
+    request), ditambah health check periodik ke /api/health (ejection & re-admission).
+    """
+
+    def __init__(self, urls, health_interval=MODEL_HEALTH_INTERVAL):
+        self.endpoints = [{'url': url, 'outstanding': 0, 'ewma_ms': None, 'healthy': True,
+                           'circuit': CircuitBreaker(url), 'requests': 0, 'errors': 0} for url in urls]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        if health_interval > 0:
+            threading.Thread(target=self._health_loop, name="model-health", daemon=True).start()
+
+    def acquire(self, exclude=(), url=None):
+        with self._lock:
+            candidates = [e for e in self.endpoints if e['healthy'] and e['url'] not in exclude
+                          and (url is None or e['url'] == url)]
+            candidates.sort(key=lambda e: (e['outstanding'], e['ewma_ms'] or 0.0))
+            for endpoint in candidates:
+                if endpoint['circuit'].allow_request():
+                    endpoint['outstanding'] += 1
+                    endpoint['requests'] += 1
+                    return endpoint
+        return None
+
+    def release(self, endpoint, elapsed_ms=None, ok=True):
+        with self._lock:
+            endpoint['outstanding'] -= 1
+            if not ok:
+                endpoint['errors'] += 1
+            if elapsed_ms is not None:
+                previous = endpoint['ewma_ms']
+                endpoint['ewma_ms'] = elapsed_ms if previous is None else (
+                    MODEL_EWMA_ALPHA * elapsed_ms + (1 - MODEL_EWMA_ALPHA) * previous)
+        if ok:
+            endpoint['circuit'].record_success()
+        else:
+            endpoint['circuit'].record_failure()
+
+    def check_health(self):
+        for endpoint in self.endpoints:
+            try:
+                ok = model_session.get(f"{endpoint['url']}/api/health", timeout=MODEL_HEALTH_TIMEOUT).status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            with self._lock:
+                changed = endpoint['healthy'] != ok
+                endpoint['healthy'] = ok
+            if changed:
+                print(f"[MODEL CLIENT] {endpoint['url']} {'masuk lagi (sehat)' if ok else 'dikeluarkan (health check gagal)'}")
+            if ok and endpoint['circuit'].state != "closed":
+                endpoint['circuit'].record_success()  # server menjawab lagi -> circuit ditutup tanpa tunggu reset
+
+    def _health_loop(self):
+        while not self._stopped.wait(self.health_interval):
+            self.check_health()
+
+    def stop(self):
+        self._stopped.set()
+
+    def get_stats(self):
+        with self._lock:
+            return [{'url': e['url'], 'healthy': e['healthy'], 'circuit': e['circuit'].state,
+                     'outstanding': e['outstanding'], 'requests': e['requests'], 'errors': e['errors'],
+                     'ewma_ms': round(e['ewma_ms'], 1) if e['ewma_ms'] is not None else None}
+                    for e in self.endpoints]
+
+endpoint_pool = None
+_endpoint_pool_lock = threading.Lock()
+
+def get_endpoint_pool():
+    """Pool dibuat saat pertama dipakai (env sudah termuat); dibuat ulang kalau daftar URL berubah."""
+    global endpoint_pool
+    urls = model_server_urls()
+    with _endpoint_pool_lock:
+        if endpoint_pool is None or [e['url'] for e in endpoint_pool.endpoints] != urls:
+            if endpoint_pool is not None:
+                endpoint_pool.stop()
+            endpoint_pool = EndpointPool(urls)
+        return endpoint_pool
+
+def retry_delay(attempt, response=None):
+    """Backoff eksponensial dengan full jitter; Retry-After dari server dipakai sebagai batas bawah."""
+    delay = random.uniform(0, MODEL_RETRY_BACKOFF * (2 ** attempt))
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        delay = max(delay, min(float(response.headers["Retry-After"]), 10.0))
+    return delay
+
+def release_on_close(response, pool, endpoint, started, ok):
+    """Pengganti response.close untuk streaming: lepas endpoint (sekali) lalu tutup koneksi."""
+    close, released = response.close, []
+    def _close():
+        if not released:
+            released.append(True)
+            pool.release(endpoint, (time.perf_counter() - started) * 1000, ok)
+        close()
+    return _close
+
+def request_not_sent(error):
+    """ConnectionError yang pasti terjadi sebelum request terkirim (connect ditolak / connect timeout)."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+def call_model_server(path, payload=None, stream=False, method="POST", endpoint_url=None, read_timeout=None,
+                      idempotency_key=None, retry_status=RETRYABLE_STATUS):
+    """
+    Tugas: Kirim request JSON ke salah satu model server (EndpointPool) lewat session pooled:
+    timeout, retry + jitter (failover ke endpoint lain kalau ada), circuit breaker per endpoint.
+    endpoint_url mengunci request ke satu endpoint (mis. cek status job yang ada di server itu).
+    idempotency_key (header Idempotency-Key): POST boleh diulang walau koneksi putus setelah terkirim;
+    ulangannya tetap ke endpoint yang sama karena hanya server itu yang mengenal key-nya.
+    retry_status: status yang di-retry (dengan jeda Retry-After); () -> 429 / 503 langsung dikembalikan.
+    Return: requests.Response (status apa pun selain yang di-retry), response.endpoint_url = endpoint
+    yang menjawab. Raise RequestException kalau gagal / semua endpoint down.
     """
     api_key = os.environ.get("API_KEY")
-    if not api_key:
-        return "Maaf, API key untuk model server tidak ditemukan."
+    pool = get_endpoint_pool()
+    headers = {"X-API-Key": api_key}
+    if stream:
+        headers["Accept"] = "text/event-stream"
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
 
-    model_server_url = os.environ.get("MODEL_SERVER_URL")
-    if not model_server_url:
-        return "Maaf, URL model server tidak ditemukan."
+    tried = set()
+    for attempt in range(MODEL_RETRIES + 1):
+        # Utamakan endpoint yang belum dicoba; kalau semua sudah, boleh ulang
+        if endpoint_url:
+            endpoint = pool.acquire(url=endpoint_url)
+        else:
+            endpoint = pool.acquire(exclude=tried) or pool.acquire()
+        if endpoint is None:
+            raise CircuitOpenError("No healthy model server available.")
+        tried.add(endpoint['url'])
+        started = time.perf_counter()
+        try:
+            response = model_session.request(method, f"{endpoint['url']}{path}", json=payload, headers=headers, stream=stream,
+                                             timeout=(MODEL_CONNECT_TIMEOUT, read_timeout or MODEL_READ_TIMEOUT))
+        except requests.exceptions.ConnectionError as e:
+            pool.release(endpoint, ok=False)
+            # Connect gagal -> request belum sampai, aman di-retry. Selain itu (mis. keep-alive basi
+            # ditutup server) POST mungkin sudah diproses: hanya diulang dengan idempotency key
+            maybe_sent = method == "POST" and not request_not_sent(e)
+            if attempt == MODEL_RETRIES or (maybe_sent and not idempotency_key):
+                raise
+            if maybe_sent:
+                endpoint_url = endpoint['url']
+            time.sleep(retry_delay(attempt) if endpoint_url or len(tried) >= len(pool.endpoints) else 0)
+            continue
+        except requests.exceptions.RequestException:
+            pool.release(endpoint, ok=False)
+            raise
 
-    try:
-        headers = {
-            "X-API-Key": api_key
+        ok = response.status_code not in CIRCUIT_FAILURE_STATUS
+        if response.status_code in retry_status and attempt < MODEL_RETRIES:
+            pool.release(endpoint, ok=ok)
+            delay = retry_delay(attempt, response) if endpoint_url or len(tried) >= len(pool.endpoints) else 0
+            response.close()
+            time.sleep(delay)
+            continue
+
+        response.endpoint_url = endpoint['url']
+        if not stream:
+            pool.release(endpoint, (time.perf_counter() - started) * 1000, ok)
+        else:
+            # Streaming: endpoint tetap dihitung berjalan sampai response ditutup
+            response.close = release_on_close(response, pool, endpoint, started, ok)
+        return response
+
+# ==========================================
+# 4. Main Generator (Controller)
+# ==========================================
+def iter_sse(response):
+    """Parse SSE dari response stream: blok "event: x" + "data: {...}" dipisah baris kosong. Yield: (event, data_dict)."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None: continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+# ==========================================
+# 5. Generation Jobs (Non-Blocking Web Tier)
+# ==========================================
+# /api/generate tidak lagi menahan thread waitress selama model generate: request dikirim ke
+# antrian job model server (POST /api/jobs), web app langsung membalas job_id, browser polling
+# status lokal. Satu thread poller mengecek job yang masih jalan tiap GENERATE_POLL_INTERVAL detik
+# dan menyimpan history saat selesai. Begitu job hampir / sudah jalan, browser bisa subscribe token
+# (GET /api/generate/<job_id>/events); relay ini menahan satu thread waitress selama decoding, jadi
+# jumlahnya dibatasi GENERATE_STREAM_MAX (server.py: threads=3) dan sisanya tetap polling.
+GENERATE_POLL_INTERVAL = float(os.environ.get("GENERATE_POLL_INTERVAL", "1"))
+GENERATE_STATUS_TIMEOUT = float(os.environ.get("GENERATE_STATUS_TIMEOUT", "10"))  # read timeout submit / cek status
+GENERATE_JOB_TIMEOUT = float(os.environ.get("GENERATE_JOB_TIMEOUT", "600"))  # job belum selesai -> dianggap gagal
+GENERATE_JOB_TTL = float(os.environ.get("GENERATE_JOB_TTL", "900"))  # detik job selesai disimpan di memori
+GENERATE_STREAM_MAX = int(os.environ.get("GENERATE_STREAM_MAX", "1"))  # relay token bersamaan (thread waitress)
+
+def is_failed_resep(resep_text):
+    # Pipeline model server mengembalikan pesan "Maaf ... kendala" kalau generate gagal
+    return "Maaf" in resep_text and "kendala" in resep_text
+
+class GenerationTracker:
+    """
+    Tugas: Melacak job generate milik user di web app.
+    submit() mengirim job ke model server lalu langsung return; thread poller (dibuat saat submit
+    pertama) menanyakan status ke endpoint yang menerima job, lalu memanggil save_result(user_id,
+    bahan, resep) -> history_id saat job selesai. get() hanya membaca memori (tanpa I/O).
+    subscribe() me-relay token job dari model server (maks stream_max bersamaan).
+    """
+
+    def __init__(self, save_result, poll_interval=GENERATE_POLL_INTERVAL, timeout=GENERATE_JOB_TIMEOUT, ttl=GENERATE_JOB_TTL,
+                 stream_max=GENERATE_STREAM_MAX):
+        self.save_result = save_result
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.ttl = ttl
+        self.jobs = {}
+        self.stats = {'submitted': 0, 'done': 0, 'failed': 0, 'rejected': 0, 'streamed': 0, 'stream_rejected': 0}
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._streams = threading.BoundedSemaphore(max(1, stream_max))
+        self._wake = threading.Event()
+        self._poller = None
+
+    def submit(self, user_id, bahan, mode="normal", include=None, exclude=None, stream=False):
+        """
+        stream=True: model server menjalankan job lewat jalur streaming supaya bisa di-subscribe.
+        Return: (job, None) atau (None, (error_code, pesan, http_status, retry_after)).
+        """
+        if not os.environ.get("API_KEY") or not model_server_urls():
+            return None, (9, 'Model server is not configured.', 500, None)
+
+        try:
+            # Submit jalan di thread request: 429 / 503 (antrian model server penuh) langsung diteruskan ke
+            # client tanpa retry + sleep Retry-After; yang di-retry hanya koneksi gagal (failover cepat)
+            response = call_model_server("/api/jobs", {"bahan": bahan, "mode": mode, "include": include, "exclude": exclude,
+                                                       "stream": stream},
+                                         read_timeout=GENERATE_STATUS_TIMEOUT, idempotency_key=uuid.uuid4().hex,
+                                         retry_status=())
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"[GEN JOB] Submit gagal: {e}")
+            with self._lock:
+                self.stats['rejected'] += 1
+            return None, (9, 'Kitchen is temporarily unavailable. Please try again.', 503, None)
+
+        if response.status_code != 202 or not data.get('success'):
+            with self._lock:
+                self.stats['rejected'] += 1
+            if response.status_code in RETRYABLE_STATUS:
+                return None, (14, 'Kitchen is busy. Please try again shortly.', response.status_code,
+                              response.headers.get('Retry-After', '5'))
+            return None, (data.get('error_code', 9), data.get('message', 'Failed to queue recipe generation.'),
+                          response.status_code if response.status_code >= 400 else 500, None)
+
+        remote = data['data']
+        job = {
+            'id': remote['job_id'],
+            'endpoint': response.endpoint_url,
+            'user_id': user_id,
+            'bahan': bahan,
+            'mode': mode,
+            'status': remote['status'],
+            'queue_position': remote.get('queue_position'),
+            'created_at': time.time(),
+            'finished_at': None,
+            'history_id': None,
+            'resep': None,
+            'error_code': None,
+            'message': None
         }
-        response = requests.post(f"{model_server_url}/api/generate", json={"bahan": bahan_input, "mode": mode}, headers=headers)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        data = response.json()
+        with self._lock:
+            self.jobs[job['id']] = job
+            self.stats['submitted'] += 1
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._loop, name="generate-poller", daemon=True)
+                self._poller.start()
+        self._wake.set()
+        return job, None
 
-        # Bersihkan sisa request Python sebelum return data
-        gc.collect()
+    def get(self, job_id, user_id):
+        """Job hanya terlihat oleh user yang membuatnya."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job and job['user_id'] == user_id else None
 
-        if data.get("success"):
-            return data.get("data", {}).get("resep", "Maaf, terjadi kesalahan saat memproses resep.")
-        else:
-            return data.get("message", "Maaf, terjadi kesalahan saat memproses resep.")
+    def pending(self):
+        with self._lock:
+            return [job for job in self.jobs.values() if job['status'] in ('queued', 'running')]
+
+    def _finish(self, job, status, **fields):
+        with self._finished:
+            job.update(fields, status=status, finished_at=time.time(), queue_position=None)
+            self.stats['done' if status == 'done' else 'failed'] += 1
+            self._finished.notify_all()
+
+    def subscribe(self, job_id, user_id):
+        """
+        Return: (generator (event, data_dict), None) atau (None, (error_code, pesan, http_status)):
+        404 kalau job tidak ada / bukan milik user, 429 kalau semua slot stream terpakai (client tetap polling).
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None or job['user_id'] != user_id:
+            return None, (16, 'Generation job not found or expired.', 404)
+        # Job dipegang langsung (bukan lewat self.jobs): purge poller setelah ini tidak memengaruhi relay
+        if not self._streams.acquire(blocking=False):
+            with self._lock:
+                self.stats['stream_rejected'] += 1
+            return None, (14, 'Too many live recipe streams. Poll the job status instead.', 429)
+        with self._lock:
+            self.stats['streamed'] += 1
+        events = self._relay(job)
+        next(events)  # masuk ke blok try -> slot selalu dilepas walau response tidak pernah dibaca
+        return events, None
+
+    def _relay(self, job):
+        """
+        Token dari GET /api/jobs/<id>/events di endpoint asal job; 'done' / 'error' dikirim setelah poller
+        menyimpan history (berisi history_id). Job belum selesai dalam GENERATE_STATUS_TIMEOUT setelah
+        stream berakhir (mis. koneksi putus) -> generator selesai tanpa 'done', client kembali polling.
+        """
+        try:
+            yield
+            if job['finished_at'] is None:
+                try:
+                    with call_model_server(f"/api/jobs/{job['id']}/events", method="GET", stream=True,
+                                           endpoint_url=job['endpoint']) as response:
+                        response.raise_for_status()
+                        for event, data in iter_sse(response):
+                            if event != 'token':
+                                break  # hasil final diambil dari poller
+                            yield 'token', data
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    print(f"[GEN JOB] Stream {job['id']} putus: {e}")
+                self._wake.set()  # poller langsung cek status + simpan history
+
+            with self._finished:
+                if not self._finished.wait_for(lambda: job['finished_at'] is not None, timeout=GENERATE_STATUS_TIMEOUT):
+                    return
+            if job['status'] == 'done':
+                yield 'done', {'history_id': job['history_id'], 'resep': job['resep'], 'mode': job['mode']}
+            else:
+                yield 'error', {'error_code': job['error_code'], 'message': job['message']}
+        finally:
+            self._streams.release()
+
+    def poll_once(self):
+        """Cek semua job yang masih jalan (satu GET per job ke endpoint asalnya)."""
+        for job in self.pending():
+            try:
+                response = call_model_server(f"/api/jobs/{job['id']}", method="GET", endpoint_url=job['endpoint'],
+                                             read_timeout=GENERATE_STATUS_TIMEOUT)
+                data = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # Model server sementara tidak terjangkau: coba lagi putaran berikutnya sampai timeout
+                if time.time() - job['created_at'] > self.timeout:
+                    print(f"[GEN JOB] {job['id']} timeout ({e})")
+                    self._finish(job, 'error', error_code=9, message='Recipe generation timed out.')
+                continue
+
+            if response.status_code == 404:
+                # Job hilang dari model server (restart / TTL habis)
+                self._finish(job, 'error', error_code=9, message='Recipe generation was lost. Please try again.')
+                continue
+
+            remote = data.get('data') or {}
+            status = remote.get('status')
+            if status == 'done' and not is_failed_resep(remote.get('resep', '')):
+                history_id = self.save_result(job['user_id'], job['bahan'], remote['resep'])
+                if history_id is None:
+                    self._finish(job, 'error', error_code=10, message='Database Error: Failed to save history.')
+                else:
+                    self._finish(job, 'done', resep=remote['resep'], history_id=history_id)
+            elif status in ('done', 'error'):
+                self._finish(job, 'error', error_code=8, message='AI failed to generate recipe. Try different ingredients.')
+            elif time.time() - job['created_at'] > self.timeout:
+                self._finish(job, 'error', error_code=9, message='Recipe generation timed out.')
+            else:
+                with self._lock:
+                    job['status'] = status or job['status']
+                    job['queue_position'] = remote.get('queue_position')
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for job_id in [k for k, job in self.jobs.items() if job['finished_at'] and job['finished_at'] < cutoff]:
+                del self.jobs[job_id]
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.poll_once()
+                self._purge()
+            except Exception as e:
+                print(f"[GEN JOB] Poller error: {e}")
 
-    except requests.exceptions.RequestException as e:
-        print(f"[ERR] Error calling model server: {e}")
-        return "Maaf, dapur sedang kendala teknis."
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, pending=sum(job['status'] in ('queued', 'running') for job in self.jobs.values()),
+                        tracked=len(self.jobs))
 
 # ==========================================
 # Helper: Validation Functions